@@ -0,0 +1,72 @@
+"""
+Benchmark reconstruction of pd.DataFrame in ColumnTransformerDF
+
+Compares the block by block reconstruction with the previous approach of
+stacking all outputs into a single (object) array, building a DataFrame from
+it and casting every column back to its original dtype.
+"""
+import argparse
+
+import pandas as pd
+from sklearn.impute import SimpleImputer
+
+import housing_regression.processing.transformers as tran
+from benchmarks.utils import best_time, format_time, make_housing_data
+
+SIZES = [1, 1000, 1000000]
+
+
+class LegacyColumnTransformerDF(tran.ColumnTransformerDF):
+    """ColumnTransformerDF as implemented before the block reconstruction"""
+
+    def _hstack(self, Xs):
+        return super(tran.ColumnTransformerDF, self)._hstack(Xs)
+
+    def _reconstruct_df(self, transformed, original_order, dtypes):
+        df = pd.DataFrame(
+            data=transformed, columns=self._find_column_order(original_order)
+        )
+        for col in df:
+            df[col] = df[col].astype(dtypes[col])
+        return df[original_order]
+
+
+def make_transformer(cls):
+    return cls(
+        [
+            (
+                "CategoricalImputer",
+                SimpleImputer(strategy="most_frequent"),
+                ["GarageFinish", "Utilities"],
+            ),
+            ("NumericalImputer", SimpleImputer(strategy="mean"), ["LotFrontage"]),
+        ],
+        remainder="passthrough",
+    )
+
+
+def run(sizes):
+    for n_rows in sizes:
+        data = make_housing_data(n_rows)
+        repeat = 3 if n_rows > 100000 else 20
+        timings = {}
+        for label, cls in (
+            ("legacy", LegacyColumnTransformerDF),
+            ("blocks", tran.ColumnTransformerDF),
+        ):
+            transformer = make_transformer(cls).fit(data)
+            timings[label] = best_time(lambda: transformer.transform(data), repeat)
+        print(
+            f"rows={n_rows:>8}  legacy={format_time(timings['legacy']):>9}"
+            f"  blocks={format_time(timings['blocks']):>9}"
+            f"  speedup={timings['legacy'] / timings['blocks']:.1f}x"
+        )
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run(args.sizes)
@@ -0,0 +1,83 @@
+"""
+Benchmark decoding of JSON input data on the predict hot path
+
+Compares pd.read_json followed by selection of the features with the
+schema-driven FeatureDecoder, on full Kaggle records of about 80 fields,
+given as raw bytes (as received by the API) and as already parsed records.
+With pyarrow installed, decoding of the same data in the Arrow IPC stream
+format is timed as well.
+"""
+import argparse
+import json
+
+import pandas as pd
+
+from benchmarks.utils import best_time, format_time
+from housing_regression.models import MODELS
+from housing_regression.predict import get_decoder
+from housing_regression.processing.decoding import read_arrow_batches
+
+SAMPLE_INPUT = "sample_input.json"
+
+
+def make_payload(n_rows: int) -> bytes:
+    """Copies of the sample record with varying values"""
+    with open(SAMPLE_INPUT) as sample:
+        record = json.load(sample)[0]
+    records = []
+    for i in range(n_rows):
+        records.append(dict(record, Id=i, GrLivArea=record["GrLivArea"] + i % 100))
+    return json.dumps(records).encode()
+
+
+def make_arrow_payload(records: list):
+    """The records in the Arrow IPC stream format, None without pyarrow"""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    table = pa.Table.from_pandas(pd.DataFrame(records), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def run(sizes, model_name: str):
+    conf = MODELS[model_name]["config"]
+    decoder = get_decoder(model_name)
+    for n_rows in sizes:
+        payload = make_payload(n_rows)
+        records = json.loads(payload)
+        text = payload.decode()
+        number = max(1, 100 // n_rows)
+        timings = {
+            "pd.read_json": best_time(
+                lambda: pd.read_json(text)[conf.FEATURES], number=number
+            ),
+            "decoder (bytes)": best_time(
+                lambda: decoder.decode(payload), number=number
+            ),
+            "decoder (parsed)": best_time(
+                lambda: decoder.from_records(records), number=number
+            ),
+        }
+        arrow = make_arrow_payload(records)
+        if arrow is not None:
+            timings["decoder (arrow)"] = best_time(
+                lambda: [decoder.from_arrow(b) for b in read_arrow_batches(arrow)],
+                number=number,
+            )
+        print(f"rows={n_rows} payload={len(payload) / 1024:.0f}kB")
+        for label, seconds in timings.items():
+            print(f"{label:>18}: {format_time(seconds):>9}")
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10000])
+parser.add_argument("--model", default="DevModel")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run(args.sizes, args.model)
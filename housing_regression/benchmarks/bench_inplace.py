@@ -0,0 +1,94 @@
+"""
+Benchmark memory and time of the dev pipeline with and without copies
+
+Compares the pipeline where every custom transformer copies its input with
+the same pipeline after make_inplace, where only the first step does. The
+copying pipeline is also run one hot encoding into a float64 CSR matrix made
+dense only when stacked with the other columns, as the dev pipeline used to.
+Peak memory is the peak of memory allocated (tracemalloc) during the call.
+
+The peak of the whole pipeline is set by the imputer, the one hot encoding
+and, in fit, the least squares solver of LinearRegression, so the chain of
+custom transformers between the imputer and the one hot encoder is measured
+on its own as well.
+"""
+import argparse
+import tracemalloc
+
+import numpy as np
+from sklearn.base import clone
+
+import housing_regression.config.dev_config as conf
+import housing_regression.config.global_config as global_conf
+import housing_regression.processing.transformers as tran
+from benchmarks.utils import best_time, format_time, make_housing_data
+from housing_regression.pipelines.dev_pipeline import dev_pipeline
+
+ROWS = 1000000
+
+
+def copying(pipeline):
+    """Pipeline with all transformers copying their input"""
+    pipeline = clone(pipeline)
+    for _, step in pipeline.steps:
+        if isinstance(step, tran.INPLACE_TRANSFORMERS):
+            step.set_params(copy=True)
+    return pipeline
+
+
+def csr_encoding(pipeline):
+    """Copying pipeline one hot encoding into float64 CSR, as it used to"""
+    return copying(pipeline).set_params(
+        OneHotEncoder__OHE__sparse=True, OneHotEncoder__OHE__dtype=np.float64
+    )
+
+
+def peak_memory(func) -> int:
+    """Peak of memory allocated during the call, in bytes"""
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run(n_rows: int):
+    data = make_housing_data(n_rows)
+    X, y = data[conf.FEATURES], data[global_conf.LABEL]
+    print(f"rows={n_rows}, input size={X.memory_usage(deep=True).sum() / 2**20:.0f}MB")
+
+    for label, pipeline in (
+        ("csr", csr_encoding(dev_pipeline)),
+        ("copying", copying(dev_pipeline)),
+        ("in place", tran.make_inplace(clone(dev_pipeline))),
+    ):
+        fit_memory = peak_memory(lambda: pipeline.fit(X, y))
+        predict_memory = peak_memory(lambda: pipeline.predict(X))
+        fit_time = best_time(lambda: pipeline.fit(X, y), repeat=3)
+        predict_time = best_time(lambda: pipeline.predict(X), repeat=3)
+
+        # the chain receives a frame owned by the pipeline, as it would inside it
+        chain = pipeline[1:-2]
+        imputed = pipeline[0].transform(X)
+        chain_memory = peak_memory(lambda: chain.transform(imputed.copy()))
+        chain_time = best_time(lambda: chain.transform(imputed.copy()), repeat=3)
+        copy_time = best_time(lambda: imputed.copy(), repeat=3)
+
+        print(
+            f"{label:>9}: fit={format_time(fit_time):>9} "
+            f"peak={fit_memory / 2**20:.0f}MB  "
+            f"predict={format_time(predict_time):>9} "
+            f"peak={predict_memory / 2**20:.0f}MB  "
+            f"transformer chain={format_time(chain_time - copy_time):>9} "
+            f"peak={chain_memory / 2**20:.0f}MB"
+        )
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--rows", type=int, default=ROWS)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run(args.rows)
@@ -0,0 +1,76 @@
+"""
+Benchmark rare label and one hot encoding of a high cardinality variable
+
+Compares RareLabelEncoder on object columns followed by sklearn's
+OneHotEncoder with the categorical mode of RareLabelEncoder followed by
+OneHotEncoderDF, which works on integer codes.
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+import housing_regression.processing.transformers as tran
+from benchmarks.utils import best_time, format_time
+
+ROWS = 2000000
+CARDINALITY = 500
+VARIABLES = ["Neighborhood"]
+
+
+def make_data(n_rows: int, cardinality: int) -> pd.DataFrame:
+    """Zipf distributed labels, so that there are frequent and rare ones"""
+    rng = np.random.default_rng(42)
+    labels = np.array([f"label_{i}" for i in range(cardinality)], dtype=object)
+    codes = np.minimum(rng.zipf(1.5, n_rows), cardinality) - 1
+    return pd.DataFrame({"Neighborhood": labels[codes], "GrLivArea": 1.0})
+
+
+def make_pipelines(tol: float) -> dict:
+    return {
+        "object + OneHotEncoder": Pipeline(
+            [
+                ("rare", tran.RareLabelEncoder(VARIABLES, tol=tol)),
+                (
+                    "ohe",
+                    ColumnTransformer(
+                        [("ohe", OneHotEncoder(handle_unknown="ignore"), VARIABLES)],
+                        remainder="passthrough",
+                        sparse_threshold=0,
+                    ),
+                ),
+            ]
+        ),
+        "category + OneHotEncoderDF": Pipeline(
+            [
+                ("rare", tran.RareLabelEncoder(VARIABLES, tol=tol, as_category=True)),
+                ("ohe", tran.OneHotEncoderDF(VARIABLES)),
+            ]
+        ),
+    }
+
+
+def run(n_rows: int, cardinality: int, tol: float):
+    data = make_data(n_rows, cardinality)
+    print(f"rows={n_rows} labels={data['Neighborhood'].nunique()} tol={tol}")
+    for label, pipeline in make_pipelines(tol).items():
+        fit = best_time(lambda: pipeline.fit(data), repeat=3)
+        transform = best_time(lambda: pipeline.transform(data), repeat=3)
+        print(
+            f"{label:>28}: fit={format_time(fit):>9}"
+            f"  transform={format_time(transform):>9}"
+        )
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--rows", type=int, default=ROWS)
+parser.add_argument("--cardinality", type=int, default=CARDINALITY)
+parser.add_argument("--tol", type=float, default=0.001)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run(args.rows, args.cardinality, args.tol)
@@ -0,0 +1,97 @@
+"""
+Benchmark dense and sparse one hot encoded features on wide categorical data
+
+Fits rare label encoding, one hot encoding and LinearRegression on several
+categorical variables (named after those of the Kaggle data) with many
+categories each, once with dense and once with CSR features between the
+encoder and the estimator, and reports fit time, peak memory allocated
+during fit (tracemalloc) and the size of the feature matrix.
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+
+import housing_regression.processing.transformers as tran
+from benchmarks.utils import format_time
+
+ROWS = 50000
+CARDINALITY = 100
+VARIABLES = [
+    "Neighborhood",
+    "Exterior1st",
+    "Exterior2nd",
+    "Condition1",
+    "Condition2",
+    "HouseStyle",
+    "RoofMatl",
+    "SaleType",
+]
+
+
+def make_data(n_rows: int, cardinality: int, n_variables: int):
+    rng = np.random.default_rng(42)
+    labels = np.array([f"label_{i}" for i in range(cardinality)], dtype=object)
+    data = pd.DataFrame(
+        {
+            var: labels[rng.integers(0, cardinality, n_rows)]
+            for var in VARIABLES[:n_variables]
+        }
+    )
+    data["GrLivArea"] = rng.integers(500, 4000, n_rows).astype(float)
+    y = data["GrLivArea"] * 100 + rng.normal(0, 1e4, n_rows)
+    return data, y
+
+
+def make_pipeline(variables: list, is_sparse: bool) -> Pipeline:
+    return Pipeline(
+        [
+            ("rare", tran.RareLabelEncoder(variables, tol=0, as_category=True)),
+            ("ohe", tran.OneHotEncoderDF(variables, sparse=is_sparse)),
+            ("model", LinearRegression()),
+        ]
+    )
+
+
+def nbytes(matrix) -> int:
+    if sparse.issparse(matrix):
+        return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+    return int(np.asarray(matrix).nbytes)
+
+
+def run(n_rows: int, cardinality: int, n_variables: int):
+    X, y = make_data(n_rows, cardinality, n_variables)
+    variables = VARIABLES[:n_variables]
+    print(f"rows={n_rows} variables={n_variables} categories={cardinality}")
+    for is_sparse in (False, True):
+        pipeline = make_pipeline(variables, is_sparse)
+        tracemalloc.start()
+        start = time.perf_counter()
+        pipeline.fit(X, y)
+        fit_time = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        features = pipeline[:-1].transform(X)
+        label = "sparse (CSR)" if is_sparse else "dense"
+        print(
+            f"{label:>14}: fit={format_time(fit_time):>9}"
+            f"  peak={peak / 2**20:8.1f}MiB"
+            f"  features={nbytes(features) / 2**20:8.1f}MiB"
+            f"  shape={features.shape}"
+        )
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--rows", type=int, default=ROWS)
+parser.add_argument("--cardinality", type=int, default=CARDINALITY)
+parser.add_argument("--variables", type=int, default=len(VARIABLES))
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    run(args.rows, args.cardinality, args.variables)
@@ -0,0 +1,54 @@
+"""
+Compare two result files of benchmarks/suite.py
+
+Prints the time of every benchmark in both runs and their ratio, flagging
+those which got slower by more than the threshold.
+
+Run from the package root: python benchmarks/compare.py base.json new.json
+"""
+import argparse
+import json
+
+PARAMS = ("rows", "batch_size", "concurrency")
+
+
+def load(path: str) -> dict:
+    with open(path) as results_file:
+        results = json.load(results_file)["results"]
+    return {_key(result): result for result in results}
+
+
+def _key(result: dict) -> tuple:
+    return (result["name"],) + tuple(result.get(param) for param in PARAMS)
+
+
+def compare(base: dict, new: dict, threshold: float) -> int:
+    """Prints the comparison, returns the number of regressions"""
+    regressions = 0
+    for key in sorted(base.keys() & new.keys(), key=str):
+        ratio = new[key]["seconds"] / base[key]["seconds"]
+        slower = ratio > 1 + threshold
+        regressions += slower
+        params = " ".join(
+            f"{param}={value}" for param, value in zip(PARAMS, key[1:]) if value
+        )
+        print(
+            f"{key[0]:>28} {params:<22} {base[key]['seconds']:>10.4g}s"
+            f" {new[key]['seconds']:>10.4g}s {ratio:>6.2f}x"
+            + ("  SLOWER" if slower else "")
+        )
+    for key in sorted(base.keys() ^ new.keys(), key=str):
+        print(f"{key[0]:>28} only in {'base' if key in base else 'new'}")
+    return regressions
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("base")
+parser.add_argument("new")
+parser.add_argument("--threshold", type=float, default=0.1)
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    regressions = compare(load(args.base), load(args.new), args.threshold)
+    print(f"{regressions} regression(s)")
@@ -0,0 +1,285 @@
+"""
+Benchmark suite establishing a performance baseline of the package and API
+
+Times, on synthetic data matching the schema of the dev model:
+  * train_pipeline (reading the csv, fitting and persisting the pipeline)
+  * predict with batches of 1, 100 and 10k observations, also compiled
+  * fit and transform of every step of the dev pipeline on its own
+  * the Flask endpoint served by waitress under concurrent load
+
+Results are written to a JSON file, compare two runs with
+benchmarks/compare.py. The 10M rows scale needs several GB of memory and
+takes a while, pass e.g. --scales 1000 100000 for a quick run.
+
+Run from the package root: PYTHONPATH=. python benchmarks/suite.py
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import List
+
+import sklearn
+from sklearn.base import clone
+
+import housing_regression.config.dev_config as conf
+import housing_regression.config.global_config as global_conf
+from benchmarks.utils import best_time, format_time, make_housing_data
+from housing_regression import __version__
+from housing_regression.models import MODELS
+from housing_regression.predict import load_compiled_model, predict, warm_up
+from housing_regression.train import train_pipeline
+
+SCALES = [1000, 100000, 10000000]
+BATCH_SIZES = [1, 100, 10000]
+MODEL_NAME = conf.NAME
+REST_API_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "rest_api")
+
+
+def repeats(n_rows: int) -> int:
+    """Fewer repetitions for larger data to keep the run time bearable"""
+    return 5 if n_rows <= 100000 else 1
+
+
+def bench_training(n_rows: int, workdir: str) -> List[dict]:
+    data = make_housing_data(n_rows)
+    data_path = os.path.join(workdir, f"train_{n_rows}.csv")
+    data.to_csv(data_path, index=False)
+    save_path = os.path.join(workdir, f"model_{n_rows}.pkl")
+
+    seconds = best_time(
+        lambda: train_pipeline(data_path, MODEL_NAME, save_path=save_path),
+        repeat=repeats(n_rows),
+    )
+    os.remove(data_path)
+    return [_result("train_pipeline", seconds, rows=n_rows)]
+
+
+def bench_steps(n_rows: int) -> List[dict]:
+    """Fit and transform of every step, given the output of previous steps
+
+    Steps of the dev pipeline work in place, so every call gets a copy of its
+    input. The time of the copy is included and reported on its own.
+    """
+    data = make_housing_data(n_rows)
+    X, y = data[conf.FEATURES], data[global_conf.LABEL]
+    results = [
+        _result("copy:input", best_time(lambda: X.copy(), repeat=5), rows=n_rows)
+    ]
+    for name, step in clone(MODELS[MODEL_NAME]["pipeline"]).steps:
+        # steps working in place must not modify the input between repetitions
+        fitted = clone(step).fit(X.copy(), y)
+        fit_time = best_time(
+            lambda: clone(step).fit(X.copy(), y), repeat=repeats(n_rows)
+        )
+        results.append(_result(f"fit:{name}", fit_time, rows=n_rows))
+
+        if not hasattr(fitted, "transform"):
+            break
+        transform_time = best_time(
+            lambda: fitted.transform(X.copy()), repeat=repeats(n_rows)
+        )
+        results.append(_result(f"transform:{name}", transform_time, rows=n_rows))
+        X = fitted.transform(X.copy())
+    return results
+
+
+def bench_predict(batch_sizes: List[int]) -> List[dict]:
+    """predict() as called by the API, JSON in and out"""
+    warm_up([MODEL_NAME])
+    load_compiled_model(MODEL_NAME)
+    results = []
+    for batch_size in batch_sizes:
+        data = make_housing_data(batch_size, seed=7)[conf.FEATURES]
+        payload = data.to_json(orient="records")
+        number = max(1, 1000 // batch_size)
+        for compiled in (False, True):
+            seconds = best_time(
+                lambda: predict(payload, MODEL_NAME, compiled=compiled),
+                number=number,
+            )
+            name = "predict (compiled)" if compiled else "predict"
+            results.append(_result(name, seconds, batch_size=batch_size))
+    return results
+
+
+def bench_api(concurrency: int, n_requests: int, batch_size: int) -> List[dict]:
+    """The Flask app served by waitress in a separate process"""
+    port = _free_port()
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(
+            [os.path.abspath(REST_API_DIR), os.path.abspath(os.curdir)]
+        ),
+    )
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "waitress",
+            f"--port={port}",
+            f"--threads={concurrency}",
+            "--call",
+            "api:create_app",
+        ],
+        cwd=REST_API_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_server(port)
+        payload = make_housing_data(batch_size, seed=7)[conf.FEATURES].to_json(
+            orient="records"
+        )
+        stats = _load(port, "/predict/dev", payload.encode(), concurrency, n_requests)
+    finally:
+        server.terminate()
+        server.wait()
+    return [
+        dict(
+            name="api:/predict/dev",
+            batch_size=batch_size,
+            concurrency=concurrency,
+            **stats,
+        )
+    ]
+
+
+def _load(port: int, path: str, body: bytes, concurrency: int, n_requests: int):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    remaining = iter(range(n_requests))
+
+    def worker():
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        headers = {"Content-Type": "application/json"}
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    break
+            start = time.perf_counter()
+            connection.request("POST", path, body=body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                if response.status != 200:
+                    errors.append(response.status)
+        connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "errors": len(errors),
+        "requests_per_second": n_requests / wall_time,
+        "seconds": statistics.mean(latencies),
+        "p50_seconds": latencies[len(latencies) // 2],
+        "p99_seconds": latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))],
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(port: int, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/version")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("The API did not start in time")
+
+
+def _result(name: str, seconds: float, **params) -> dict:
+    rows = params.get("rows", params.get("batch_size"))
+    return dict(name=name, seconds=seconds, rows_per_second=rows / seconds, **params)
+
+
+def metadata() -> dict:
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "version": __version__,
+        "python": platform.python_version(),
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(args) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.scales:
+            print(f"rows={n_rows}")
+            results.extend(_report(bench_training(n_rows, workdir)))
+            results.extend(_report(bench_steps(n_rows)))
+    print("predict")
+    results.extend(_report(bench_predict(args.batch_sizes)))
+    if not args.skip_api:
+        print("api")
+        results.extend(
+            _report(bench_api(args.concurrency, args.requests, args.api_batch_size))
+        )
+    return {"metadata": metadata(), "results": results}
+
+
+def _report(results: List[dict]) -> List[dict]:
+    for result in results:
+        params = " ".join(
+            f"{key}={value}"
+            for key, value in result.items()
+            if key in ("rows", "batch_size", "concurrency")
+        )
+        extra = (
+            f"  {result['requests_per_second']:.0f} requests/s"
+            if "requests_per_second" in result
+            else ""
+        )
+        print(
+            f"{result['name']:>28} {params:<22} {format_time(result['seconds']):>9}"
+            + extra
+        )
+    return results
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument("--scales", type=int, nargs="+", default=SCALES)
+parser.add_argument("--batch-sizes", type=int, nargs="+", default=BATCH_SIZES)
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--requests", type=int, default=1000)
+parser.add_argument("--api-batch-size", type=int, default=1)
+parser.add_argument("--skip-api", action="store_true")
+parser.add_argument("--output", default="benchmark_results.json")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    report = run(args)
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print(f"results written to {args.output}")
@@ -0,0 +1,57 @@
+"""
+Helpers shared by the benchmarks
+"""
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+
+def best_time(func: Callable, repeat: int = 5, number: int = 1) -> float:
+    """Best wall time of a single call in seconds over several repetitions
+
+    :param func: function to time, called without arguments
+    :param repeat: number of repetitions, the fastest is reported
+    :param number: calls per repetition, the time is averaged over them
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    return min(timings)
+
+
+def format_time(seconds: float) -> str:
+    """Human readable duration"""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def make_housing_data(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Synthetic data with the predictors of the dev model and the label
+
+    Contains missing values in LotFrontage and GarageFinish and a rare
+    category in Utilities.
+    """
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(
+        {
+            "GrLivArea": rng.integers(500, 4000, n_rows),
+            "YearRemodAdd": rng.integers(1950, 2010, n_rows),
+            "LotFrontage": rng.normal(70, 20, n_rows),
+            "GarageFinish": rng.choice(["RFn", "Unf", "Fin"], n_rows).astype(object),
+            "Utilities": rng.choice(
+                ["AllPub", "NoSeWa"], n_rows, p=[0.99, 0.01]
+            ).astype(object),
+            "YrSold": rng.integers(2006, 2011, n_rows),
+        }
+    )
+    data.loc[data.index % 7 == 3, "LotFrontage"] = np.nan
+    data.loc[data.index % 11 == 5, "GarageFinish"] = np.nan
+    data["SalePrice"] = data["GrLivArea"] * 100 + rng.normal(0, 1e4, n_rows)
+    return data
@@ -5,6 +5,10 @@ import housing_regression.config.global_config as glc
 
 NAME = "DevModel"
 PATH = glc.PATH_TO_TRAINED_MODELS + NAME + ".pkl"
+# compiled export, see housing_regression.processing.artifact
+ARTIFACT_PATH = glc.PATH_TO_TRAINED_MODELS + NAME + ".hrm"
+# further versions served side by side with PATH, as <VERSIONS_DIR><version>.pkl
+VERSIONS_DIR = glc.PATH_TO_TRAINED_MODELS + NAME + "/"
 
 
 # all variables used in the pipeline
@@ -30,5 +34,18 @@ DROP_FEATURES = ["YrSold"]
 # variables to log transform
 NUMERICALS_LOG_VARS = ["GrLivArea"]
 
-# validation
+# one hot encoded features as a sparse CSR matrix, worth it with many
+# categorical variables or categories; LinearRegression then solves the
+# least squares problem iteratively (lsqr)
+SPARSE_FEATURES = False
+
+# validation, see housing_regression.processing.validation
 NAN_NOT_ALLOWED = ["GarageFinish"]
+# inclusive (min, max), None for no bound; GrLivArea is log transformed
+VALUE_RANGES = {
+    "GrLivArea": (1, None),
+    "YearRemodAdd": (1800, 2100),
+    "YrSold": (1800, 2100),
+}
+# unseen labels are merged into 'rare' by the pipeline, so none are rejected
+ALLOWED_CATEGORIES = {}
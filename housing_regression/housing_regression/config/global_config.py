@@ -7,3 +7,6 @@ SEED = 42
 LABEL = "SalePrice"
 
 PATH_TO_TRAINED_MODELS = os.path.join(os.path.dirname(__file__), "../trained_models/")
+
+# size limit of the on-disk cache of fitted pipeline prefixes
+PREFIX_CACHE_MAX_BYTES = 2**30
@@ -1,9 +1,17 @@
 """
 Configuration of logging througout the whole package
+
+Importing this module (and so the package) touches no files: the log
+directory and file are created once the first record is written.
+
+With async logging enabled the package logger only puts records on a queue,
+a background thread formats and writes them with the original handlers.
 """
+import atexit
 import logging
 import logging.handlers
 import os
+import queue
 import sys
 
 FORMATTER = logging.Formatter(
@@ -11,13 +19,23 @@ FORMATTER = logging.Formatter(
 )
 
 
-LOG_DIR = os.path.join(os.path.dirname(__file__), "..\logs")
-LOG_FILE = LOG_DIR + "\logs.log"
+LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+LOG_FILE = os.path.join(LOG_DIR, "logs.log")
+
+# names of the loggers with async logging enabled
+_ASYNC_LOGGERS = set()
+_hooks_registered = False
+
 
+class LazyFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """Rotating file handler creating the log directory on first write"""
 
-if not os.path.exists(LOG_FILE):
-    os.makedirs(LOG_DIR)
-    open(LOG_FILE, "a").close()
+    def __init__(self, filename: str, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
 
 
 def get_console_handler():
@@ -27,7 +45,7 @@ def get_console_handler():
 
 
 def get_file_handler():
-    file_handler = logging.handlers.TimedRotatingFileHandler(LOG_FILE, when="midnight")
+    file_handler = LazyFileHandler(LOG_FILE, when="midnight")
     file_handler.setFormatter(FORMATTER)
     return file_handler
 
@@ -39,3 +57,85 @@ def get_logger(logger_name, level=logging.INFO):
     logger.addHandler(get_file_handler())
     logger.propagate = False
     return logger
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler leaving all formatting to the thread of its listener
+
+    Unlike QueueHandler it does not render the message on the calling
+    thread, so arguments of records must not change once logged.
+
+    :param listener: listener writing the records with the original handlers
+    """
+
+    def __init__(self, listener: logging.handlers.QueueListener):
+        super().__init__(listener.queue)
+        self.listener = listener
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def restart(self) -> None:
+        """Starts the listener with a new queue, e.g. in a forked child"""
+        self.queue = self.listener.queue = queue.SimpleQueue()
+        self.listener._thread = None
+        self.listener.start()
+
+
+def enable_async_logging(logger_name: str = "housing_regression") -> None:
+    """Moves the handlers of the logger to a background thread
+
+    Records are written in order by a single thread, those still queued are
+    written at exit. Forked children start their own thread; records queued
+    by a child leaving through os._exit (e.g. a multiprocessing worker) may
+    be lost.
+    """
+    global _hooks_registered
+    logger = logging.getLogger(logger_name)
+    if _async_handler(logger) is not None:
+        return
+    handlers = list(logger.handlers)
+    listener = logging.handlers.QueueListener(
+        queue.SimpleQueue(), *handlers, respect_handler_level=True
+    )
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(AsyncQueueHandler(listener))
+    listener.start()
+    if not _hooks_registered:
+        atexit.register(_stop_async_logging)
+        os.register_at_fork(after_in_child=_restart_async_logging)
+        _hooks_registered = True
+    _ASYNC_LOGGERS.add(logger_name)
+
+
+def disable_async_logging(logger_name: str = "housing_regression") -> None:
+    """Writes the queued records and gives the handlers back to the logger"""
+    logger = logging.getLogger(logger_name)
+    handler = _async_handler(logger)
+    if handler is None:
+        return
+    handler.listener.stop()
+    logger.removeHandler(handler)
+    for original in handler.listener.handlers:
+        logger.addHandler(original)
+    _ASYNC_LOGGERS.discard(logger_name)
+
+
+def _async_handler(logger: logging.Logger):
+    for handler in logger.handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            return handler
+    return None
+
+
+def _stop_async_logging() -> None:
+    for logger_name in list(_ASYNC_LOGGERS):
+        disable_async_logging(logger_name)
+
+
+def _restart_async_logging() -> None:
+    # the thread of the listener does not survive fork, records queued
+    # before are written by the parent
+    for logger_name in _ASYNC_LOGGERS:
+        _async_handler(logging.getLogger(logger_name)).restart()
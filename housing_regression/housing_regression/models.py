@@ -1,7 +1,50 @@
 """
 Registry of all available models
+
+Configs are plain modules and imported right away. Pipelines are imported
+on first access of MODELS[name]["pipeline"], so that neither the registry
+nor its users (predict, validation) import scikit-learn before it is needed.
 """
+import importlib
+from collections.abc import Mapping
+
 import housing_regression.config.dev_config as dev_config
-from housing_regression.pipelines.dev_pipeline import dev_pipeline
 
-MODELS = {dev_config.NAME: {"config": dev_config, "pipeline": dev_pipeline}}
+
+class ModelEntry(Mapping):
+    """Registered model as {"config": <module>, "pipeline": <Pipeline>}
+
+    :param config: config module of the model, see dev_config
+    :param pipeline: import path "module:attribute" of the unfitted pipeline
+    """
+
+    def __init__(self, config, pipeline: str):
+
+        self.config = config
+        self.pipeline_path = pipeline
+
+    @property
+    def pipeline(self):
+        """The unfitted pipeline, imported on first use"""
+        module_name, _, attribute = self.pipeline_path.partition(":")
+        return getattr(importlib.import_module(module_name), attribute)
+
+    def __getitem__(self, key: str):
+        if key == "config":
+            return self.config
+        if key == "pipeline":
+            return self.pipeline
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("config", "pipeline"))
+
+    def __len__(self) -> int:
+        return 2
+
+
+MODELS = {
+    dev_config.NAME: ModelEntry(
+        dev_config, "housing_regression.pipelines.dev_pipeline:dev_pipeline"
+    )
+}
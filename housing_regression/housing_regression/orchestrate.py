@@ -0,0 +1,156 @@
+"""
+Training of several registered models and hyperparameter variants at once
+
+The dataset is read once, by the parent process, and the jobs are fitted by
+a pool of processes. Workers are forked and so share the dataset with the
+parent (copy on write) instead of reading or unpickling it again; where
+fork is not available every worker reads the dataset once. Every worker
+fits a single job, so its peak resident memory is that of the job.
+
+Each fitted pipeline is persisted with a JSON file of metadata next to it
+(model, parameters, version, data, timings and memory).
+"""
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from sklearn.base import clone
+from sklearn.model_selection import ParameterGrid
+
+import housing_regression.config.global_config as global_conf
+import housing_regression.processing.data_management as dm
+from housing_regression import __version__
+from housing_regression.models import MODELS
+
+_logger = logging.getLogger(__name__)
+
+# dataset of the current training run, inherited by forked workers
+_DATA = None
+
+
+class TrainingJob(NamedTuple):
+    """A registered model with parameters overriding those of its pipeline
+
+    :param name: name of the persisted artifact, without extension
+    :param model_name: name of a model registered in housing_regression.models
+    :param params: parameters of the pipeline, see Pipeline.set_params
+    """
+
+    name: str
+    model_name: str
+    params: dict = {}
+
+
+def make_jobs(
+    model_names: Iterable[str] = None, param_grid: Dict[str, list] = None
+) -> List[TrainingJob]:
+    """One job per model and combination of parameters
+
+    :param model_names: registered models, all of them by default
+    :param param_grid: values of pipeline parameters to try, e.g.
+        {"RareEncoder__tol": [0.01, 0.05]}, see ParameterGrid; the registered
+        parameters only by default
+    """
+    jobs = []
+    for model_name in model_names or MODELS:
+        if model_name not in MODELS:
+            raise KeyError(f"Model {model_name} is not registered.")
+        grid = list(ParameterGrid(param_grid or {}))
+        for i, params in enumerate(grid):
+            name = model_name if len(grid) == 1 else f"{model_name}_{i}"
+            jobs.append(TrainingJob(name, model_name, params))
+    return jobs
+
+
+def train_models(
+    data_path: str, jobs: List[TrainingJob], save_dir: str, processes: int = None
+) -> List[dict]:
+    """Fits the jobs in parallel and persists the pipelines and metadata
+
+    :param data_path: path to training dataset
+    :param jobs: see make_jobs
+    :param save_dir: directory of the artifacts <name>.pkl and <name>.json
+    :param processes: size of the pool, the number of CPUs by default
+
+    :returns: metadata of the jobs in the order of jobs
+    """
+    global _DATA
+    start = time.perf_counter()
+    os.makedirs(save_dir, exist_ok=True)
+    _logger.info(f"Training {len(jobs)} jobs, version: {__version__}")
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        _DATA = dm.load_dataset(data_path)
+        context = multiprocessing.get_context("fork")
+    else:  # pragma: no cover
+        context = multiprocessing.get_context()
+    results = [None] * len(jobs)
+    tasks = [(i, job, data_path, save_dir) for i, job in enumerate(jobs)]
+    try:
+        with context.Pool(
+            processes or os.cpu_count(),
+            initializer=_init_worker,
+            initargs=(data_path,),
+            maxtasksperchild=1,
+        ) as pool:
+            for i, metadata in pool.imap_unordered(_train_job, tasks):
+                results[i] = metadata
+                _logger.info(
+                    f"Trained {metadata['name']} in {metadata['seconds']:.1f}s, "
+                    f"peak memory {metadata['peak_rss_bytes'] / 2**20:.0f} MiB"
+                )
+    finally:
+        _DATA = None
+    _logger.info(f"Trained {len(jobs)} jobs in {time.perf_counter() - start:.1f}s")
+    return results
+
+
+def _init_worker(data_path: str) -> None:
+    global _DATA
+    if _DATA is None:
+        _DATA = dm.load_dataset(data_path)
+
+
+def _train_job(task: Tuple[int, TrainingJob, str, str]) -> Tuple[int, dict]:
+    i, job, data_path, save_dir = task
+    conf = MODELS[job.model_name]["config"]
+    pipeline = clone(MODELS[job.model_name]["pipeline"]).set_params(**job.params)
+    start = time.perf_counter()
+    peak_before = _peak_rss()
+    X, y = _DATA[conf.FEATURES], _DATA[global_conf.LABEL]
+    pipeline.fit(X, y)
+    fit_seconds = time.perf_counter() - start
+    peak = _peak_rss()
+
+    path = os.path.join(save_dir, f"{job.name}.pkl")
+    dm.save_pipeline(pipe=pipeline, path=path)
+    metadata = {
+        "name": job.name,
+        "model_name": job.model_name,
+        "params": job.params,
+        "version": __version__,
+        "path": path,
+        "data_path": data_path,
+        "rows": len(X),
+        "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "fit_seconds": fit_seconds,
+        # the peak includes the dataset shared with the parent
+        "peak_rss_bytes": peak,
+        "fit_peak_rss_increase_bytes": peak - peak_before,
+    }
+    metadata["seconds"] = time.perf_counter() - start
+    with open(os.path.join(save_dir, f"{job.name}.json"), "w") as file:
+        json.dump(metadata, file, indent=2, default=str)
+    return i, metadata
+
+
+def _peak_rss() -> int:
+    """Peak resident memory of this process, including shared pages"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
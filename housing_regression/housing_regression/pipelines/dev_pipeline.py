@@ -10,6 +10,7 @@ from sklearn.preprocessing import LabelEncoder, OneHotEncoder
 
 import housing_regression.config.dev_config as conf
 from housing_regression.processing import transformers as tran
+from housing_regression.processing.functions import diff
 
 # different imputing strategy for categorical and numeric
 imputer = tran.ColumnTransformerDF(
@@ -24,11 +25,7 @@ imputer = tran.ColumnTransformerDF(
     remainder="passthrough",
 )
 
-# FE: time pased between two dates
-def diff(a, b):
-    return b - a
-
-
+# FE: time pased between two dates, see processing.functions.diff
 temporal = tran.BivariateTransformer(
     variables=conf.TEMPORAL_VARS, reference_var=conf.DROP_FEATURES[0], func=diff
 )
@@ -36,20 +33,34 @@ temporal = tran.BivariateTransformer(
 # log transform selected features
 log_tran = tran.UnivariateTransformer(variables=conf.NUMERICALS_LOG_VARS, func=np.log)
 
-# ohe all categorical variables
+# ohe all categorical variables, the output is explicitly dense or CSR; dense
+# indicators are uint8 and the encoder drops its own CSR matrix before they are
+# stacked, only the stacked output is float64
 ohe = ColumnTransformer(
-    [("OHE", OneHotEncoder(handle_unknown="ignore"), conf.CATEGORICAL_VARS)],
+    [
+        (
+            "OHE",
+            OneHotEncoder(
+                handle_unknown="ignore", sparse=conf.SPARSE_FEATURES, dtype=np.uint8
+            ),
+            conf.CATEGORICAL_VARS,
+        )
+    ],
     remainder="passthrough",
+    sparse_threshold=1.0 if conf.SPARSE_FEATURES else 0.0,
 )
 
-dev_pipeline = Pipeline(
-    [
-        ("Imputer", imputer),
-        ("TemporalFE", temporal),
-        ("DropAfterFE", tran.FeatureDropper(vars_to_drop=conf.DROP_FEATURES)),
-        ("RareEncoder", tran.RareLabelEncoder(conf.CATEGORICAL_VARS)),
-        ("LogTransform", log_tran),
-        ("OneHotEncoder", ohe),
-        ("LinearModel", LinearRegression()),
-    ]
+# the imputer creates a new frame, the following steps can work on it in place
+dev_pipeline = tran.make_inplace(
+    Pipeline(
+        [
+            ("Imputer", imputer),
+            ("TemporalFE", temporal),
+            ("DropAfterFE", tran.FeatureDropper(vars_to_drop=conf.DROP_FEATURES)),
+            ("RareEncoder", tran.RareLabelEncoder(conf.CATEGORICAL_VARS)),
+            ("LogTransform", log_tran),
+            ("OneHotEncoder", ohe),
+            ("LinearModel", LinearRegression()),
+        ]
+    )
 )
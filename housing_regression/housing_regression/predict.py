@@ -1,39 +1,442 @@
 """
 Functionality to predict using persisted models
 """
+import functools
+import io
+import itertools
 import logging
-from typing import Any, Dict
+import os
+import re
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-import housing_regression.processing.data_management as dm
 from housing_regression import __version__
 from housing_regression.models import MODELS
-from housing_regression.processing.validation import validate_inputs
+from housing_regression.processing.compiled import CompiledPipeline
+from housing_regression.processing.decoding import (
+    FeatureDecoder,
+    read_arrow_batches,
+    require_pyarrow,
+)
+from housing_regression.processing.exceptions import UnknownVersionError
+from housing_regression.processing.pipeline_cache import ARTIFACT_CACHE, PIPELINE_CACHE
+from housing_regression.processing.prediction_cache import PREDICTION_CACHE
+from housing_regression.processing.prediction_log import PREDICTION_LOG
+from housing_regression.processing.profiling import PROFILER
+from housing_regression.processing.validation import get_validator
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
 
 _logger = logging.getLogger(__name__)
 
+# names of versions, also used as file names
+_VERSION_PATTERN = re.compile(r"\w[\w.+-]*")
+
+# compiled programs live exactly as long as the pipelines they were built from
+_COMPILED: "weakref.WeakKeyDictionary[Pipeline, CompiledPipeline]" = (
+    weakref.WeakKeyDictionary()
+)
 
-def predict(input_data: Dict[str, Any], model_name: str) -> dict:
+
+def predict(
+    input_data: Dict[str, Any], model_name: str, compiled=False, version=None
+) -> dict:
     """Make prediction using persisted pipeline
 
     :param input_data: data as JSON {"predictor_name": <predictor_value>, ...}
     :param model_name: name of a model registered in housing_regression.models
+    :param compiled: score with the compiled NumPy program instead of the
+        pipeline, see housing_regression.processing.compiler
+    :param version: persisted version of the model, see model_path
     """
-    conf = MODELS[model_name]["config"]
+    start = time.perf_counter()
+    validated, rejected = check_inputs(input_data, model_name)
 
-    pipeline = dm.load_pipeline(conf.PATH)
-    data = pd.read_json(input_data)
-    validated = validate_inputs(data)
-
-    prediction_array = pipeline.predict(validated[conf.FEATURES])
+    # sklearn refuses to transform no rows, as when all of them are rejected
+    prediction_array = (
+        predict_features(validated, model_name, compiled=compiled, version=version)
+        if len(validated)
+        else np.empty(0)
+    )
     # np.ndarray is not JSON serializable
     prediction = prediction_array.tolist()
 
+    PREDICTION_LOG.log(
+        model_name,
+        validated,
+        prediction_array,
+        seconds=time.perf_counter() - start,
+        rejected=len(rejected),
+        version=version,
+    )
+
+    return {
+        "prediction": prediction,
+        "version": version or __version__,
+        "rejected": rejected,
+    }
+
+
+def prepare_inputs(input_data: Dict[str, Any], model_name: str) -> pd.DataFrame:
+    """Parses and validates input data, selects features of the model
+
+    :param input_data: data as JSON {"predictor_name": <predictor_value>, ...},
+        either the raw text or already parsed
+    :param model_name: name of a model registered in housing_regression.models
+
+    :returns: valid observations, ready for predict_features
+    """
+    return check_inputs(input_data, model_name)[0]
+
+
+def check_inputs(
+    input_data: Dict[str, Any], model_name: str
+) -> Tuple[pd.DataFrame, List[dict]]:
+    """Same as prepare_inputs, also reports the rejected observations
+
+    :returns: valid observations and [{"row": <position>, "reasons": [...]}]
+        of every rejected one, in the order of the input
+    """
+    conf = MODELS[model_name]["config"]
+    data = get_decoder(model_name).decode(input_data)
+    result = get_validator(model_name).check(data)
+    validated = data if result.mask.all() else data[result.mask]
+    rejected = [
+        {"row": row, "reasons": reasons}
+        for row, reasons in sorted(result.reasons.items())
+    ]
+    return validated[conf.FEATURES], rejected
+
+
+def predict_features(
+    features: pd.DataFrame, model_name: str, compiled=False, version=None
+) -> np.ndarray:
+    """Scores already validated observations
+
+    :param features: observations as returned by prepare_inputs
+    :param model_name: name of a model registered in housing_regression.models
+    :param compiled: score with the compiled NumPy program instead of the
+        pipeline, see housing_regression.processing.compiler
+    :param version: persisted version of the model, see model_path
+    """
+    pipeline, scorer = _load_scorer(model_name, compiled, version)
+    return _score(_cache_key(model_name, version), pipeline, scorer, features)
+
+
+def predict_batches(
+    records: Iterable[Optional[dict]],
+    model_name: str,
+    chunk_size: int = 1000,
+    compiled=False,
+    version=None,
+) -> Iterator[dict]:
+    """Scores a stream of observations in fixed-size chunks
+
+    Only a single chunk is held in memory at a time, so arbitrarily long
+    streams can be scored. Results are yielded in the order of the input, one
+    per record: {"row": <position>, "prediction": <value>} for scored records
+    and {"row": <position>, "error": <reason>} for rejected ones.
+
+    :param records: observations as dicts {"predictor_name": <value>, ...},
+        anything else (e.g. None for a record that failed to parse) is rejected
+    :param model_name: name of a model registered in housing_regression.models
+    :param chunk_size: number of records scored at once, at least 1
+    :param compiled: score with the compiled NumPy program instead of the
+        pipeline, see housing_regression.processing.compiler
+    :param version: persisted version of the model, see model_path
+
+    :raises ValueError: on call, not once iterated, if chunk_size is below 1
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be at least 1, got {chunk_size}")
+    return _predict_batches(records, model_name, chunk_size, compiled, version)
+
+
+def _predict_batches(
+    records: Iterable[Optional[dict]],
+    model_name: str,
+    chunk_size: int,
+    compiled: bool,
+    version: Optional[str],
+) -> Iterator[dict]:
+    conf = MODELS[model_name]["config"]
+    pipeline, scorer = _load_scorer(model_name, compiled, version)
+    cache_key = _cache_key(model_name, version)
+    decoder = get_decoder(model_name)
+    validator = get_validator(model_name)
+
+    records = iter(records)
+    start = 0
+    n_scored = 0
+    while True:
+        chunk = list(itertools.islice(records, chunk_size))
+        if not chunk:
+            break
+        rows = range(start, start + len(chunk))
+        start += len(chunk)
+
+        malformed = {row for row, rec in zip(rows, chunk) if not isinstance(rec, dict)}
+        data = decoder.from_records(
+            [rec for rec in chunk if isinstance(rec, dict)],
+            index=[row for row in rows if row not in malformed],
+        )
+        result = validator.check(data)
+        validated = data[result.mask]
+        predictions = (
+            dict(
+                zip(
+                    validated.index,
+                    _score(cache_key, pipeline, scorer, validated[conf.FEATURES]),
+                )
+            )
+            if len(validated)
+            else {}
+        )
+        reasons = {data.index[i]: reasons for i, reasons in result.reasons.items()}
+        n_scored += len(predictions)
+
+        for row in rows:
+            if row in predictions:
+                yield {"row": row, "prediction": float(predictions[row])}
+            elif row in malformed:
+                yield {"row": row, "error": "malformed record"}
+            else:
+                yield {"row": row, "error": "; ".join(reasons[row])}
+
+    _logger.info(
+        f"Made batch predictions with model version: {version or __version__} "
+        f"Records: {start} Scored: {n_scored}"
+    )
+
+
+def predict_arrow(
+    source, model_name: str, compiled=False, version=None
+) -> Iterator[bytes]:
+    """Scores observations in the Apache Arrow IPC stream format
+
+    Yields the Arrow IPC stream of predictions while the input is still being
+    read: one record batch per input batch with a float64 "prediction" column
+    holding a value for every input row, null for rows failing validation.
+    The model version is stored in the metadata of the schema.
+
+    :param source: Arrow IPC stream as bytes or a readable file-like object,
+        record batches must contain the features of the model
+    :param model_name: name of a model registered in housing_regression.models
+    :param compiled: score with the compiled NumPy program instead of the
+        pipeline, see housing_regression.processing.compiler
+    :param version: persisted version of the model, see model_path
+    """
+    pa = require_pyarrow()
+    conf = MODELS[model_name]["config"]
+    pipeline, scorer = _load_scorer(model_name, compiled, version)
+    cache_key = _cache_key(model_name, version)
+    decoder = get_decoder(model_name)
+    validator = get_validator(model_name)
+    schema = pa.schema(
+        [("prediction", pa.float64())], metadata={"version": version or __version__}
+    )
+
+    sink = io.BytesIO()
+    n_rows = 0
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in read_arrow_batches(source):
+            data = decoder.from_arrow(batch)
+            mask = validator.check(data).mask
+            prediction = np.full(batch.num_rows, np.nan)
+            if mask.any():
+                prediction[mask] = _score(
+                    cache_key, pipeline, scorer, data.loc[mask, conf.FEATURES]
+                )
+            n_rows += batch.num_rows
+            writer.write_batch(
+                pa.record_batch([pa.array(prediction, from_pandas=True)], schema=schema)
+            )
+            yield _drain(sink)
+    yield _drain(sink)
+
     _logger.info(
-        f"Made predictions with model version: {__version__} "
-        f"Inputs: {validated} "
-        f"Predictions: {prediction}"
+        f"Made Arrow predictions with model version: {version or __version__} "
+        f"Rows: {n_rows}"
     )
 
-    return {"prediction": prediction, "version": __version__}
+
+def _load_scorer(
+    model_name: str, compiled: bool, version: str = None
+) -> Tuple["Pipeline", Any]:
+    """The persisted pipeline and what scores it, possibly its compiled program"""
+    pipeline = load_model(model_name, version)
+    return pipeline, _compile(pipeline, model_name) if compiled else pipeline
+
+
+def _cache_key(model_name: str, version: str = None) -> str:
+    """Identifies a version of a model in the prediction cache"""
+    return model_name if version is None else f"{model_name}/{version}"
+
+
+def _score(cache_key: str, pipeline: "Pipeline", scorer, features: pd.DataFrame):
+    """Predictions served from the prediction cache where enabled
+
+    Cached predictions are keyed by the model and version, not by the
+    scorer, and are dropped once the pipeline is reloaded, see
+    housing_regression.processing.prediction_cache.
+    """
+    return PREDICTION_CACHE.predict(cache_key, pipeline, features, scorer.predict)
+
+
+def _drain(sink: io.BytesIO) -> bytes:
+    """Takes the bytes written to the sink so far"""
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+
+def load_model(model_name: str, version: str = None) -> "Pipeline":
+    """Returns the persisted pipeline of a registered model
+
+    Pipelines are cached in memory and only reloaded when the artifact changes.
+    Default pipelines stay loaded, versions may be evicted once more of them
+    are loaded than the cache keeps, see PipelineCache.
+    They are instrumented by the shared profiler, which records per-step
+    measurements once enabled, see housing_regression.processing.profiling.
+
+    :param model_name: name of a model registered in housing_regression.models
+    :param version: persisted version of the model, see model_path
+    :raises UnknownVersionError: if the version is not persisted
+    """
+    path = model_path(model_name, version)
+    try:
+        pipeline = PIPELINE_CACHE.get(model_name, path, pinned=version is None)
+    except FileNotFoundError:
+        if version is None:
+            raise
+        raise UnknownVersionError(f"Model {model_name} has no version {version}.")
+    return PROFILER.instrument(pipeline, _cache_key(model_name, version))
+
+
+def load_compiled_model(model_name: str, version: str = None) -> CompiledPipeline:
+    """Returns the persisted pipeline of a registered model compiled to NumPy
+
+    :param model_name: name of a model registered in housing_regression.models
+    :param version: persisted version of the model, see model_path
+    """
+    return _compile(load_model(model_name, version), model_name)
+
+
+def model_path(model_name: str, version: str = None) -> str:
+    """Path of a persisted version of a registered model
+
+    Versions are stored as <VERSIONS_DIR><version>.pkl (see dev_config) and
+    served side by side with the default pipeline at PATH.
+
+    :param model_name: name of a model registered in housing_regression.models
+    :param version: name of the version, the default pipeline if None
+    """
+    conf = MODELS[model_name]["config"]
+    if version is None:
+        return conf.PATH
+    if not _VERSION_PATTERN.fullmatch(version):
+        raise UnknownVersionError(f"Invalid version {version!r}.")
+    return os.path.join(conf.VERSIONS_DIR, version + ".pkl")
+
+
+def has_version(model_name: str, version: str) -> bool:
+    """Whether the version of a registered model is persisted"""
+    try:
+        return os.path.exists(model_path(model_name, version))
+    except UnknownVersionError:
+        return False
+
+
+def available_versions(model_name: str) -> List[str]:
+    """Sorted names of the persisted versions of a registered model"""
+    directory = getattr(MODELS[model_name]["config"], "VERSIONS_DIR", None)
+    try:
+        file_names = os.listdir(directory) if directory else []
+    except FileNotFoundError:
+        file_names = []
+    return sorted(
+        name[: -len(".pkl")]
+        for name in file_names
+        if name.endswith(".pkl") and _VERSION_PATTERN.fullmatch(name[: -len(".pkl")])
+    )
+
+
+def preload_model(model_name: str, version: str = None) -> Optional[threading.Thread]:
+    """Loads a version of a model in the background, see PipelineCache.preload
+
+    Requests keep being served by the version loaded before until it is
+    replaced, so a new version can be made ready before it is needed.
+
+    :returns: the thread loading the pipeline, None if it is loaded already
+    :raises UnknownVersionError: if the version is not persisted
+    """
+    try:
+        path = model_path(model_name, version)
+        return PIPELINE_CACHE.preload(model_name, path, pinned=version is None)
+    except FileNotFoundError:
+        if version is None:
+            raise
+        raise UnknownVersionError(f"Model {model_name} has no version {version}.")
+
+
+def unload_model(model_name: str, version: str = None) -> bool:
+    """Frees the memory of a loaded version of a model
+
+    The version is loaded again by the next request for it.
+
+    :returns: whether the version was loaded
+    """
+    return PIPELINE_CACHE.remove(model_name, model_path(model_name, version))
+
+
+def _compile(pipeline: "Pipeline", model_name: str) -> CompiledPipeline:
+    program = _COMPILED.get(pipeline)
+    if program is None:
+        # imports scikit-learn, which loading the pipeline did anyway
+        from housing_regression.processing.compiler import compile_pipeline
+
+        conf = MODELS[model_name]["config"]
+        program = _COMPILED[pipeline] = compile_pipeline(pipeline, conf.FEATURES)
+    return program
+
+
+def load_artifact_model(model_name: str) -> CompiledPipeline:
+    """Returns the exported artifact of a registered model
+
+    Unlike load_compiled_model, the pickled pipeline is never loaded, see
+    housing_regression.processing.artifact.
+
+    :param model_name: name of a model registered in housing_regression.models
+    """
+    return ARTIFACT_CACHE.get(model_name, MODELS[model_name]["config"].ARTIFACT_PATH)
+
+
+@functools.lru_cache(maxsize=None)
+def get_decoder(model_name: str) -> FeatureDecoder:
+    """Returns the decoder of input data for a registered model
+
+    :param model_name: name of a model registered in housing_regression.models
+    """
+    conf = MODELS[model_name]["config"]
+    return FeatureDecoder(conf.FEATURES, conf.CATEGORICAL_VARS)
+
+
+def warm_up(model_names: Iterable[str] = None, versions=False) -> None:
+    """Loads persisted pipelines into the cache before they are first needed
+
+    :param model_names: names of registered models, defaults to all of them
+    :param versions: also load all persisted versions of the models
+    """
+    if model_names is None:
+        model_names = MODELS.keys()
+    for name in model_names:
+        PIPELINE_CACHE.get(name, model_path(name), pinned=True)
+        for version in available_versions(name) if versions else ():
+            PIPELINE_CACHE.get(name, model_path(name, version))
@@ -0,0 +1,252 @@
+"""
+Compact model artifacts loadable without scikit-learn or pandas
+
+A compiled pipeline (see housing_regression.processing.compiled) is
+exported as a single file: a JSON manifest describing the column operations
+and the predictor, followed by the numeric arrays (coefficients) in raw
+little-endian form:
+
+    b"HRMODEL\\0" | manifest length (uint64) | manifest | padding | arrays
+
+Arrays are aligned to 64 bytes and memory mapped on load, so processes
+loading the same artifact share its pages. Functions applied to columns are
+stored by their import path and must be importable module level functions
+or NumPy ufuncs; lambdas cannot be exported.
+
+The manifest records the format version and the package version. An
+artifact is loaded only by a package of the same major and minor version.
+
+This module deliberately depends on NumPy only.
+"""
+import importlib
+import json
+import logging
+import os
+import struct
+import tempfile
+from typing import Callable
+
+import numpy as np
+
+from housing_regression import __version__
+from housing_regression.processing import compiled as comp
+from housing_regression.processing.exceptions import (
+    IncompatibleArtifactError,
+    UnsupportedPipelineError,
+)
+
+_logger = logging.getLogger(__name__)
+
+MAGIC = b"HRMODEL\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_HEADER = struct.Struct("<8sQ")
+
+
+def export_artifact(program: comp.CompiledPipeline, path: str, name: str = None):
+    """Writes the compiled pipeline to path, replacing the file atomically
+
+    :param program: see housing_regression.processing.compiler
+    :param path: where to write the artifact
+    :param name: name of the model, recorded in the manifest
+    """
+    predictor = program.predictor
+    # including the zero appended for unknown categories
+    arrays = {"coef": np.ascontiguousarray(predictor.coef, dtype="<f8")}
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "package_version": __version__,
+        "name": name,
+        "features": list(program.features),
+        "categorical": list(program.categorical),
+        "operations": [_operation_spec(op) for op in program.operations],
+        "predictor": {
+            "intercept": predictor.intercept,
+            "coef": "coef",
+            "numeric": [[var, int(pos)] for var, pos in predictor.numeric],
+            "categorical": [
+                [var, [[_plain(cat), int(pos)] for cat, pos in positions.items()]]
+                for var, positions in predictor.categorical
+            ],
+        },
+    }
+
+    layout, offset = {}, 0
+    for array_name, array in arrays.items():
+        offset = _align(offset)
+        layout[array_name] = {
+            "offset": offset,
+            "dtype": array.dtype.str,
+            "shape": list(array.shape),
+        }
+        offset += array.nbytes
+    manifest["arrays"] = layout
+    header = json.dumps(manifest, allow_nan=False).encode()
+    data_start = _align(_HEADER.size + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(_HEADER.pack(MAGIC, len(header)))
+            file.write(header)
+            for array_name, array in arrays.items():
+                file.seek(data_start + layout[array_name]["offset"])
+                file.write(array.tobytes())
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    _logger.info(f"exported model artifact to {path}")
+
+
+def load_artifact(path: str) -> comp.CompiledPipeline:
+    """Rebuilds the compiled pipeline, arrays are memory mapped read-only
+
+    :raises IncompatibleArtifactError: if written by another format or an
+        incompatible version of the package
+    """
+    with open(path, "rb") as file:
+        header = file.read(_HEADER.size)
+        magic, length = (
+            _HEADER.unpack(header) if len(header) == _HEADER.size else (None, 0)
+        )
+        if magic != MAGIC:
+            raise IncompatibleArtifactError(f"{path} is not a model artifact.")
+        manifest = json.loads(file.read(length))
+    check_version(manifest, path)
+
+    data_start = _align(_HEADER.size + length)
+    arrays = {
+        array_name: np.memmap(
+            path,
+            dtype=np.dtype(spec["dtype"]),
+            mode="r",
+            offset=data_start + spec["offset"],
+            shape=tuple(spec["shape"]),
+        )
+        for array_name, spec in manifest["arrays"].items()
+    }
+
+    predictor = manifest["predictor"]
+    return comp.CompiledPipeline(
+        features=manifest["features"],
+        categorical=manifest["categorical"],
+        operations=[_operation(spec) for spec in manifest["operations"]],
+        predictor=comp.LinearPredictor(
+            coef=arrays[predictor["coef"]],
+            intercept=predictor["intercept"],
+            numeric=[(var, pos) for var, pos in predictor["numeric"]],
+            categorical=[
+                (var, {cat: pos for cat, pos in positions})
+                for var, positions in predictor["categorical"]
+            ],
+            padded=True,
+        ),
+    )
+
+
+def check_version(manifest: dict, path: str = "artifact") -> None:
+    """Accepts artifacts of this format and the same major.minor version"""
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise IncompatibleArtifactError(
+            f"{path} has format version {manifest.get('format_version')}, "
+            f"supported is {FORMAT_VERSION}."
+        )
+    exported = str(manifest.get("package_version"))
+    if exported.split(".")[:2] != __version__.split(".")[:2]:
+        raise IncompatibleArtifactError(
+            f"{path} was exported by version {exported}, "
+            f"incompatible with {__version__}."
+        )
+    if exported != __version__:
+        _logger.warning(f"{path} was exported by version {exported}")
+
+
+def _operation_spec(operation) -> dict:
+    if isinstance(operation, comp.FillMissing):
+        return {
+            "op": "fill_missing",
+            "variable": operation.variable,
+            "value": _plain(operation.value),
+        }
+    if isinstance(operation, comp.ApplyUnary):
+        return {
+            "op": "apply_unary",
+            "variable": operation.variable,
+            "func": function_path(operation.func),
+        }
+    if isinstance(operation, comp.ApplyBinary):
+        return {
+            "op": "apply_binary",
+            "variable": operation.variable,
+            "reference_var": operation.reference_var,
+            "func": function_path(operation.func),
+        }
+    if isinstance(operation, comp.Drop):
+        return {"op": "drop", "variables": list(operation.variables)}
+    if isinstance(operation, comp.MergeRareLabels):
+        return {
+            "op": "merge_rare_labels",
+            "variable": operation.variable,
+            # sorted for reproducible artifacts
+            "frequent_labels": sorted(map(_plain, operation.frequent_labels), key=str),
+        }
+    raise UnsupportedPipelineError(
+        f"Operation {type(operation).__name__} cannot be exported."
+    )
+
+
+def _operation(spec: dict):
+    op = spec["op"]
+    if op == "fill_missing":
+        return comp.FillMissing(spec["variable"], spec["value"])
+    if op == "apply_unary":
+        return comp.ApplyUnary(spec["variable"], resolve_function(spec["func"]))
+    if op == "apply_binary":
+        return comp.ApplyBinary(
+            spec["variable"], spec["reference_var"], resolve_function(spec["func"])
+        )
+    if op == "drop":
+        return comp.Drop(spec["variables"])
+    if op == "merge_rare_labels":
+        return comp.MergeRareLabels(spec["variable"], spec["frequent_labels"])
+    raise IncompatibleArtifactError(f"Unknown operation {op}.")
+
+
+def function_path(func: Callable) -> str:
+    """Import path module:qualname of a function, checked to resolve back"""
+    if isinstance(func, np.ufunc):
+        path = f"numpy:{func.__name__}"
+    else:
+        path = (
+            f"{getattr(func, '__module__', None)}:{getattr(func, '__qualname__', '')}"
+        )
+    try:
+        resolved = resolve_function(path)
+    except (ImportError, AttributeError, ValueError):
+        resolved = None
+    if resolved is not func:
+        raise UnsupportedPipelineError(
+            f"Function {func!r} cannot be exported, use a module level function."
+        )
+    return path
+
+
+def resolve_function(path: str) -> Callable:
+    """Imports a function given by function_path"""
+    module_name, _, qualname = path.partition(":")
+    obj = importlib.import_module(module_name)
+    for attribute in qualname.split("."):
+        obj = getattr(obj, attribute)
+    return obj
+
+
+def _plain(value):
+    """NumPy scalars as built-in Python values, for JSON"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
@@ -0,0 +1,206 @@
+"""
+Flat NumPy representation of fitted pipelines
+
+Scoring a single observation through a scikit-learn pipeline built from
+pd.DataFrame transformers is dominated by pandas overhead (copies, dtype casts,
+index alignment) rather than by the model itself. A compiled pipeline keeps
+only the fitted constants and applies them column by column to plain NumPy
+arrays. Pipelines are compiled by housing_regression.processing.compiler.
+
+This module deliberately depends on NumPy only.
+"""
+from typing import Callable, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from housing_regression.processing.exceptions import InvalidInputError
+
+Columns = Dict[str, np.ndarray]
+
+
+def is_missing(values: np.ndarray) -> np.ndarray:
+    """Elementwise check for NaN, consistent with sklearn.impute.SimpleImputer"""
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    if values.dtype.kind == "O":
+        # NaN is the only value not equal to itself
+        return values != values
+    return np.zeros(len(values), dtype=bool)
+
+
+class FillMissing:
+    """Replaces missing values of a column with a fitted constant"""
+
+    def __init__(self, variable: str, value):
+
+        self.variable = variable
+        self.value = value
+
+    def __call__(self, columns: Columns) -> None:
+        values = columns[self.variable]
+        missing = is_missing(values)
+        if missing.any():
+            values = values.copy()
+            values[missing] = self.value
+            columns[self.variable] = values
+
+
+class ApplyUnary:
+    """Applies a function to a column, see UnivariateTransformer"""
+
+    def __init__(self, variable: str, func: Callable):
+
+        self.variable = variable
+        self.func = func
+
+    def __call__(self, columns: Columns) -> None:
+        try:
+            columns[self.variable] = self.func(columns[self.variable])
+        except Exception as error:
+            raise InvalidInputError(
+                ("Provided function failed to transform" f" column {self.variable}.")
+            ) from error
+
+
+class ApplyBinary:
+    """Combines a column with a reference column, see BivariateTransformer"""
+
+    def __init__(self, variable: str, reference_var: str, func: Callable):
+
+        self.variable = variable
+        self.reference_var = reference_var
+        self.func = func
+
+    def __call__(self, columns: Columns) -> None:
+        try:
+            columns[self.variable] = self.func(
+                columns[self.variable], columns[self.reference_var]
+            )
+        except Exception as error:
+            raise InvalidInputError(
+                ("Provided function failed to transform" f" column {self.variable}.")
+            ) from error
+
+
+class Drop:
+    """Removes columns no longer needed"""
+
+    def __init__(self, variables: List[str]):
+
+        self.variables = variables
+
+    def __call__(self, columns: Columns) -> None:
+        for variable in self.variables:
+            columns.pop(variable, None)
+
+
+class MergeRareLabels:
+    """Replaces labels outside of a fitted set with 'rare'"""
+
+    def __init__(self, variable: str, frequent_labels: Sequence):
+
+        self.variable = variable
+        self.frequent_labels = set(frequent_labels)
+
+    def __call__(self, columns: Columns) -> None:
+        frequent = self.frequent_labels
+        values = columns[self.variable]
+        encoded = np.empty(len(values), dtype=object)
+        encoded[:] = [value if value in frequent else "rare" for value in values]
+        columns[self.variable] = encoded
+
+
+class LinearPredictor:
+    """Dot product of a linear model with implicitly one-hot encoded features
+
+    Instead of materialising the one-hot encoded matrix every categorical
+    variable is turned into an index into the coefficient vector. Unknown
+    categories point past the last coefficient, to an appended zero.
+
+    :param coef: coefficients of the model in the order of its input features
+    :param intercept: intercept of the model
+    :param numeric: (variable, position in coef) of numeric features
+    :param categorical: (variable, {category: position in coef}) of one-hot
+        encoded features
+    :param padded: coef already ends with the zero for unknown categories and
+        is used as is, e.g. when memory mapped
+    """
+
+    def __init__(
+        self,
+        coef: np.ndarray,
+        intercept: float,
+        numeric: List[Tuple[str, int]],
+        categorical: List[Tuple[str, Mapping]],
+        padded: bool = False,
+    ):
+
+        self.coef = coef if padded else np.append(np.asarray(coef, np.float64), 0.0)
+        self.intercept = float(intercept)
+        self.numeric = numeric
+        self.categorical = categorical
+
+    def __call__(self, columns: Columns, n_rows: int) -> np.ndarray:
+        prediction = np.full(n_rows, self.intercept)
+        for variable, position in self.numeric:
+            prediction += self.coef[position] * np.asarray(
+                columns[variable], dtype=np.float64
+            )
+        for variable, positions in self.categorical:
+            indices = np.fromiter(
+                (positions.get(value, -1) for value in columns[variable]),
+                dtype=np.intp,
+                count=n_rows,
+            )
+            prediction += self.coef[indices]
+        return prediction
+
+
+class CompiledPipeline:
+    """Fitted pipeline reduced to a sequence of column operations
+
+    :param features: input variables in the order expected by the pipeline
+    :param categorical: input variables holding labels rather than numbers
+    :param operations: callables modifying a dict of columns in place
+    :param predictor: final step producing predictions from the columns
+    """
+
+    def __init__(
+        self,
+        features: List[str],
+        categorical: List[str],
+        operations: List[Callable[[Columns], None]],
+        predictor: LinearPredictor,
+    ):
+
+        self.features = features
+        self.categorical = categorical
+        self.operations = operations
+        self.predictor = predictor
+
+    def predict(self, X) -> np.ndarray:
+        """Predicts the target
+
+        :param X: pd.DataFrame or mapping of variable names to array-likes
+
+        :returns: predictions
+        """
+        columns = self.to_columns(X)
+        n_rows = len(columns[self.features[0]]) if self.features else 0
+        for operation in self.operations:
+            operation(columns)
+        return self.predictor(columns, n_rows)
+
+    def to_columns(self, X) -> Columns:
+        """Extracts the features as NumPy arrays of the expected types"""
+        categorical = set(self.categorical)
+        columns = {}
+        for feature in self.features:
+            values = X[feature]
+            if hasattr(values, "to_numpy"):
+                values = values.to_numpy()
+            if feature in categorical:
+                columns[feature] = np.asarray(values, dtype=object)
+            else:
+                columns[feature] = np.asarray(values, dtype=np.float64)
+        return columns
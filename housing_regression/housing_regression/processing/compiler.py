@@ -0,0 +1,215 @@
+"""
+Compilation of fitted pipelines into housing_regression.processing.compiled
+
+Supports pipelines built from the custom transformers, SimpleImputer inside
+of ColumnTransformerDF, a final one-hot encoding step (OneHotEncoderDF or
+ColumnTransformer with OneHotEncoder) and a linear model. Anything else raises
+UnsupportedPipelineError - use the original pipeline in such a case.
+"""
+from typing import Dict, List, Set, Tuple
+
+import numpy as np
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from housing_regression.processing import compiled as comp
+from housing_regression.processing import transformers as tran
+from housing_regression.processing.exceptions import UnsupportedPipelineError
+
+
+def compile_pipeline(pipeline: Pipeline, features: List[str]) -> comp.CompiledPipeline:
+    """Turns a fitted pipeline into a flat NumPy program
+
+    :param pipeline: fitted pipeline
+    :param features: variables the pipeline was fitted on, in the same order
+
+    :returns: compiled pipeline giving the same predictions
+    """
+    operations, layout, categorical = _trace(pipeline, features)
+    return comp.CompiledPipeline(
+        features=list(features),
+        categorical=[var for var in features if var in categorical],
+        operations=operations,
+        predictor=_compile_linear_model(pipeline.steps[-1][1], layout),
+    )
+
+
+def feature_map(pipeline: Pipeline, features: List[str]) -> Dict[str, tuple]:
+    """Maps columns of the matrix fed to the final estimator to the variables
+
+    Indicators of one-hot encoded variables are named <variable>_<category>
+    and map to (variable, category), other columns map to (variable, None).
+    Follows the order of the columns, dense or sparse alike.
+
+    :param pipeline: fitted pipeline, see compile_pipeline for supported steps
+    :param features: variables the pipeline was fitted on, in the same order
+    """
+    _, layout, _ = _trace(pipeline, features)
+    columns = {}
+    for kind, variable, categories in layout:
+        if kind == "numeric":
+            columns[variable] = (variable, None)
+        else:
+            for category in categories:
+                columns[f"{variable}_{category}"] = (variable, category)
+    return columns
+
+
+def _trace(pipeline: Pipeline, features: List[str]) -> Tuple[list, list, Set[str]]:
+    """Operations of the transformers and layout of their output
+
+    :returns: operations, layout (see _compile_one_hot) and names of
+        categorical variables
+    """
+    columns = list(features)
+    categorical: Set[str] = set()
+    operations = []
+    layout = None
+
+    for name, step in pipeline.steps[:-1]:
+        if layout is not None:
+            raise UnsupportedPipelineError(
+                f"Step {name} follows one-hot encoding, which must come last."
+            )
+        if isinstance(step, tran.ColumnTransformerDF):
+            operations.extend(_compile_imputer(step, columns))
+        elif isinstance(step, tran.BivariateTransformer):
+            operations.extend(
+                comp.ApplyBinary(var, step.reference_var, step.func)
+                for var in step.variables
+            )
+        elif isinstance(step, tran.UnivariateTransformer):
+            operations.extend(comp.ApplyUnary(var, step.func) for var in step.variables)
+        elif isinstance(step, tran.FeatureDropper):
+            operations.append(comp.Drop(list(step.vars_to_drop)))
+            columns = [col for col in columns if col not in step.vars_to_drop]
+        elif isinstance(step, tran.RareLabelEncoder):
+            operations.extend(
+                comp.MergeRareLabels(var, step.frequent_labels_[var])
+                for var in step.variables
+            )
+            categorical.update(step.variables)
+        elif isinstance(step, tran.OneHotEncoderDF):
+            layout = [
+                ("categorical", var, list(step.dtypes_[var].categories))
+                for var in step.variables
+            ] + [("numeric", col, None) for col in columns if col not in step.variables]
+            categorical.update(step.variables)
+        elif isinstance(step, ColumnTransformer):
+            layout = _compile_one_hot(step, columns)
+            categorical.update(var for kind, var, _ in layout if kind == "categorical")
+        else:
+            raise UnsupportedPipelineError(
+                f"Step {name} of type {type(step).__name__} cannot be compiled."
+            )
+
+    if layout is None:
+        layout = [("numeric", col, None) for col in columns]
+    return operations, layout, categorical
+
+
+def _column_names(spec, names_in) -> List[str]:
+    """Resolves column specification of ColumnTransformer to column names"""
+    if isinstance(spec, str):
+        return [spec]
+    spec = list(spec)
+    if all(isinstance(col, str) for col in spec):
+        return spec
+    if all(isinstance(col, (int, np.integer)) for col in spec):
+        return [names_in[col] for col in spec]
+    raise UnsupportedPipelineError(f"Unsupported column specification: {spec}")
+
+
+def _compile_imputer(step: tran.ColumnTransformerDF, columns: List[str]) -> list:
+    """Translates SimpleImputers into FillMissing operations"""
+    operations = []
+    for name, transformer, spec in step.transformers_:
+        if transformer in ("drop", "passthrough"):
+            if transformer == "drop" and len(spec):
+                raise UnsupportedPipelineError(
+                    "ColumnTransformerDF cannot drop columns."
+                )
+            continue
+        if not isinstance(transformer, SimpleImputer) or transformer.add_indicator:
+            raise UnsupportedPipelineError(f"Transformer {name} cannot be compiled.")
+        if not _is_nan(transformer.missing_values):
+            raise UnsupportedPipelineError(
+                f"Imputer {name} must treat NaN as the missing value."
+            )
+        variables = _column_names(spec, getattr(step, "feature_names_in_", columns))
+        operations.extend(
+            comp.FillMissing(var, value)
+            for var, value in zip(variables, transformer.statistics_)
+        )
+    return operations
+
+
+def _compile_one_hot(step: ColumnTransformer, columns: List[str]) -> list:
+    """Finds the order of features produced by the one-hot encoding step
+
+    :returns: list of ("numeric", variable, None) and
+        ("categorical", variable, categories) in the order of the output
+    """
+    layout = []
+    names_in = getattr(step, "feature_names_in_", columns)
+    for name, transformer, spec in step.transformers_:
+        variables = _column_names(spec, names_in)
+        if transformer == "drop":
+            continue
+        if transformer == "passthrough":
+            layout.extend(("numeric", var, None) for var in variables)
+        elif isinstance(transformer, OneHotEncoder):
+            if (
+                transformer.drop_idx_ is not None
+                or transformer.handle_unknown != "ignore"
+                or getattr(transformer, "_infrequent_enabled", False)
+            ):
+                raise UnsupportedPipelineError(
+                    f"Encoder {name} must be a plain OneHotEncoder"
+                    " with handle_unknown='ignore'."
+                )
+            layout.extend(
+                ("categorical", var, list(categories))
+                for var, categories in zip(variables, transformer.categories_)
+            )
+        else:
+            raise UnsupportedPipelineError(f"Transformer {name} cannot be compiled.")
+    return layout
+
+
+def _compile_linear_model(estimator, layout: list) -> comp.LinearPredictor:
+    """Maps coefficients of the linear model to the features"""
+    coef = getattr(estimator, "coef_", None)
+    if coef is None or np.ndim(coef) != 1 or np.ndim(estimator.intercept_) != 0:
+        raise UnsupportedPipelineError(
+            f"Estimator {type(estimator).__name__} is not a single-output linear model."
+        )
+
+    numeric, categorical = [], []
+    position = 0
+    for kind, variable, categories in layout:
+        if kind == "numeric":
+            numeric.append((variable, position))
+            position += 1
+        else:
+            positions = {cat: position + i for i, cat in enumerate(categories)}
+            categorical.append((variable, positions))
+            position += len(categories)
+
+    if position != len(coef):
+        raise UnsupportedPipelineError(
+            f"Expected {position} coefficients, the model has {len(coef)}."
+        )
+
+    return comp.LinearPredictor(
+        coef=coef,
+        intercept=estimator.intercept_,
+        numeric=numeric,
+        categorical=categorical,
+    )
+
+
+def _is_nan(value) -> bool:
+    return isinstance(value, float) and np.isnan(value)
@@ -4,10 +4,14 @@ Functionality to manage data - datasets, persisted pipelines etc.
 Will be extended in the future to handling multiple pipelines, logging etc.
 """
 import logging
+import os
+import tempfile
+from typing import TYPE_CHECKING, Iterator, List
 
-import joblib
 import pandas as pd
-from sklearn.pipeline import Pipeline
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
 
 _logger = logging.getLogger(__name__)
 
@@ -18,14 +22,69 @@ def load_dataset(path: str) -> pd.DataFrame:
     return pd.read_csv(path)
 
 
-def save_pipeline(pipe: Pipeline, path: str) -> None:
-    """Save pipeline"""
+def iter_dataset(
+    path: str, chunk_size: int, columns: List[str] = None
+) -> Iterator[pd.DataFrame]:
+    """Reads csv or parquet data in chunks
+
+    Parquet files require pyarrow, see require_parquet.
+
+    :param path: path to the dataset, format is given by the extension
+    :param chunk_size: maximum number of rows per chunk
+    :param columns: read only these columns, all by default
+    """
+    _logger.info(f"loading data from {path} in chunks of {chunk_size} rows")
+    if is_parquet(path):
+        pq = require_parquet()
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size, usecols=columns)
+
+
+def is_parquet(path: str) -> bool:
+    """Is the file parquet (judging by the extension)?"""
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+
+def require_parquet():
+    """Imports pyarrow.parquet, with a clear message when it is not installed"""
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as error:
+        raise ImportError(
+            "Parquet files require pyarrow, install housing_regression[parquet]"
+        ) from error
+    return pq
+
+
+def save_pipeline(pipe: "Pipeline", path: str) -> None:
+    """Save pipeline, replacing the file atomically
+
+    Processes serving the previous pipeline never see a partially written
+    file, see housing_regression.processing.pipeline_cache.
+    """
     _logger.info(f"saving pipeline to {path}")
-    joblib.dump(pipe, path)
+    import joblib
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(descriptor)
+    try:
+        joblib.dump(pipe, temp_path)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
 
 
-def load_pipeline(path: str) -> Pipeline:
+def load_pipeline(path: str) -> "Pipeline":
     """Load a persisted pipeline"""
     _logger.info(f"loading pipeline from {path}")
+    import joblib
+
     trained_model = joblib.load(filename=path)
     return trained_model
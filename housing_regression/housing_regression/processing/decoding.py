@@ -0,0 +1,243 @@
+"""
+Schema-driven decoding of JSON input data into feature columns
+
+pd.read_json builds a dataframe from every field of a record (about 80 of
+them in the Kaggle data) and infers the type of each column, even though a
+model uses only a handful of them. The decoder below reads only the declared
+features and fills typed NumPy columns directly: float64 for numeric
+features, object for categorical ones, NaN for missing values in both.
+A value of a numeric feature which is not a number does not fail the whole
+input: it is decoded as NaN and flagged in data.attrs[INVALID_VALUES], so
+that validation rejects just its row (see validation.Validator.check).
+
+JSON text is parsed by orjson when installed, the standard library is used
+otherwise. Columnar input in the Apache Arrow IPC stream format is decoded
+column by column without going through Python objects, except for labels of
+categorical features. Arrow support requires pyarrow.
+"""
+import json
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from housing_regression.processing.exceptions import InvalidInputError
+
+if TYPE_CHECKING:
+    import pyarrow
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover
+    _loads = json.loads
+
+# key of data.attrs holding {feature: labels of rows} whose value of the
+# feature is not a number, labels of the index of the data
+INVALID_VALUES = "invalid_values"
+
+
+def parse_json(input_data: Any) -> Any:
+    """Parses JSON text, already parsed data is returned unchanged
+
+    JSON encoded twice (a JSON string holding the data) is parsed twice.
+
+    :param input_data: str, bytes or already parsed data
+    """
+    while isinstance(input_data, (str, bytes, bytearray, memoryview)):
+        try:
+            input_data = _loads(input_data)
+        except ValueError as error:
+            raise InvalidInputError("Input data is not valid JSON.") from error
+    return input_data
+
+
+def to_records(data: Any) -> List[dict]:
+    """Normalises parsed JSON to a list of records
+
+    Accepts a list of records, a single record and the column oriented
+    format of pd.DataFrame.to_json {"predictor_name": {index: value}, ...}.
+    """
+    if isinstance(data, list):
+        if not all(isinstance(record, dict) for record in data):
+            raise InvalidInputError("Every record must be a JSON object.")
+        return data
+    if not isinstance(data, dict):
+        raise InvalidInputError("Input data must be a record or a list of them.")
+    if data and all(isinstance(value, (dict, list)) for value in data.values()):
+        columns = {
+            name: list(values.values()) if isinstance(values, dict) else values
+            for name, values in data.items()
+        }
+        n_rows = max(len(values) for values in columns.values())
+        return [
+            {name: values[i] for name, values in columns.items() if i < len(values)}
+            for i in range(n_rows)
+        ]
+    return [data]
+
+
+def read_arrow_batches(source) -> Iterator["pyarrow.RecordBatch"]:
+    """Reads record batches of an Arrow IPC stream as they arrive
+
+    :param source: bytes or a readable file-like object
+    """
+    pa = require_pyarrow()
+    try:
+        with pa.ipc.open_stream(source) as reader:
+            yield from reader
+    except pa.ArrowInvalid as error:
+        raise InvalidInputError("Input data is not a valid Arrow stream.") from error
+
+
+def require_pyarrow():
+    """Imports pyarrow, with a clear message when it is not installed"""
+    try:
+        import pyarrow as pa
+    except ImportError as error:
+        raise ImportError("Arrow input requires pyarrow") from error
+    return pa
+
+
+class FeatureDecoder:
+    """Builds typed feature columns from JSON records
+
+    Only the declared features are ever looked up, any other fields of the
+    records are ignored.
+
+    :param features: variables to extract, in the order of the output
+    :param categorical: features holding labels, all others are numeric
+    """
+
+    def __init__(self, features: Sequence[str], categorical: Sequence[str]):
+
+        self.features = list(features)
+        self.categorical = set(categorical)
+
+    def decode(self, input_data: Any) -> pd.DataFrame:
+        """Decodes JSON text or parsed JSON into a dataframe of the features
+
+        Unlike from_records, a feature absent from every record is an error.
+
+        :param input_data: JSON text (str or bytes) or parsed JSON, see
+            to_records for supported layouts
+        """
+        records = to_records(parse_json(input_data))
+        missing = [
+            var for var in self.features if not any(var in rec for rec in records)
+        ]
+        if records and missing:
+            raise InvalidInputError(f"Input data lacks features {missing}.")
+        return self.from_records(records)
+
+    def from_records(self, records: List[dict], index=None) -> pd.DataFrame:
+        """Builds a dataframe of the features from parsed records
+
+        Features missing in a record are missing values.
+
+        :param records: observations as dicts {"predictor_name": <value>, ...}
+        :param index: index of the result, RangeIndex by default
+        """
+        invalid = {}
+        # columns are in the order of features, passing columns= is slow
+        data = pd.DataFrame(self.columns(records, invalid), index=index)
+        return _flag_invalid(data, invalid)
+
+    def from_arrow(self, batch, index=None) -> pd.DataFrame:
+        """Builds a dataframe of the features from an Arrow table or batch
+
+        Numeric columns are cast to float64 by Arrow, float64 columns without
+        missing values are used without a copy. Values which cannot be cast
+        are NaN, flagged in attrs[INVALID_VALUES].
+
+        :param batch: pyarrow.RecordBatch or pyarrow.Table
+        :param index: index of the result, RangeIndex by default
+        """
+        pa = require_pyarrow()
+        missing = [var for var in self.features if var not in batch.schema.names]
+        if missing:
+            raise InvalidInputError(f"Input data lacks features {missing}.")
+
+        columns = {}
+        invalid = {}
+        for var in self.features:
+            column = batch.column(var)
+            if isinstance(column, pa.ChunkedArray):
+                column = column.combine_chunks()
+            if var in self.categorical:
+                if pa.types.is_dictionary(column.type):
+                    column = column.dictionary_decode()
+                values = column.to_numpy(zero_copy_only=False).astype(object)
+                values[column.is_null().to_numpy(zero_copy_only=False)] = np.nan
+            else:
+                try:
+                    # nulls become NaN
+                    values = column.cast(pa.float64()).to_numpy(zero_copy_only=False)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    values, invalid[var] = _coerce(column.to_pylist(), len(column))
+            columns[var] = values
+        return _flag_invalid(pd.DataFrame(columns, index=index), invalid)
+
+    def columns(
+        self, records: List[dict], invalid: Dict[str, np.ndarray] = None
+    ) -> Dict[str, np.ndarray]:
+        """Typed feature columns of the records
+
+        :param records: observations as dicts {"predictor_name": <value>, ...}
+        :param invalid: filled with {feature: boolean mask} of rows whose
+            value of a numeric feature is not a number, decoded as NaN
+        """
+        if not all(isinstance(record, dict) for record in records):
+            raise InvalidInputError("Every record must be a JSON object.")
+        n_rows = len(records)
+        columns = {}
+        for var in self.features:
+            if var in self.categorical:
+                values = np.empty(n_rows, dtype=object)
+                values[:] = [_label(record.get(var)) for record in records]
+            else:
+                try:
+                    values = np.fromiter(
+                        (_number(record.get(var)) for record in records),
+                        dtype=np.float64,
+                        count=n_rows,
+                    )
+                except (TypeError, ValueError, OverflowError):
+                    # slow path, only for input with invalid values
+                    values, failed = _coerce(
+                        (record.get(var) for record in records), n_rows
+                    )
+                    if invalid is not None:
+                        invalid[var] = failed
+            columns[var] = values
+        return columns
+
+
+def _number(value) -> float:
+    return np.nan if value is None else float(value)
+
+
+def _label(value):
+    return np.nan if value is None else value
+
+
+def _coerce(values: Iterable, n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Numbers of the values and a mask of values which are not numbers"""
+    numbers = np.empty(n_rows, dtype=np.float64)
+    failed = np.zeros(n_rows, dtype=bool)
+    for i, value in enumerate(values):
+        try:
+            numbers[i] = _number(value)
+        except (TypeError, ValueError, OverflowError):
+            numbers[i] = np.nan
+            failed[i] = True
+    return numbers, failed
+
+
+def _flag_invalid(data: pd.DataFrame, invalid: Dict[str, np.ndarray]) -> pd.DataFrame:
+    if invalid:
+        data.attrs[INVALID_VALUES] = {
+            var: frozenset(data.index[failed]) for var, failed in invalid.items()
+        }
+    return data
@@ -5,3 +5,15 @@ Collection of custom exceptions
 
 class InvalidInputError(Exception):
     "Invalid Input"
+
+
+class UnsupportedPipelineError(Exception):
+    "Pipeline contains steps that cannot be compiled or exported"
+
+
+class IncompatibleArtifactError(Exception):
+    "Model artifact was exported by an incompatible version of the package"
+
+
+class UnknownVersionError(Exception):
+    "Requested version of a model is not persisted"
@@ -0,0 +1,13 @@
+"""
+Column functions used by pipelines
+
+Kept apart from the pipeline definitions, which import scikit-learn, so that
+exported artifacts (see housing_regression.processing.artifact) can refer to
+them by name and be loaded without it.
+"""
+import numpy as np
+
+
+def diff(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Time passed between two dates"""
+    return b - a
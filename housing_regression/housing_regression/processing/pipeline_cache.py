@@ -0,0 +1,300 @@
+"""
+In-process cache of persisted pipelines
+
+Unpickling a pipeline is by far the most expensive part of scoring a handful
+of observations, so loaded pipelines are kept in memory and reused until the
+artifact on disk changes. The cache is safe to share between threads.
+
+With background_reload enabled a changed artifact is loaded by a background
+thread while requests keep being served by the pipeline loaded before, which
+is replaced only once the new one is fully loaded. Only the very first load
+of an artifact blocks, unless it was preloaded.
+
+With max_entries set, the least recently used pipelines are dropped once
+more are loaded, except for pinned ones (e.g. the default pipelines of the
+models). A pipeline is dropped as well once its artifact is deleted.
+"""
+import collections
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, NamedTuple, Optional, Tuple
+
+import housing_regression.processing.data_management as dm
+from housing_regression.processing.artifact import load_artifact
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+_logger = logging.getLogger(__name__)
+
+
+class ArtifactSignature(NamedTuple):
+    """Identifies a particular state of a persisted artifact"""
+
+    mtime_ns: int
+    size: int
+
+
+class CacheEntry(NamedTuple):
+    """Loaded pipeline together with the artifact it was loaded from"""
+
+    pipeline: "Pipeline"
+    signature: ArtifactSignature
+    load_time: float
+
+
+def artifact_signature(path: str) -> ArtifactSignature:
+    """Cheap fingerprint of a file on disk (modification time and size)"""
+    stat = os.stat(path)
+    return ArtifactSignature(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+class PipelineCache:
+    """Thread-safe cache of loaded pipelines
+
+    Entries are keyed by model name and artifact path and are valid as long as
+    the artifact signature does not change. When it does, the new artifact is
+    loaded once and replaces the old entry; callers already holding the old
+    pipeline keep using it undisturbed.
+
+    :param loader: function loading a pipeline from a path
+    :param background_reload: keep serving the loaded pipeline while a
+        changed artifact is loaded in the background, instead of waiting
+    :param max_entries: maximum number of pipelines kept besides the pinned
+        ones, 0 for no limit
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], "Pipeline"] = dm.load_pipeline,
+        background_reload=False,
+        max_entries: int = 0,
+    ):
+
+        self.loader = loader
+        self.background_reload = background_reload
+        self.max_entries = max_entries
+        # least recently used first
+        self._entries: "collections.OrderedDict[Tuple[str, str], CacheEntry]" = (
+            collections.OrderedDict()
+        )
+        # never evicted
+        self._pinned = set()
+        self._key_locks: Dict[Tuple[str, str], threading.Lock] = {}
+        # artifact being loaded in the background, or which failed to load
+        self._reloads: Dict[
+            Tuple[str, str], Tuple[ArtifactSignature, threading.Thread]
+        ] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "stale": 0,
+            "loads": 0,
+            "failed_loads": 0,
+            "evicted": 0,
+            "load_time": 0.0,
+        }
+
+    def get(self, name: str, path: str, pinned=False) -> "Pipeline":
+        """Returns the pipeline, loading it only if not cached or outdated
+
+        :param name: name of the model
+        :param path: path to the persisted pipeline
+        :param pinned: never evict the pipeline to respect max_entries
+
+        :returns: loaded pipeline
+        :raises FileNotFoundError: if the artifact does not exist, a pipeline
+            loaded from it before is dropped
+        """
+        key = (name, path)
+        signature = self._signature(key, path, pinned)
+
+        entry = self._entries.get(key)
+        if entry is not None and entry.signature == signature:
+            self._used(key, "hits")
+            return entry.pipeline
+        if entry is not None and self.background_reload:
+            self._used(key, "stale")
+            self._load_in_background(key, path, signature)
+            return entry.pipeline
+
+        # only one thread loads a given artifact, the others wait for it
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._used(key, "hits")
+                return entry.pipeline
+
+            self._increment("misses")
+            entry = self._load(path, signature)
+            with self._lock:
+                self._store(key, entry)
+
+        return entry.pipeline
+
+    def warm(self, models: Dict[str, str]) -> None:
+        """Loads pipelines ahead of the first request
+
+        :param models: mapping of model names to artifact paths
+        """
+        for name, path in models.items():
+            self.get(name, path)
+
+    def preload(self, name: str, path: str, pinned=False) -> Optional[threading.Thread]:
+        """Loads the pipeline in the background unless it is cached already
+
+        Requests keep being served by the pipeline cached before (if any)
+        until the new one is loaded.
+
+        :param pinned: never evict the pipeline to respect max_entries
+        :returns: the thread loading the pipeline, None if it is up to date
+        """
+        key = (name, path)
+        signature = self._signature(key, path, pinned)
+        entry = self._entries.get(key)
+        if entry is not None and entry.signature == signature:
+            return None
+        return self._load_in_background(key, path, signature)
+
+    def remove(self, name: str, path: str) -> bool:
+        """Drops the pipeline, a pending background load is discarded
+
+        :returns: whether the pipeline was loaded
+        """
+        with self._lock:
+            return self._drop((name, path))
+
+    def invalidate(self, name: str = None) -> None:
+        """Drops cached pipelines of a single model or all of them
+
+        Pending background loads are discarded, as by remove.
+        """
+        with self._lock:
+            keys = set(self._entries) | set(self._reloads) | set(self._key_locks)
+            for key in keys | self._pinned:
+                if name is None or key[0] == name:
+                    self._drop(key)
+
+    def stats(self) -> dict:
+        """Returns hit/miss/load counters and currently cached artifacts"""
+        with self._lock:
+            stats = dict(self._counters, max_entries=self.max_entries)
+            stats["entries"] = [
+                {
+                    "name": name,
+                    "path": path,
+                    "mtime_ns": entry.signature.mtime_ns,
+                    "load_time": entry.load_time,
+                    "pinned": (name, path) in self._pinned,
+                }
+                for (name, path), entry in self._entries.items()
+            ]
+        return stats
+
+    def _load(self, path: str, signature: ArtifactSignature) -> CacheEntry:
+        """Loads the artifact and records how long it took"""
+        start = time.perf_counter()
+        pipeline = self.loader(path)
+        load_time = time.perf_counter() - start
+
+        with self._lock:
+            self._counters["loads"] += 1
+            self._counters["load_time"] += load_time
+
+        _logger.info(f"loaded pipeline from {path} in {load_time:.3f}s")
+        return CacheEntry(pipeline=pipeline, signature=signature, load_time=load_time)
+
+    def _load_in_background(
+        self, key: Tuple[str, str], path: str, signature: ArtifactSignature
+    ) -> threading.Thread:
+        """Starts loading the artifact, unless already loading or failed"""
+        with self._lock:
+            reload = self._reloads.get(key)
+            if reload is not None and reload[0] == signature:
+                return reload[1]
+            thread = threading.Thread(
+                target=self._reload,
+                args=(key, path, signature),
+                name=f"load-{key[0]}",
+                daemon=True,
+            )
+            self._reloads[key] = (signature, thread)
+        thread.start()
+        return thread
+
+    def _reload(
+        self, key: Tuple[str, str], path: str, signature: ArtifactSignature
+    ) -> None:
+        with self._key_lock(key):
+            try:
+                entry = self._load(path, signature)
+            except Exception:
+                # kept in _reloads, so retried only once the artifact changes
+                self._increment("failed_loads")
+                _logger.exception(f"loading {path} failed, serving the loaded one")
+                return
+            with self._lock:
+                if self._reloads.get(key, (None,))[0] != signature:
+                    # removed or superseded while loading
+                    return
+                del self._reloads[key]
+                # a single assignment, requests see the old or the new entry
+                self._store(key, entry)
+
+    def _signature(self, key: Tuple[str, str], path: str, pinned: bool):
+        try:
+            signature = artifact_signature(path)
+        except FileNotFoundError:
+            self.remove(*key)
+            raise
+        if pinned and key not in self._pinned:
+            with self._lock:
+                self._pinned.add(key)
+        return signature
+
+    def _store(self, key: Tuple[str, str], entry: CacheEntry) -> None:
+        """Adds the entry and evicts the least recently used, under the lock"""
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        if not self.max_entries:
+            return
+        evictable = [other for other in self._entries if other not in self._pinned]
+        for other in evictable[: max(0, len(evictable) - self.max_entries)]:
+            del self._entries[other]
+            self._counters["evicted"] += 1
+            _logger.info(f"evicted pipeline {other[0]} loaded from {other[1]}")
+
+    def _drop(self, key: Tuple[str, str]) -> bool:
+        """Forgets everything about the key, under the lock
+
+        A background load still running finds its key gone from _reloads and
+        discards what it loaded.
+        """
+        self._reloads.pop(key, None)
+        self._key_locks.pop(key, None)
+        self._pinned.discard(key)
+        return self._entries.pop(key, None) is not None
+
+    def _used(self, key: Tuple[str, str], counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def _key_lock(self, key: Tuple[str, str]) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _increment(self, counter: str) -> None:
+        with self._lock:
+            self._counters[counter] += 1
+
+
+# shared by everything scoring within the process
+PIPELINE_CACHE = PipelineCache()
+
+# exported artifacts, see housing_regression.processing.artifact
+ARTIFACT_CACHE = PipelineCache(loader=load_artifact)
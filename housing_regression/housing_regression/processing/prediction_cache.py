@@ -0,0 +1,178 @@
+"""
+In-process cache of predictions of repeated observations
+
+Observations are keyed by a 64 bit hash of their canonicalised feature
+values (pd.util.hash_pandas_object) together with the model and the package
+version. Batches are looked up row by row and only the misses are scored.
+Entries expire after a time to live and the least recently used ones are
+dropped above a maximum number of entries, which bounds the memory used.
+
+Predictions of a model are dropped as soon as it is scored by another
+pipeline object than before, i.e. when the persisted pipeline was reloaded.
+The cache is disabled (max_entries=0) until configured.
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List
+
+import numpy as np
+import pandas as pd
+
+from housing_regression import __version__
+
+
+class PredictionCache:
+    """Thread-safe LRU cache of predictions with a time to live
+
+    :param max_entries: maximum number of cached predictions, 0 disables
+        the cache
+    :param ttl: seconds a prediction stays valid
+    """
+
+    def __init__(self, max_entries: int = 0, ttl: float = 300):
+
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._generations: Dict[Hashable, weakref.ref] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evicted": 0,
+            "invalidated": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def configure(self, max_entries: int, ttl: float = None) -> None:
+        """Changes the limits, drops entries above the new maximum"""
+        with self._lock:
+            self.max_entries = max_entries
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+
+    def predict(
+        self,
+        model: Hashable,
+        pipeline,
+        features: pd.DataFrame,
+        score: Callable[[pd.DataFrame], np.ndarray] = None,
+    ) -> np.ndarray:
+        """Predictions of the features, scoring only those not cached
+
+        :param model: identifies the model, e.g. its name
+        :param pipeline: object scoring the model, predictions cached for
+            another object of the same model are dropped
+        :param features: observations, exactly the features of the model
+        :param score: function scoring a subset of the features,
+            pipeline.predict by default
+        """
+        if not self.enabled or not len(features):
+            return (score or pipeline.predict)(features)
+
+        keys = self.keys(model, features)
+        prediction = np.empty(len(features))
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation(model, pipeline)
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    prediction[i] = entry[0]
+                    continue
+                if entry is not None:
+                    del self._entries[key]
+                    self._counters["expired"] += 1
+                missing.append(i)
+            self._counters["hits"] += len(keys) - len(missing)
+            self._counters["misses"] += len(missing)
+
+        if missing:
+            subset = (
+                features if len(missing) == len(features) else features.iloc[missing]
+            )
+            scored = np.asarray((score or pipeline.predict)(subset), dtype=np.float64)
+            prediction[missing] = scored
+            expires = time.monotonic() + self.ttl
+            with self._lock:
+                if self._generations.get(model, lambda: None)() is pipeline:
+                    for i, value in zip(missing, scored.tolist()):
+                        self._entries[keys[i]] = (value, expires)
+                        self._entries.move_to_end(keys[i])
+                    self._evict()
+        return prediction
+
+    @staticmethod
+    def keys(model: Hashable, features: pd.DataFrame) -> List[tuple]:
+        """Cache keys of the rows, equal for equal values of the features
+
+        Missing values of any kind are the same and so are 0.0 and -0.0.
+        """
+        columns = {}
+        for name, values in features.items():
+            if values.dtype.kind == "f":
+                # adding 0.0 turns -0.0 into 0.0, NaN payloads are unified
+                values = values.astype(np.float64) + 0.0
+                values = values.where(values.notna(), np.nan)
+            elif values.dtype.kind == "O":
+                values = values.where(values.notna(), None)
+            columns[name] = values
+        hashes = pd.util.hash_pandas_object(
+            pd.DataFrame(columns), index=False
+        ).to_numpy()
+        return [(model, __version__, int(value)) for value in hashes]
+
+    def invalidate(self, model: Hashable = None) -> None:
+        """Drops cached predictions of a single model or of all of them"""
+        with self._lock:
+            self._invalidate(model)
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters, hit rate and number of entries"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+            stats["ttl"] = self.ttl
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def _check_generation(self, model: Hashable, pipeline) -> None:
+        current = self._generations.get(model)
+        if current is not None and current() is pipeline:
+            return
+        if current is not None:
+            self._invalidate(model)
+        self._generations[model] = weakref.ref(pipeline)
+
+    def _invalidate(self, model: Hashable = None) -> None:
+        if model is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+            self._generations.clear()
+        else:
+            keys = [key for key in self._entries if key[0] == model]
+            for key in keys:
+                del self._entries[key]
+            self._generations.pop(model, None)
+            dropped = len(keys)
+        self._counters["invalidated"] += dropped
+
+    def _evict(self) -> None:
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._counters["evicted"] += 1
+
+
+# shared by everything scoring within the process, disabled by default
+PREDICTION_CACHE = PredictionCache()
@@ -0,0 +1,104 @@
+"""
+Compact structured records of predictions
+
+Every scored request is logged as a single record: model, version, numbers
+of scored and rejected rows and latency. A sampled share of the records also
+carries the first few input rows with their predictions. The record is kept
+as a dict (record.prediction) and rendered to JSON only when a handler
+formats it, so nothing is rendered while INFO is disabled and, with async
+logging (see logging_config.enable_async_logging), not on the request thread.
+"""
+import json
+import logging
+import random
+
+import numpy as np
+import pandas as pd
+
+from housing_regression import __version__
+
+_logger = logging.getLogger(__name__)
+
+
+class LazyJSON:
+    """Renders the data to JSON once formatted, e.g. as a logging argument"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self) -> str:
+        return json.dumps(self.data, default=str)
+
+
+class PredictionLog:
+    """Logs one compact record per scored request
+
+    :param sample_rate: share of the records carrying a sample of the input,
+        0 disables sampling
+    :param sample_rows: number of input rows in a sample
+    :param level: level of the records
+    """
+
+    def __init__(
+        self, sample_rate: float = 0.01, sample_rows: int = 1, level=logging.INFO
+    ):
+
+        self.sample_rate = sample_rate
+        self.sample_rows = sample_rows
+        self.level = level
+
+    def configure(
+        self, sample_rate: float = None, sample_rows: int = None, level=None
+    ) -> None:
+        """Changes the given settings, keeps the others"""
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+        if sample_rows is not None:
+            self.sample_rows = sample_rows
+        if level is not None:
+            self.level = level
+
+    def log(
+        self,
+        model_name: str,
+        features: pd.DataFrame,
+        prediction: np.ndarray,
+        seconds: float,
+        rejected: int = 0,
+        version: str = None,
+    ) -> None:
+        """Logs the record of a request, does nothing if the level is disabled
+
+        :param model_name: name of the model scoring the request
+        :param features: scored observations
+        :param prediction: predictions of the observations
+        :param seconds: latency of the request
+        :param rejected: number of observations failing validation
+        :param version: persisted version of the model, the package version
+            by default
+        """
+        if not _logger.isEnabledFor(self.level):
+            return
+        record = {
+            "model": model_name,
+            "version": version or __version__,
+            "rows": len(features),
+            "rejected": rejected,
+            "seconds": seconds,
+        }
+        if len(features) and random.random() < self.sample_rate:
+            rows = min(self.sample_rows, len(features))
+            record["sample"] = {
+                "inputs": features.iloc[:rows].to_dict(orient="records"),
+                "predictions": np.asarray(prediction[:rows]).tolist(),
+            }
+        _logger.log(
+            self.level,
+            "Made predictions %s",
+            LazyJSON(record),
+            extra={"prediction": record},
+        )
+
+
+# shared by everything scoring within the process
+PREDICTION_LOG = PredictionLog()
@@ -0,0 +1,199 @@
+"""
+On-disk cache of fitted pipeline prefixes
+
+Refitting a pipeline after changing only its final estimator (or a late
+step) repeats fitting every preprocessing step on the same data. The cache
+stores, after every fitted transformer, the fitted steps so far together
+with their output, addressed by content:
+
+    key_0 = fingerprint of the training data (X and y)
+    key_i = hash(key_i-1, package version, the unfitted step i)
+
+so a prefix is reused exactly when the data and all parameters of its steps
+are the same. Fitting resumes after the longest cached prefix. Entries are
+files in the cache directory; the least recently used ones are removed once
+the directory grows above its size limit.
+"""
+import copy
+import hashlib
+import logging
+import os
+import tempfile
+from typing import List, Optional, Tuple
+
+import joblib
+import pandas as pd
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+
+from housing_regression import __version__
+from housing_regression.config import global_config as global_conf
+from housing_regression.processing.profiling import PROFILED_METHODS
+
+_logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".joblib"
+
+
+def data_fingerprint(X: pd.DataFrame, y=None) -> str:
+    """Hash of the values, index, column names and dtypes of the data"""
+    digest = hashlib.sha256()
+    for data in (X, y):
+        if data is None:
+            continue
+        if isinstance(data, pd.DataFrame):
+            digest.update(pd.util.hash_pandas_object(data, index=True).values)
+            digest.update(repr(list(data.dtypes.items())).encode())
+        elif isinstance(data, pd.Series):
+            digest.update(pd.util.hash_pandas_object(data, index=True).values)
+            digest.update(repr((data.name, data.dtype)).encode())
+        else:
+            digest.update(joblib.hash(data).encode())
+    return digest.hexdigest()
+
+
+def step_key(previous_key: str, step) -> str:
+    """Key of the prefix ending with the step, given the key of the one before"""
+    return joblib.hash((previous_key, __version__, clone(step)))
+
+
+class PrefixCache:
+    """Fits pipelines reusing fitted prefixes and their output from disk
+
+    :param directory: where the entries are stored, created if needed
+    :param max_bytes: size limit of the directory, least recently used
+        entries are evicted above it
+    """
+
+    def __init__(
+        self, directory: str, max_bytes: int = global_conf.PREFIX_CACHE_MAX_BYTES
+    ):
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def fit(self, pipeline: Pipeline, X: pd.DataFrame, y=None) -> Pipeline:
+        """Fits the pipeline in place, same as pipeline.fit(X, y)
+
+        Cached steps replace the steps of the pipeline, the remaining ones
+        are fitted and cached.
+
+        :returns: the fitted pipeline
+        """
+        transformers = [
+            (i, step)
+            for i, (_, step) in enumerate(pipeline.steps[:-1])
+            if step is not None and step != "passthrough"
+        ]
+        keys, key = [], data_fingerprint(X, y)
+        for _, step in transformers:
+            key = step_key(key, step)
+            keys.append(key)
+
+        start, Xt = self._longest_prefix(pipeline, transformers, keys)
+        if start:
+            self.hits += 1
+            _logger.info(f"Reusing {start} fitted steps from the prefix cache")
+        elif transformers:
+            self.misses += 1
+        Xt = X if Xt is None else Xt
+
+        for n_steps in range(start, len(transformers)):
+            Xt = transformers[n_steps][1].fit_transform(Xt, y)
+            # stored before the next step, which may modify Xt in place
+            fitted = [_picklable(step) for _, step in transformers[: n_steps + 1]]
+            self._store(keys[n_steps], fitted, Xt)
+
+        estimator = pipeline.steps[-1][1]
+        if estimator is not None and estimator != "passthrough":
+            estimator.fit(Xt, y)
+        self.evict()
+        return pipeline
+
+    def _longest_prefix(
+        self, pipeline: Pipeline, transformers: List[tuple], keys: List[str]
+    ) -> Tuple[int, Optional[object]]:
+        for n_steps in range(len(keys), 0, -1):
+            entry = self._load(keys[n_steps - 1])
+            if entry is None:
+                continue
+            for (i, _), fitted in zip(transformers, entry["steps"]):
+                pipeline.steps[i] = (pipeline.steps[i][0], fitted)
+            return n_steps, entry["output"]
+        return 0, None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def _load(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            entry = joblib.load(path)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            _logger.warning(f"Ignoring unreadable prefix cache entry {path}: {error}")
+            return None
+        # marks the entry as recently used
+        os.utime(path)
+        return entry
+
+    def _store(self, key: str, steps: list, output) -> None:
+        # written under a temporary name so that readers never see a partial file
+        descriptor, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(descriptor)
+        try:
+            joblib.dump({"steps": steps, "output": output}, temp_path)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def size(self) -> int:
+        """Total size of the entries in bytes"""
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self) -> None:
+        """Removes least recently used entries until under the size limit"""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            _logger.info(f"Evicted {path} from the prefix cache")
+
+    def clear(self) -> None:
+        """Removes all entries"""
+        for path, _, _ in self._entries():
+            os.remove(path)
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """Path, size and time of last use of every entry"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+
+def _picklable(step):
+    """The step without methods wrapped by the profiler, see profiling"""
+    if not any(method in getattr(step, "__dict__", {}) for method in PROFILED_METHODS):
+        return step
+    step = copy.copy(step)
+    for method in PROFILED_METHODS:
+        step.__dict__.pop(method, None)
+    return step
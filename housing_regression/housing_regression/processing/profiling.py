@@ -0,0 +1,241 @@
+"""
+Per-step profiling of scikit-learn pipelines
+
+PipelineProfiler instruments the steps of a pipeline in place: their fit,
+transform, fit_transform and predict methods are shadowed by thin wrappers
+recording wall time and numbers of rows going in and out and, optionally,
+memory allocated by the step (via tracemalloc, which slows everything down
+noticeably). The structure of the pipeline does not change, so it can still
+be compiled or inspected as usual.
+
+While the profiler is disabled the wrappers only check a flag, so pipelines
+can stay instrumented in production and profiling switched on when needed.
+Instrumented pipelines cannot be pickled, see PipelineProfiler.uninstrument.
+"""
+import contextlib
+import functools
+import json
+import logging
+import threading
+import time
+import tracemalloc
+from typing import TYPE_CHECKING, Dict, Iterator, List, Tuple
+
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+
+_logger = logging.getLogger(__name__)
+
+PROFILED_METHODS = ("fit", "fit_transform", "transform", "predict")
+
+# name of the attribute marking an instrumented pipeline
+_MARKER = "_profiled_as"
+
+
+class StepStats:
+    """Accumulated measurements of one method of one step"""
+
+    __slots__ = ("calls", "seconds", "max_seconds", "rows_in", "rows_out", "allocated")
+
+    def __init__(self):
+
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.allocated = 0
+
+    def add(self, seconds: float, rows_in: int, rows_out: int, allocated: int):
+        self.calls += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        self.allocated += allocated
+
+
+class PipelineProfiler:
+    """Collects per-step measurements of instrumented pipelines
+
+    :param enabled: record measurements, instrumented steps only check this
+        flag otherwise
+    :param trace_memory: also record bytes allocated by every step (peak
+        traced memory above the level at the start of the call), starts
+        tracemalloc if needed; approximate when steps run concurrently
+    """
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = False):
+
+        self.enabled = enabled
+        self.trace_memory = False
+        # tracemalloc was started by enable, so disable stops it
+        self._started_tracing = False
+        self._stats: Dict[Tuple[str, str, str], StepStats] = {}
+        self._lock = threading.Lock()
+        # steps being measured by the current thread, to skip nested calls
+        # such as fit and transform called by fit_transform
+        self._active = threading.local()
+        if trace_memory:
+            self.enable(trace_memory=True)
+
+    def enable(self, trace_memory: bool = False) -> None:
+        """Starts recording measurements"""
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self.trace_memory = trace_memory
+        self.enabled = True
+
+    def disable(self) -> None:
+        """Stops recording, instrumented steps keep only checking the flag
+
+        Stops tracemalloc too if enable started it.
+        """
+        self.enabled = False
+        self.trace_memory = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def instrument(self, pipeline: "Pipeline", name: str) -> "Pipeline":
+        """Wraps methods of all steps of the pipeline, idempotent
+
+        :param pipeline: pipeline to instrument in place
+        :param name: label of the pipeline in the measurements, e.g. model name
+
+        :returns: the same pipeline
+        """
+        if getattr(pipeline, _MARKER, None) is not None:
+            return pipeline
+        for step_name, step in pipeline.steps:
+            if step is None or isinstance(step, str):
+                continue
+            for method in PROFILED_METHODS:
+                if hasattr(step, method):
+                    wrapped = getattr(type(step), method).__get__(step)
+                    setattr(step, method, self._wrap(wrapped, name, step_name, method))
+        setattr(pipeline, _MARKER, name)
+        return pipeline
+
+    def uninstrument(self, pipeline: "Pipeline") -> "Pipeline":
+        """Removes the wrappers, e.g. before the pipeline is persisted"""
+        for _, step in pipeline.steps:
+            for method in PROFILED_METHODS:
+                if method in getattr(step, "__dict__", {}):
+                    delattr(step, method)
+        if _MARKER in pipeline.__dict__:
+            delattr(pipeline, _MARKER)
+        return pipeline
+
+    @contextlib.contextmanager
+    def profiled(self, pipeline: "Pipeline", name: str) -> Iterator["Pipeline"]:
+        """Instruments the pipeline for the duration of the block"""
+        self.instrument(pipeline, name)
+        try:
+            yield pipeline
+        finally:
+            self.uninstrument(pipeline)
+
+    def _wrap(self, method, pipeline_name: str, step_name: str, method_name: str):
+        key = (pipeline_name, step_name, method_name)
+        step_id = id(method.__self__)
+
+        @functools.wraps(method)
+        def profiled_method(*args, **kwargs):
+            if not self.enabled:
+                return method(*args, **kwargs)
+            active = self._active.__dict__.setdefault("steps", set())
+            if step_id in active:
+                return method(*args, **kwargs)
+
+            active.add(step_id)
+            trace_memory = self.trace_memory and tracemalloc.is_tracing()
+            if trace_memory:
+                memory_start = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = time.perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                active.discard(step_id)
+            seconds = time.perf_counter() - start
+            allocated = (
+                max(0, tracemalloc.get_traced_memory()[1] - memory_start)
+                if trace_memory
+                else 0
+            )
+            rows_out = _n_rows(result) if method_name != "fit" else 0
+            rows_in = _n_rows(args[0] if args else kwargs.get("X"))
+            self._record(key, seconds, rows_in, rows_out, allocated)
+            return result
+
+        return profiled_method
+
+    def _record(self, key, seconds: float, rows_in: int, rows_out: int, allocated):
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StepStats()
+            stats.add(seconds, rows_in, rows_out, allocated)
+        if _logger.isEnabledFor(logging.DEBUG):
+            pipeline_name, step_name, method_name = key
+            _logger.debug(
+                f"{pipeline_name}.{step_name}.{method_name}: {seconds * 1000:.3f}ms "
+                f"rows {rows_in} -> {rows_out}, allocated {allocated}B",
+                extra={
+                    "pipeline": pipeline_name,
+                    "step": step_name,
+                    "method": method_name,
+                    "seconds": seconds,
+                    "rows_in": rows_in,
+                    "rows_out": rows_out,
+                    "allocated_bytes": allocated,
+                },
+            )
+
+    def report(self) -> List[dict]:
+        """Measurements per pipeline, step and method, JSON serializable"""
+        with self._lock:
+            items = [(key, _as_dict(stats)) for key, stats in self._stats.items()]
+        return [
+            {"pipeline": pipeline, "step": step, "method": method, **stats}
+            for (pipeline, step, method), stats in items
+        ]
+
+    def log_report(self, level: int = logging.INFO) -> None:
+        """Logs one structured (JSON) record per step and method"""
+        for entry in self.report():
+            _logger.log(level, json.dumps(entry), extra={"profile": entry})
+
+    def reset(self) -> None:
+        """Forgets all measurements"""
+        with self._lock:
+            self._stats.clear()
+
+
+def _as_dict(stats: StepStats) -> dict:
+    return {
+        "calls": stats.calls,
+        "seconds": stats.seconds,
+        "mean_seconds": stats.seconds / stats.calls,
+        "max_seconds": stats.max_seconds,
+        "rows_in": stats.rows_in,
+        "rows_out": stats.rows_out,
+        "allocated_bytes": stats.allocated,
+    }
+
+
+def _n_rows(data) -> int:
+    shape = getattr(data, "shape", None)
+    if shape:
+        return int(shape[0])
+    try:
+        return len(data)
+    except TypeError:
+        return 0
+
+
+# profiler shared by predict and train, disabled by default
+PROFILER = PipelineProfiler()
@@ -0,0 +1,137 @@
+"""
+Mergeable statistics for fitting on data that arrives in chunks
+
+Every statistic is updated chunk by chunk and two statistics computed on
+different parts of the data can be merged. The result is the same as if
+the statistic was computed on all of the data at once.
+"""
+from typing import Dict, Hashable, List
+
+import numpy as np
+import pandas as pd
+
+
+class ValueCounts:
+    """Number of occurrences of every value, missing values are not counted
+
+    n_rows counts all rows, including those with missing values.
+    """
+
+    def __init__(self):
+
+        self.counts: Dict[Hashable, int] = {}
+        self.n_rows = 0
+
+    def update(self, values: pd.Series, weights: np.ndarray = None) -> "ValueCounts":
+        """Counts the values
+
+        :param values: values to count
+        :param weights: number of rows of every value, one by default
+        """
+        if weights is None:
+            counted = values.value_counts(sort=False)
+            self.n_rows += len(values)
+        else:
+            counted = pd.Series(weights, index=values.index).groupby(values).sum()
+            self.n_rows += int(np.sum(weights))
+        counts = self.counts
+        for value, count in counted.items():
+            counts[value] = counts.get(value, 0) + int(count)
+        return self
+
+    def merge(self, other: "ValueCounts") -> "ValueCounts":
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self.n_rows += other.n_rows
+        return self
+
+    def most_frequent(self):
+        """The most frequent value, the smallest one in case of a tie
+
+        Same as SimpleImputer(strategy="most_frequent"), NaN if no value was
+        counted.
+        """
+        if not self.counts:
+            return np.nan
+        top = max(self.counts.values())
+        return min(value for value, count in self.counts.items() if count == top)
+
+    def by_frequency(self) -> List[Hashable]:
+        """Values from the most frequent, ties in the order of the values
+
+        Ties between values that cannot be compared stay in the order they
+        were first seen.
+        """
+        try:
+            return sorted(self.counts, key=lambda value: (-self.counts[value], value))
+        except TypeError:
+            return sorted(self.counts, key=lambda value: -self.counts[value])
+
+    def distinct(self) -> List[Hashable]:
+        """Values in sorted order"""
+        return sorted(self.counts)
+
+
+class Mean:
+    """Mean of a column ignoring missing values"""
+
+    def __init__(self):
+
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, values: pd.Series) -> "Mean":
+        self.total += float(values.sum(skipna=True))
+        self.count += int(values.count())
+        return self
+
+    def merge(self, other: "Mean") -> "Mean":
+        self.total += other.total
+        self.count += other.count
+        return self
+
+    @property
+    def value(self) -> float:
+        return self.total / self.count if self.count else np.nan
+
+
+class CoMoments:
+    """Means and co-moments (centred cross products) of the columns of a matrix
+
+    Chunks are combined by the pairwise update of Chan, Golub and LeVeque,
+    which keeps the result accurate even for columns with a large mean.
+    """
+
+    def __init__(self):
+
+        self.n_rows = 0
+        self.mean = None
+        self.comoments = None
+
+    def update(self, matrix: np.ndarray) -> "CoMoments":
+        matrix = np.asarray(matrix, dtype=np.float64)
+        other = CoMoments()
+        other.n_rows = len(matrix)
+        other.mean = matrix.mean(axis=0)
+        centred = matrix - other.mean
+        other.comoments = centred.T @ centred
+        return self.merge(other)
+
+    def merge(self, other: "CoMoments") -> "CoMoments":
+        if not other.n_rows:
+            return self
+        if not self.n_rows:
+            self.n_rows = other.n_rows
+            self.mean = other.mean.copy()
+            self.comoments = other.comoments.copy()
+            return self
+        n_rows = self.n_rows + other.n_rows
+        delta = other.mean - self.mean
+        self.comoments = (
+            self.comoments
+            + other.comoments
+            + np.outer(delta, delta) * (self.n_rows * other.n_rows / n_rows)
+        )
+        self.mean = self.mean + delta * (other.n_rows / n_rows)
+        self.n_rows = n_rows
+        return self
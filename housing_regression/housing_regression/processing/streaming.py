@@ -0,0 +1,549 @@
+"""
+Out-of-core fitting of pipelines on data read in chunks
+
+Statistics a step is fitted from are defined on the output of the steps
+before it. A pass over the data, transformed by the already fitted steps,
+fits the next stateful step from mergeable statistics (see housing_regression.
+processing.statistics) collected along the way. The same pass counts the
+values of the columns later steps are fitted from, as long as those only
+depend on counts of values (RareLabelEncoder, one hot encoding, imputing the
+most frequent value or a constant) and the steps in between map every value
+of those columns on its own. Once a step is fitted, the counted values are
+mapped through it, so such later steps are fitted without another pass.
+Stateless steps cost no pass. Only a single chunk is held in memory at a
+time, or a few of them when statistics of the chunks are collected by a pool
+of processes and merged.
+
+Supported are the custom transformers, ColumnTransformer(DF) with
+SimpleImputer (mean, most_frequent or constant) and OneHotEncoder, and
+a final LinearRegression (fitted from co-moments, i.e. normal equations) or
+any estimator with partial_fit. The fitted pipeline is equivalent to one
+fitted in memory; anything else raises UnsupportedPipelineError.
+"""
+import collections
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import linalg, sparse
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OneHotEncoder
+
+from housing_regression.processing import transformers as tran
+from housing_regression.processing.exceptions import UnsupportedPipelineError
+from housing_regression.processing.statistics import CoMoments, Mean, ValueCounts
+
+_logger = logging.getLogger(__name__)
+
+Chunks = Callable[[], Iterable[Tuple[pd.DataFrame, pd.Series]]]
+
+STATELESS_TRANSFORMERS = (
+    tran.UnivariateTransformer,
+    tran.BivariateTransformer,
+    tran.FeatureDropper,
+)
+
+
+def fit_streaming(pipeline: Pipeline, chunks: Chunks, n_jobs: int = 1) -> Pipeline:
+    """Fits the pipeline in place, reading the data in chunks
+
+    Takes at most one pass over the data per stateful step, fewer when later
+    steps are fitted from values counted in the pass of an earlier one. The
+    dev pipeline takes two: one for the imputer, the rare label encoder and
+    the one hot encoder and one for the linear model.
+
+    :param pipeline: pipeline to fit
+    :param chunks: function returning a new iterable of (X, y) chunks, called
+        once per pass over the data
+    :param n_jobs: number of processes collecting statistics of the chunks,
+        which are then merged; estimators fitted by partial_fit always see
+        the chunks one by one in the calling process
+
+    :returns: the fitted pipeline
+    """
+    steps = [
+        (name, step)
+        for name, step in pipeline.steps
+        if step is not None and step != "passthrough"
+    ]
+    executor = ProcessPoolExecutor(n_jobs) if n_jobs > 1 else None
+    n_passes = 0
+    try:
+        position = 0
+        while position < len(steps):
+            name, step = steps[position]
+            if isinstance(step, STATELESS_TRANSFORMERS):
+                step.fit(None)
+                position += 1
+                continue
+
+            fitter = _make_fitter(name, step)
+            deferred = _deferred_fitters(steps, position)
+            columns = sorted(
+                {
+                    col
+                    for fitted in deferred.values()
+                    for col in fitted.counted_columns()
+                }
+            )
+            tracker = _ValueTracker(columns)
+            prefix = [fitted for _, fitted in steps[:position]]
+            start = time.perf_counter()
+            n_rows = 0
+            if executor is None or not hasattr(fitter, "merge"):
+                for X, y in chunks():
+                    n_rows += _update(fitter, tracker, prefix, X, y)
+            else:
+                tasks = (
+                    (_collect, name, step, columns, prefix, X, y) for X, y in chunks()
+                )
+                for part, part_tracker, part_rows in _imap(
+                    executor, tasks, max_pending=2 * n_jobs
+                ):
+                    fitter.merge(part)
+                    tracker.merge(part_tracker)
+                    n_rows += part_rows
+            if not n_rows:
+                raise ValueError("Cannot fit a pipeline on no data.")
+            fitter.finish()
+            n_passes += 1
+
+            # later steps fitted from the values counted in this pass
+            names = [name]
+            end = max(deferred, default=position)
+            for later in range(position + 1, end + 1):
+                tracker.advance(steps[later - 1][1])
+                later_name, later_step = steps[later]
+                if isinstance(later_step, STATELESS_TRANSFORMERS):
+                    later_step.fit(None)
+                else:
+                    deferred[later].fit_counts(tracker)
+                    names.append(later_name)
+            _logger.info(
+                f"Fitted {', '.join(names)} on {n_rows} rows "
+                f"in {time.perf_counter() - start:.1f}s"
+            )
+            position = end + 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    _logger.info(f"Fitted the pipeline in {n_passes} passes over the data")
+    return pipeline
+
+
+def _deferred_fitters(steps: list, position: int) -> dict:
+    """Fitters of the steps after position fitted from counted values
+
+    {position of the step: fitter}, the steps must directly follow the one
+    at position, with only stateless steps between them.
+    """
+    deferred = {}
+    passed = [steps[position][1]]
+    for later in range(position + 1, len(steps)):
+        name, step = steps[later]
+        if isinstance(step, STATELESS_TRANSFORMERS):
+            passed.append(step)
+            continue
+        fitter = _make_fitter(name, step)
+        columns = getattr(fitter, "counted_columns", lambda: None)()
+        if columns is None or not all(
+            _maps_values(passed_step, col) for passed_step in passed for col in columns
+        ):
+            break
+        deferred[later] = fitter
+        passed.append(step)
+    return deferred
+
+
+def _maps_values(step, column: str) -> bool:
+    """Does the step map every value of the column on its own, if at all?"""
+    if isinstance(step, (tran.UnivariateTransformer, tran.BivariateTransformer)):
+        return column not in step.variables
+    if isinstance(step, (tran.FeatureDropper, tran.RareLabelEncoder)):
+        return True
+    if isinstance(step, tran.ColumnTransformerDF):
+        return all(
+            transformer in ("drop", "passthrough")
+            or isinstance(transformer, SimpleImputer)
+            for _, transformer, _ in step.transformers
+        ) and step.remainder in ("drop", "passthrough")
+    return False
+
+
+def _update(fitter, tracker, prefix: list, X, y) -> int:
+    for fitted in prefix:
+        X = fitted.transform(X)
+    fitter.update(X, y)
+    tracker.update(X, y)
+    return len(X)
+
+
+def _collect(name: str, step, columns: List[str], prefix: list, X, y):
+    """Statistics of a single chunk, run by worker processes"""
+    fitter, tracker = _make_fitter(name, step), _ValueTracker(columns)
+    return fitter, tracker, _update(fitter, tracker, prefix, X, y)
+
+
+def _imap(executor: Executor, tasks: Iterable[tuple], max_pending: int):
+    """Results of the tasks in order, submitting at most max_pending at once
+
+    Keeps the number of chunks in memory bounded while the workers are busy.
+    """
+    pending = collections.deque()
+    for func, *args in tasks:
+        pending.append(executor.submit(func, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _make_fitter(name: str, step):
+    if isinstance(step, ColumnTransformer):
+        return _ColumnTransformerFitter(name, step)
+    if isinstance(step, tran.RareLabelEncoder):
+        return _RareLabelFitter(step)
+    if isinstance(step, (tran.OneHotEncoderDF, OneHotEncoder)):
+        return _SummaryFitter(step, _one_hot_columns(name, step))
+    if type(step) is LinearRegression:
+        return _LinearRegressionFitter(step)
+    if hasattr(step, "partial_fit"):
+        return _PartialFitter(step)
+    raise UnsupportedPipelineError(
+        f"Step {name} of type {type(step).__name__} cannot be fitted out of core."
+    )
+
+
+class _SummaryFitter:
+    """Fits steps whose state depends only on distinct values of some columns
+
+    The step is fitted on a small frame holding every distinct value of
+    those columns, the other columns are copied from the first row. Columns
+    get the dtype common to all chunks, e.g. float64 for an integer column
+    with missing values in some of them.
+    """
+
+    def __init__(self, step, columns: List[str]):
+
+        self.step = step
+        self.columns = columns
+        self.distinct = {col: ValueCounts() for col in columns}
+        self.first_row = None
+        self.dtypes = {}
+
+    def update(self, X: pd.DataFrame, y) -> None:
+        if self.first_row is None:
+            self.first_row = X.iloc[:1]
+        self._merge_dtypes(X.dtypes)
+        for col, counts in self.distinct.items():
+            counts.update(X[col])
+
+    def merge(self, other: "_SummaryFitter") -> None:
+        if self.first_row is None:
+            self.first_row = other.first_row
+        self._merge_dtypes(other.dtypes)
+        for col, counts in self.distinct.items():
+            counts.merge(other.distinct[col])
+
+    def _merge_dtypes(self, dtypes) -> None:
+        for col, dtype in dtypes.items():
+            if col in self.dtypes:
+                dtype = _common_dtype(self.dtypes[col], dtype)
+            self.dtypes[col] = dtype
+
+    def summary(self, constants: dict = None) -> pd.DataFrame:
+        distinct = {col: counts.distinct() for col, counts in self.distinct.items()}
+        n_rows = max([len(values) for values in distinct.values()] + [1])
+        summary = self.first_row.iloc[np.zeros(n_rows, dtype=int)].reset_index(
+            drop=True
+        )
+        for col, values in distinct.items():
+            values = np.asarray(values or [np.nan], dtype=object)
+            summary[col] = pd.Series(np.resize(values, n_rows)).astype(self.dtypes[col])
+        for col, value in (constants or {}).items():
+            # imputed values (e.g. a mean) must not be truncated to integers
+            dtype = self.dtypes[col]
+            if pd.api.types.is_integer_dtype(dtype):
+                dtype = np.float64
+            summary[col] = pd.Series(np.full(n_rows, value)).astype(dtype)
+        return summary
+
+    def finish(self) -> None:
+        self.step.fit(self.summary())
+
+    def counted_columns(self) -> List[str]:
+        return self.columns
+
+    def fit_counts(self, values: "_ValueTracker") -> None:
+        """Fits the step from values counted in the pass of an earlier step"""
+        self.first_row = values.first_row
+        self.dtypes = dict(values.dtypes)
+        self.distinct = {col: values.distinct[col] for col in self.columns}
+        self.finish()
+
+
+class _ValueTracker(_SummaryFitter):
+    """Counts values of columns and maps them through the following steps
+
+    Every distinct value goes through a step in a small frame, the other
+    columns copied from the first row, and its count is added to the value
+    it is mapped to.
+    """
+
+    def __init__(self, columns: List[str]):
+
+        super().__init__(None, columns)
+
+    def update(self, X, y) -> None:
+        # nothing to count before e.g. a final estimator given NumPy arrays
+        if self.columns:
+            super().update(X, y)
+
+    def merge(self, other: "_ValueTracker") -> None:
+        if self.columns:
+            super().merge(other)
+
+    def advance(self, step) -> None:
+        """Maps the counted values through the fitted step"""
+        for col, counts in self.distinct.items():
+            values, weights = list(counts.counts), list(counts.counts.values())
+            missing = counts.n_rows - sum(weights)
+            if missing:
+                values.append(np.nan)
+                weights.append(missing)
+            if not values:
+                continue
+            frame = self.first_row.iloc[np.zeros(len(values), dtype=int)].reset_index(
+                drop=True
+            )
+            frame[col] = pd.Series(np.asarray(values, dtype=object)).astype(
+                self.dtypes[col]
+            )
+            mapped = step.transform(frame)[col]
+            self.distinct[col] = ValueCounts().update(mapped, np.asarray(weights))
+            self.dtypes[col] = mapped.dtype
+        first_row = step.transform(self.first_row.copy())
+        self.dtypes = {
+            **first_row.dtypes.to_dict(),
+            **{col: self.dtypes[col] for col in self.distinct},
+        }
+        self.first_row = first_row
+
+
+class _ColumnTransformerFitter(_SummaryFitter):
+    """Fits SimpleImputers and OneHotEncoders of a ColumnTransformer
+
+    Columns of imputers are replaced in the summary frame by the constant
+    they will be imputed with, which the imputers then find again.
+    """
+
+    def __init__(self, name: str, step: ColumnTransformer):
+
+        self.imputed = {}
+        distinct = []
+        for sub_name, transformer, columns in step.transformers:
+            if transformer in ("drop", "passthrough"):
+                continue
+            columns = _names(columns, name)
+            if isinstance(transformer, SimpleImputer):
+                if not _is_nan(transformer.missing_values) or transformer.add_indicator:
+                    raise UnsupportedPipelineError(
+                        f"Imputer {sub_name} must impute NaN without indicators."
+                    )
+                for col in columns:
+                    self.imputed[col] = _imputer_statistic(sub_name, transformer)
+            elif isinstance(transformer, OneHotEncoder):
+                distinct.extend(_one_hot_columns(sub_name, transformer, columns))
+            else:
+                raise UnsupportedPipelineError(
+                    f"Transformer {sub_name} cannot be fitted out of core."
+                )
+        if step.remainder not in ("drop", "passthrough"):
+            raise UnsupportedPipelineError(f"Remainder of {name} must not be fitted.")
+        super().__init__(step, distinct)
+
+    def update(self, X: pd.DataFrame, y) -> None:
+        super().update(X, y)
+        for col, statistic in self.imputed.items():
+            if statistic is not None:
+                statistic.update(X[col])
+
+    def merge(self, other: "_ColumnTransformerFitter") -> None:
+        super().merge(other)
+        for col, statistic in self.imputed.items():
+            if statistic is not None:
+                statistic.merge(other.imputed[col])
+
+    def finish(self) -> None:
+        constants = {}
+        for col, statistic in self.imputed.items():
+            if statistic is None:
+                continue
+            if isinstance(statistic, Mean):
+                constants[col] = statistic.value
+            else:
+                constants[col] = statistic.most_frequent()
+        self.step.fit(self.summary(constants))
+
+    def counted_columns(self) -> List[str]:
+        """None if a mean is imputed, which cannot be found from counts"""
+        if any(isinstance(stat, Mean) for stat in self.imputed.values()):
+            return None
+        imputed = [col for col, stat in self.imputed.items() if stat is not None]
+        return self.columns + imputed
+
+    def fit_counts(self, values: "_ValueTracker") -> None:
+        for col, statistic in self.imputed.items():
+            if statistic is not None:
+                self.imputed[col] = values.distinct[col]
+        super().fit_counts(values)
+
+
+class _RareLabelFitter:
+    def __init__(self, step: tran.RareLabelEncoder):
+
+        self.step = step
+        self.counts = {var: ValueCounts() for var in step.variables}
+
+    def update(self, X: pd.DataFrame, y) -> None:
+        for var, counts in self.counts.items():
+            counts.update(X[var])
+
+    def merge(self, other: "_RareLabelFitter") -> None:
+        for var, counts in self.counts.items():
+            counts.merge(other.counts[var])
+
+    def finish(self) -> None:
+        self.step._fit_counts(self.counts)
+
+    def counted_columns(self) -> List[str]:
+        return list(self.counts)
+
+    def fit_counts(self, values: "_ValueTracker") -> None:
+        """Fits the encoder from values counted in the pass of an earlier step"""
+        self.counts = {var: values.distinct[var] for var in self.counts}
+        self.finish()
+
+
+class _LinearRegressionFitter:
+    """Solves the normal equations accumulated chunk by chunk
+
+    Gives the minimum norm least squares solution, the same as
+    LinearRegression when features are collinear (e.g. one hot encoding with
+    an intercept).
+    """
+
+    def __init__(self, step: LinearRegression):
+
+        if step.positive or step.normalize is True:
+            raise UnsupportedPipelineError(
+                "Only plain LinearRegression can be fitted out of core."
+            )
+        self.step = step
+        self.moments = CoMoments()
+        self.feature_names = None
+
+    def update(self, X, y) -> None:
+        if isinstance(X, pd.DataFrame):
+            self.feature_names = np.asarray(X.columns, dtype=object)
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64).reshape(len(X), -1)
+        self.moments.update(np.hstack([X, y]))
+        self.n_targets = y.shape[1]
+
+    def merge(self, other: "_LinearRegressionFitter") -> None:
+        if other.moments.n_rows:
+            self.moments.merge(other.moments)
+            self.n_targets = other.n_targets
+            self.feature_names = other.feature_names
+
+    def finish(self) -> None:
+        moments = self.moments
+        n_features = len(moments.mean) - self.n_targets
+        products = moments.comoments
+        if not self.step.fit_intercept:
+            products = products + moments.n_rows * np.outer(moments.mean, moments.mean)
+        xx = products[:n_features, :n_features]
+        xy = products[:n_features, n_features:]
+
+        coef = (linalg.pinvh(xx) @ xy).T
+        eigenvalues = np.clip(linalg.eigvalsh(xx), 0, None)
+        if self.step.fit_intercept:
+            intercept = moments.mean[n_features:] - coef @ moments.mean[:n_features]
+        else:
+            intercept = np.zeros(self.n_targets)
+
+        step = self.step
+        step.coef_ = coef[0] if self.n_targets == 1 else coef
+        step.intercept_ = intercept[0] if self.n_targets == 1 else intercept
+        step.singular_ = np.sqrt(eigenvalues[::-1])
+        step.rank_ = int(np.sum(step.singular_ > step.singular_[0] * 1e-10))
+        step.n_features_in_ = n_features
+        if self.feature_names is not None:
+            step.feature_names_in_ = self.feature_names
+
+
+class _PartialFitter:
+    """Estimators learning incrementally, a single epoch"""
+
+    def __init__(self, step):
+
+        self.step = step
+
+    def update(self, X, y) -> None:
+        self.step.partial_fit(X, y)
+
+    def finish(self) -> None:
+        pass
+
+
+def _imputer_statistic(name: str, imputer: SimpleImputer):
+    if imputer.strategy == "mean":
+        return Mean()
+    if imputer.strategy == "most_frequent":
+        return ValueCounts()
+    if imputer.strategy == "constant":
+        return None
+    raise UnsupportedPipelineError(
+        f"Imputer {name} with strategy {imputer.strategy} cannot be fitted out of core."
+    )
+
+
+def _one_hot_columns(name: str, step, columns=None) -> List[str]:
+    if isinstance(step, OneHotEncoder) and (
+        step.categories != "auto"
+        or step.drop is not None
+        or getattr(step, "min_frequency", None) is not None
+        or getattr(step, "max_categories", None) is not None
+    ):
+        raise UnsupportedPipelineError(
+            f"Encoder {name} must find categories without dropping or merging any."
+        )
+    return _names(columns if columns is not None else step.variables, name)
+
+
+def _names(columns, name: str) -> List[str]:
+    if isinstance(columns, str):
+        return [columns]
+    columns = list(columns)
+    if not all(isinstance(col, str) for col in columns):
+        raise UnsupportedPipelineError(f"Columns of {name} must be given by name.")
+    return columns
+
+
+def _common_dtype(first, second):
+    """Dtype of the two dtypes concatenated, e.g. float64 for int64 and float64"""
+    if first == second:
+        return first
+    empty = [pd.Series([], dtype=first), pd.Series([], dtype=second)]
+    return pd.concat(empty).dtype
+
+
+def _is_nan(value) -> bool:
+    return isinstance(value, float) and np.isnan(value)
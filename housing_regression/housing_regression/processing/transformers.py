@@ -4,14 +4,31 @@ Collection of custom scikit-learn compatible transformers.
 For convenience with pipeline configuration made to work with pd.DataFrames.
 Can be turned into separate package and specified as a dependency once stable.
 """
-from typing import Callable, List, Tuple
+import inspect
+from typing import Callable, Dict, List, Tuple
 
 import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
 
 from housing_regression.processing.exceptions import InvalidInputError
+from housing_regression.processing.statistics import ValueCounts
+
+
+class _DefaultsOnLoadMixin:
+    """Fills in parameters added to a transformer after it was persisted
+
+    Allows pipelines pickled with older versions of the package to be loaded.
+    """
+
+    def __setstate__(self, state: dict) -> None:
+        for name, param in inspect.signature(type(self).__init__).parameters.items():
+            if param.default is not param.empty:
+                state.setdefault(name, param.default)
+        super().__setstate__(state)
 
 
 class ColumnTransformerDF(ColumnTransformer):
@@ -60,15 +77,33 @@ class ColumnTransformerDF(ColumnTransformer):
             dtypes=X.dtypes,
         )
 
+    def _hstack(self, Xs: list) -> "_Blocks":
+        """Keeps outputs of the individual transformers apart
+
+        Stacking them into a single array would force a common (typically
+        object) dtype onto all columns, see _reconstruct_df.
+        """
+        return _Blocks(Xs)
+
     def _reconstruct_df(
-        self, transformed: pd.DataFrame, original_order: List[str], dtypes: pd.Series
+        self, transformed: "_Blocks", original_order: List[str], dtypes: pd.Series
     ) -> pd.DataFrame:
-        """Reconstructs dataframe after transformations"""
-        df = pd.DataFrame(
-            data=transformed, columns=self._find_column_order(original_order)
-        )
-        df = self._fix_dtypes(df, dtypes)
-        return df[original_order]
+        """Reconstructs dataframe block by block after transformations"""
+        if not isinstance(transformed, _Blocks):
+            transformed = _Blocks([transformed])
+        names = iter(self._find_column_order(original_order))
+        columns = {}
+        for block in transformed:
+            for i in range(block.shape[1]):
+                name = next(names)
+                columns[name] = self._fix_dtype(
+                    block.iloc[:, i].to_numpy()
+                    if isinstance(block, pd.DataFrame)
+                    else np.asarray(block[:, i]),
+                    dtypes[name],
+                )
+        # columns of new transformer outputs, consolidating them copies all data
+        return pd.DataFrame(columns, columns=original_order, copy=False)
 
     def _find_column_order(self, original: List[str]) -> List[str]:
         """Finds column ordering after tranformations"""
@@ -93,23 +128,30 @@ class ColumnTransformerDF(ColumnTransformer):
         return transformed_order, remainder
 
     @staticmethod
-    def _fix_dtypes(df: pd.DataFrame, dtypes: pd.Series):
-        for col in df:
-            df[col] = df[col].astype(dtypes[col])
-        return df
+    def _fix_dtype(values: np.ndarray, dtype):
+        """Casts a column back to its original dtype, copying only if needed"""
+        if isinstance(dtype, np.dtype):
+            return values.astype(dtype, copy=False)
+        return pd.Series(values).astype(dtype)
+
 
+class _Blocks(list):
+    """Outputs of transformers of ColumnTransformerDF, in order"""
 
-class UnivariateTransformer(BaseEstimator, TransformerMixin):
+
+class UnivariateTransformer(_DefaultsOnLoadMixin, BaseEstimator, TransformerMixin):
     """Applies provided function to the selected columns
 
     :param variables: List of variables to be encoded
     :param func: function to be applied (must support pd.Series as input)
+    :param copy: If False, modify the input frame in place, see make_inplace
     """
 
-    def __init__(self, variables: List[str], func: Callable):
+    def __init__(self, variables: List[str], func: Callable, copy=True):
 
         self.variables = variables
         self.func = func
+        self.copy = copy
 
     def fit(self, X, y=None):
         "For compatibility only"
@@ -122,7 +164,8 @@ class UnivariateTransformer(BaseEstimator, TransformerMixin):
 
         :returns: Transformed data
         """
-        X = X.copy()
+        if self.copy:
+            X = X.copy()
         for feature in self.variables:
             try:
                 X[feature] = self.func(X[feature])
@@ -134,7 +177,7 @@ class UnivariateTransformer(BaseEstimator, TransformerMixin):
 
 
 # TODO: add option to add new column insted of transforming the old in place
-class BivariateTransformer(BaseEstimator, TransformerMixin):
+class BivariateTransformer(_DefaultsOnLoadMixin, BaseEstimator, TransformerMixin):
     """Transforms all selected features using another feature
 
     Apllies provided function with the signature: f(varible, reference_var).
@@ -144,13 +187,17 @@ class BivariateTransformer(BaseEstimator, TransformerMixin):
     :param variables: List of temporal variables
     :param reference_var: Reference variable
     :param func: Callable combining two pd.Series: f(varible, reference_var)
+    :param copy: If False, modify the input frame in place, see make_inplace
     """
 
-    def __init__(self, variables: List[str], reference_var: str, func: str = "ratio"):
+    def __init__(
+        self, variables: List[str], reference_var: str, func: str = "ratio", copy=True
+    ):
 
         self.variables = variables
         self.reference_var = reference_var
         self.func = func
+        self.copy = copy
 
     def fit(self, X, y=None):
         "For compatibility only"
@@ -164,7 +211,8 @@ class BivariateTransformer(BaseEstimator, TransformerMixin):
 
         :returns: Transformed data
         """
-        X = X.copy()
+        if self.copy:
+            X = X.copy()
         for feature in self.variables:
             try:
                 X[feature] = self.func(X[feature], X[self.reference_var])
@@ -176,7 +224,7 @@ class BivariateTransformer(BaseEstimator, TransformerMixin):
         return X
 
 
-class FeatureDropper(BaseEstimator, TransformerMixin):
+class FeatureDropper(_DefaultsOnLoadMixin, BaseEstimator, TransformerMixin):
     """Drops selected columns.
 
     Drops selected columns inside of a scikit-learn pipline. Useful for example
@@ -184,11 +232,13 @@ class FeatureDropper(BaseEstimator, TransformerMixin):
     no longer needed. Typically used after BivariateTransformer.
 
     :param vars_to_drop: List of features to drop
+    :param copy: If False, modify the input frame in place, see make_inplace
     """
 
-    def __init__(self, vars_to_drop: List[str]):
+    def __init__(self, vars_to_drop: List[str], copy=True):
 
         self.vars_to_drop = vars_to_drop
+        self.copy = copy
 
     def fit(self, X, y=None):
         "For compatibility only"
@@ -201,25 +251,38 @@ class FeatureDropper(BaseEstimator, TransformerMixin):
 
         :returns: Data without unwanted features
         """
-        X = X.copy()
-        return X.drop(self.vars_to_drop, axis=1)
+        if self.copy:
+            return X.drop(self.vars_to_drop, axis=1)
+        X.drop(self.vars_to_drop, axis=1, inplace=True)
+        return X
 
 
-class RareLabelEncoder(BaseEstimator, TransformerMixin):
+class RareLabelEncoder(_DefaultsOnLoadMixin, BaseEstimator, TransformerMixin):
     """Rare label categorical encoder
 
     Merge all rare labels (proportin below selected tolerance) into one
     category 'rare'. Previously unseen labels during transform are also
     encoded as 'rare'.
 
+    With as_category=True the encoded columns are pd.Categorical with the
+    frequent labels and 'rare' as categories (see dtypes_). The mapping is
+    then done on integer codes and OneHotEncoderDF can consume the codes
+    directly, which scales much better for high cardinality variables.
+
     :param variables: List of variables to be encoded
     :param tol: Tolerance level, lables below this proportion will be merged
+    :param as_category: Return categorical instead of object columns
+    :param copy: If False, modify the input frame in place, see make_inplace
     """
 
-    def __init__(self, variables: List[str], tol: float = 0.05):
+    def __init__(
+        self, variables: List[str], tol: float = 0.05, as_category=False, copy=True
+    ):
 
         self.variables = variables
         self.tol = tol
+        self.as_category = as_category
+        self.copy = copy
 
     def fit(self, X: pd.DataFrame, y=None) -> "RareLabelEncoder":
         """Finds frequent categories
@@ -229,10 +292,60 @@ class RareLabelEncoder(BaseEstimator, TransformerMixin):
 
         :returns: self
         """
+        return self._fit_counts(
+            {var: ValueCounts().update(X[var]) for var in self.variables}
+        )
+
+    def partial_fit(self, X: pd.DataFrame, y=None) -> "RareLabelEncoder":
+        """Updates frequent categories with another chunk of the data
+
+        Gives the same result as fit on all the chunks at once.
+
+        :param X: pd.DataFrame of model predictors
+        :param y: For compatibility only
+
+        :returns: self
+        """
+        counts = getattr(self, "counts_", None) or {
+            var: ValueCounts() for var in self.variables
+        }
+        for var in self.variables:
+            counts[var].update(X[var])
+        return self._fit_counts(counts)
+
+    def merge(self, other: "RareLabelEncoder") -> "RareLabelEncoder":
+        """Adds label counts of an encoder fitted on other data
+
+        Encoders fitted on separate chunks, e.g. in separate processes, and
+        merged are the same as one encoder fitted on all the chunks.
+
+        :param other: encoder with the same variables
+
+        :returns: self
+        """
+        return self._fit_counts(
+            {
+                var: ValueCounts().merge(self.counts_[var]).merge(other.counts_[var])
+                for var in self.variables
+            }
+        )
+
+    def _fit_counts(self, counts: Dict[str, ValueCounts]) -> "RareLabelEncoder":
+        """Finds frequent categories from counts of labels of every variable"""
+        self.counts_ = counts
         self.frequent_labels_ = {}
+        self.dtypes_ = {}
         for var in self.variables:
-            t = pd.Series(X[var].value_counts() / np.float(len(X)))
-            self.frequent_labels_[var] = list(t[t >= self.tol].index)
+            n_rows = float(counts[var].n_rows)
+            self.frequent_labels_[var] = [
+                label
+                for label in counts[var].by_frequency()
+                if counts[var].counts[label] / n_rows >= self.tol
+            ]
+            self.dtypes_[var] = pd.CategoricalDtype(
+                self.frequent_labels_[var]
+                + ([] if "rare" in self.frequent_labels_[var] else ["rare"])
+            )
 
         return self
 
@@ -243,9 +356,165 @@ class RareLabelEncoder(BaseEstimator, TransformerMixin):
 
         :returns: Encoded data
         """
-        X = X.copy()
+        if self.copy:
+            X = X.copy()
         for feature in self.variables:
-            X[feature] = np.where(
-                X[feature].isin(self.frequent_labels_[feature]), X[feature], "rare"
-            )
+            if self.as_category:
+                X[feature] = self._encode_codes(X[feature], self.dtypes_[feature])
+            else:
+                X[feature] = np.where(
+                    X[feature].isin(self.frequent_labels_[feature]), X[feature], "rare"
+                )
         return X
+
+    @staticmethod
+    def _encode_codes(values: pd.Series, dtype: pd.CategoricalDtype) -> pd.Categorical:
+        """Maps labels outside of the categories to 'rare' using integer codes"""
+        codes = pd.Categorical(values, dtype=dtype).codes
+        codes = np.where(codes == -1, dtype.categories.get_loc("rare"), codes)
+        return pd.Categorical.from_codes(codes, dtype=dtype)
+
+
+class OneHotEncoderDF(_DefaultsOnLoadMixin, BaseEstimator, TransformerMixin):
+    """One hot encoder for pd.DataFrame
+
+    Replaces each selected variable by 0/1 indicator columns named
+    <variable>_<category>, placed before the remaining columns (the same
+    layout as ColumnTransformer with OneHotEncoder and remainder='passthrough').
+    Categories unseen during fit are encoded as all zeros.
+
+    Categorical columns with the same dtype as during fit, for example the
+    output of RareLabelEncoder(as_category=True), are encoded straight from
+    their integer codes without hashing the labels again.
+
+    With sparse=True the output is a scipy.sparse CSR matrix of float64 with
+    the same layout, see get_feature_names_out for names of its columns. The
+    remaining columns must then be numeric. Memory of the indicators grows
+    with the number of rows only, not with the number of categories.
+
+    :param variables: List of variables to be encoded
+    :param sparse: Return a CSR matrix instead of a pd.DataFrame
+    """
+
+    def __init__(self, variables: List[str], sparse=False):
+
+        self.variables = variables
+        self.sparse = sparse
+
+    def fit(self, X: pd.DataFrame, y=None) -> "OneHotEncoderDF":
+        """Finds categories of the variables
+
+        :param X: pd.DataFrame of model predictors
+        :param y: For compatibility only
+
+        :returns: self
+        """
+        self.dtypes_ = {}
+        for var in self.variables:
+            if isinstance(X[var].dtype, pd.CategoricalDtype):
+                self.dtypes_[var] = X[var].dtype
+            else:
+                self.dtypes_[var] = pd.CategoricalDtype(
+                    np.sort(X[var].dropna().unique())
+                )
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        return self
+
+    def transform(self, X: pd.DataFrame):
+        """Replaces the variables by indicator columns
+
+        :param X: pd.DataFrame of model predictors
+
+        :returns: Encoded data, pd.DataFrame or CSR matrix if sparse
+        """
+        if self.sparse:
+            return self._transform_sparse(X)
+
+        blocks, names = [], []
+        for var in self.variables:
+            dtype = self.dtypes_[var]
+            codes = self._codes(X[var], dtype)
+            indicators = np.zeros((len(X), len(dtype.categories)), dtype=np.uint8)
+            known = codes != -1
+            indicators[np.flatnonzero(known), codes[known]] = 1
+            blocks.append(indicators)
+            names.extend(self._indicator_names(var))
+
+        encoded = pd.DataFrame(
+            np.hstack(blocks) if blocks else np.empty((len(X), 0), dtype=np.uint8),
+            columns=names,
+            index=X.index,
+        )
+        return pd.concat([encoded, X.drop(columns=self.variables)], axis=1)
+
+    def _transform_sparse(self, X: pd.DataFrame) -> sparse.csr_matrix:
+        """Indicators built directly in CSR format, one entry per known label"""
+        rows, cols = [], []
+        offset = 0
+        for var in self.variables:
+            dtype = self.dtypes_[var]
+            codes = self._codes(X[var], dtype)
+            known = np.flatnonzero(codes != -1)
+            rows.append(known)
+            cols.append(codes[known].astype(np.int64) + offset)
+            offset += len(dtype.categories)
+
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int64)
+        indicators = sparse.csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(X), offset)
+        )
+        try:
+            remainder = X.drop(columns=self.variables).to_numpy(dtype=np.float64)
+        except (TypeError, ValueError) as error:
+            raise InvalidInputError(
+                "Columns not one hot encoded must be numeric for sparse output."
+            ) from error
+        return sparse.hstack([indicators, sparse.csr_matrix(remainder)], format="csr")
+
+    def get_feature_names_out(self, input_features=None) -> np.ndarray:
+        """Names of the output columns, <variable>_<category> for indicators"""
+        if input_features is None:
+            input_features = self.feature_names_in_
+        names = [name for var in self.variables for name in self._indicator_names(var)]
+        names += [col for col in input_features if col not in self.variables]
+        return np.asarray(names, dtype=object)
+
+    def _indicator_names(self, var: str) -> List[str]:
+        return [f"{var}_{category}" for category in self.dtypes_[var].categories]
+
+    @staticmethod
+    def _codes(values: pd.Series, dtype: pd.CategoricalDtype) -> np.ndarray:
+        """Integer codes of the labels, -1 for unknown ones"""
+        if values.dtype == dtype:
+            return values.cat.codes.to_numpy()
+        return pd.Categorical(values, dtype=dtype).codes
+
+
+# transformers able to work in place, see make_inplace
+INPLACE_TRANSFORMERS = (
+    UnivariateTransformer,
+    BivariateTransformer,
+    FeatureDropper,
+    RareLabelEncoder,
+)
+
+
+def make_inplace(pipeline: Pipeline) -> Pipeline:
+    """Avoids copying pd.DataFrames between steps of a pipeline
+
+    The first step keeps copying as it receives the caller's data. Every
+    later step receives a frame created within the pipeline, which it is
+    free to modify, so transformers able to work in place are switched to
+    copy=False. This removes the copies made by those steps only: peak memory
+    of the whole pipeline drops just when they, and not for example one hot
+    encoding or the final estimator, set it.
+
+    :param pipeline: pipeline to modify
+
+    :returns: the same pipeline
+    """
+    for position, (_, step) in enumerate(pipeline.steps):
+        if isinstance(step, INPLACE_TRANSFORMERS):
+            step.set_params(copy=position == 0)
+    return pipeline
@@ -1,25 +1,159 @@
 """
 Functionality to validate the imput data
 
-# TODO: extend to allow different pipes have different conditions
-# TODO: report which rows where filtered
+Every registered model gets a Validator compiled from its config:
+  * numeric features must hold finite numbers (or missing values), values
+    the decoder could not read as numbers are flagged in
+    data.attrs[decoding.INVALID_VALUES]
+  * variables in NAN_NOT_ALLOWED must not be missing
+  * VALUE_RANGES {variable: (min, max)} bounds numeric variables, inclusive,
+    None for no bound
+  * ALLOWED_CATEGORIES {variable: [labels]} restricts categorical variables
+
+All rules are evaluated column by column on whole NumPy arrays, reasons are
+only formatted for rejected rows and valid data is never copied.
 """
+import functools
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
 import pandas as pd
 
-import housing_regression.config.dev_config as conf
+from housing_regression.models import MODELS
+from housing_regression.processing.decoding import INVALID_VALUES
 
 
-def validate_inputs(input_data: pd.DataFrame) -> pd.DataFrame:
-    """Filters out rows with missing values where not expected
+class ValidationResult(NamedTuple):
+    """Outcome of validation of a dataframe
 
-    :param input_data: dataframe of data to be filtered
+    :param mask: True for valid rows, in the order of the rows
+    :param reasons: reasons of rejection of every rejected row, keyed by
+        position of the row
+    """
+
+    mask: np.ndarray
+    reasons: Dict[int, List[str]]
 
-    :returns: dataframe with filtered rows
+    @property
+    def rejected(self) -> np.ndarray:
+        """Positions of rejected rows"""
+        return np.flatnonzero(~self.mask)
+
+
+class Validator:
+    """Vectorised validation of observations of a model
+
+    :param features: variables of the model
+    :param categorical: features holding labels, all others are numeric
+    :param nan_not_allowed: variables that must not be missing
+    :param ranges: {variable: (min, max)} inclusive bounds of numeric
+        variables, None for no bound
+    :param allowed_categories: {variable: labels} allowed labels of
+        categorical variables, missing values are governed by nan_not_allowed
     """
 
-    validated_data = input_data.copy()
+    def __init__(
+        self,
+        features: Sequence[str],
+        categorical: Sequence[str],
+        nan_not_allowed: Sequence[str] = (),
+        ranges: Dict[str, Tuple[float, float]] = None,
+        allowed_categories: Dict[str, Sequence] = None,
+    ):
+
+        self.features = list(features)
+        self.categorical = set(categorical)
+        self.nan_not_allowed = list(nan_not_allowed)
+        self.ranges = dict(ranges or {})
+        self.allowed_categories = {
+            var: list(labels) for var, labels in (allowed_categories or {}).items()
+        }
+
+    @classmethod
+    def from_config(cls, conf) -> "Validator":
+        """Validator of a model config module, see dev_config"""
+        return cls(
+            conf.FEATURES,
+            conf.CATEGORICAL_VARS,
+            nan_not_allowed=getattr(conf, "NAN_NOT_ALLOWED", ()),
+            ranges=getattr(conf, "VALUE_RANGES", None),
+            allowed_categories=getattr(conf, "ALLOWED_CATEGORIES", None),
+        )
 
-    if input_data[conf.NAN_NOT_ALLOWED].isnull().any().any():
-        validated_data = validated_data.dropna(axis=0, subset=conf.NAN_NOT_ALLOWED)
+    def check(self, data: pd.DataFrame) -> ValidationResult:
+        """Evaluates all rules on all rows
 
-    return validated_data
+        :param data: observations, must contain all variables of the rules
+        """
+        failures = []
+        invalid = data.attrs.get(INVALID_VALUES, {})
+        for var in self.features:
+            if var in self.categorical or var not in data:
+                continue
+            values = data[var].to_numpy()
+            if values.dtype.kind in "fiub":
+                failed = np.isinf(values)
+                if invalid.get(var):
+                    # by label, the data may be a subset of the decoded rows
+                    failed = failed | data.index.isin(list(invalid[var]))
+                failures.append((var, "not a finite number", failed))
+            else:
+                numbers = pd.to_numeric(data[var], errors="coerce").to_numpy()
+                failures.append(
+                    (
+                        var,
+                        "not a finite number",
+                        (np.isnan(numbers) & data[var].notna().to_numpy())
+                        | np.isinf(numbers),
+                    )
+                )
+        for var in self.nan_not_allowed:
+            failures.append((var, "missing", data[var].isna().to_numpy()))
+        for var, (low, high) in self.ranges.items():
+            values = pd.to_numeric(data[var], errors="coerce").to_numpy(np.float64)
+            with np.errstate(invalid="ignore"):
+                if low is not None:
+                    failures.append((var, f"below {low}", values < low))
+                if high is not None:
+                    failures.append((var, f"above {high}", values > high))
+        for var, labels in self.allowed_categories.items():
+            values = data[var]
+            failures.append(
+                (
+                    var,
+                    "unknown category",
+                    ~(values.isin(labels) | values.isna()).to_numpy(),
+                )
+            )
+
+        mask = np.ones(len(data), dtype=bool)
+        for _, _, failed in failures:
+            mask &= ~failed
+        reasons: Dict[int, List[str]] = {}
+        if not mask.all():
+            for var, reason, failed in failures:
+                for position in np.flatnonzero(failed):
+                    reasons.setdefault(int(position), []).append(f"{var}: {reason}")
+        return ValidationResult(mask, reasons)
+
+    def filter(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Valid rows of the data, the data itself if all rows are valid"""
+        mask = self.check(data).mask
+        return data if mask.all() else data[mask]
+
+
+@functools.lru_cache(maxsize=None)
+def get_validator(model_name: str) -> Validator:
+    """Validator compiled from the config of a registered model"""
+    return Validator.from_config(MODELS[model_name]["config"])
+
+
+def validate_inputs(input_data: pd.DataFrame, model_name="DevModel") -> pd.DataFrame:
+    """Filters out rows failing validation rules of the model
+
+    :param input_data: dataframe of data to be filtered
+    :param model_name: name of a model registered in housing_regression.models
+
+    :returns: dataframe with filtered rows, input_data itself if all are valid
+    """
+    return get_validator(model_name).filter(input_data)
@@ -0,0 +1,203 @@
+"""
+Functionality to score whole datasets with persisted models
+
+The dataset is read in chunks which are scored by a pool of worker processes,
+each loading the pipeline once. Predictions are written in the order of the
+input, one row per input row.
+"""
+import collections
+import logging
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+import housing_regression.processing.data_management as dm
+from housing_regression import __version__
+from housing_regression.models import MODELS
+from housing_regression.predict import load_compiled_model, load_model
+from housing_regression.processing.validation import validate_inputs
+
+_logger = logging.getLogger(__name__)
+
+PREDICTION = "prediction"
+
+# pipeline used by the current worker process, see _init_worker
+_worker_state: dict = {}
+
+
+def score_dataset(
+    input_path: str,
+    output_path: str,
+    model_name: str,
+    chunk_size: int = 100000,
+    n_workers: int = None,
+    id_column: str = None,
+    compiled=False,
+) -> Dict[str, float]:
+    """Scores a csv/parquet dataset and writes predictions to a file
+
+    Rows failing validation get a missing prediction.
+
+    :param input_path: dataset to score, format given by the extension
+    :param output_path: where to write predictions, csv or parquet
+    :param model_name: name of a model registered in housing_regression.models
+    :param chunk_size: number of rows read and scored at once
+    :param n_workers: number of worker processes, 0 scores in this process,
+        defaults to the number of CPUs
+    :param id_column: column copied from the input to the output
+    :param compiled: score with the compiled NumPy program instead of the
+        pipeline, see housing_regression.processing.compiler
+
+    :returns: throughput report - rows, rows/s and seconds spent per stage
+    :raises ImportError: if either file is parquet and pyarrow is missing
+    """
+    if dm.is_parquet(input_path) or dm.is_parquet(output_path):
+        # before the output is created and any rows are scored
+        dm.require_parquet()
+    conf = MODELS[model_name]["config"]
+    columns = list(conf.FEATURES) + ([id_column] if id_column else [])
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+
+    report = collections.Counter()
+    start = time.perf_counter()
+    chunks = _timed(dm.iter_dataset(input_path, chunk_size, columns), report, "read")
+
+    with _PredictionWriter(output_path) as writer:
+        if n_workers == 0:
+            _init_worker(model_name, compiled)
+            results = map(_score_chunk, chunks)
+        else:
+            executor = ProcessPoolExecutor(
+                max_workers=n_workers,
+                initializer=_init_worker,
+                initargs=(model_name, compiled),
+            )
+            results = _ordered_results(executor, chunks, max_pending=2 * n_workers)
+
+        for scored, timings in results:
+            report.update(timings)
+            write_start = time.perf_counter()
+            writer.write(scored)
+            report["write"] += time.perf_counter() - write_start
+            report["rows"] += len(scored)
+
+    report["total"] = time.perf_counter() - start
+    report["rows_per_second"] = report["rows"] / report["total"]
+    _logger.info(
+        f"Scored {report['rows']} rows with model {model_name}, version: "
+        f"{__version__} in {report['total']:.1f}s "
+        f"({report['rows_per_second']:.0f} rows/s)"
+    )
+    return dict(report)
+
+
+def _init_worker(model_name: str, compiled: bool) -> None:
+    """Loads the pipeline once per worker process"""
+    _worker_state["model_name"] = model_name
+    _worker_state["conf"] = MODELS[model_name]["config"]
+    _worker_state["pipeline"] = (
+        load_compiled_model(model_name) if compiled else load_model(model_name)
+    )
+
+
+def _score_chunk(chunk: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, float]]:
+    """Scores a single chunk in a worker process"""
+    start = time.perf_counter()
+    conf, pipeline = _worker_state["conf"], _worker_state["pipeline"]
+
+    validated = validate_inputs(chunk, _worker_state["model_name"])
+    validate_end = time.perf_counter()
+
+    prediction = np.full(len(chunk), np.nan)
+    if len(validated):
+        prediction[chunk.index.get_indexer(validated.index)] = pipeline.predict(
+            validated[conf.FEATURES]
+        )
+    scored = chunk.drop(columns=conf.FEATURES).assign(**{PREDICTION: prediction})
+
+    timings = {
+        "validate": validate_end - start,
+        "predict": time.perf_counter() - validate_end,
+    }
+    return scored, timings
+
+
+def _ordered_results(executor: ProcessPoolExecutor, chunks, max_pending: int):
+    """Scores chunks in parallel, yields results in order of the input
+
+    At most max_pending chunks are in flight so that reading does not run
+    ahead of scoring.
+    """
+    pending: "collections.deque[Future]" = collections.deque()
+    with executor:
+        for chunk in chunks:
+            pending.append(executor.submit(_score_chunk, chunk))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _timed(iterable, report: collections.Counter, stage: str):
+    """Adds the time spent producing the items to the report"""
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            report[stage] += time.perf_counter() - start
+        yield item
+
+
+class _PredictionWriter:
+    """Appends chunks of predictions to a csv or parquet file"""
+
+    def __init__(self, path: str):
+
+        self.path = path
+        self._parquet = dm.is_parquet(path)
+        self._file = None
+        self._writer = None
+
+    def __enter__(self) -> "_PredictionWriter":
+        if not self._parquet:
+            self._file = open(self.path, "w", newline="")
+        return self
+
+    def write(self, scored: pd.DataFrame) -> None:
+        if not self._parquet:
+            scored.to_csv(self._file, header=self._file.tell() == 0, index=False)
+            return
+
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(scored, preserve_index=False)
+        if self._writer is None:
+            self._writer = dm.require_parquet().ParquetWriter(self.path, table.schema)
+        self._writer.write_table(table)
+
+    def __exit__(self, *exc_info) -> None:
+        if self._file is not None:
+            self._file.close()
+        if self._writer is not None:
+            self._writer.close()
+
+
+def format_report(report: Dict[str, float]) -> List[str]:
+    """Lines of a human readable throughput report"""
+    lines = [
+        f"rows: {report['rows']:.0f}",
+        f"throughput: {report['rows_per_second']:.0f} rows/s",
+        f"wall time: {report['total']:.2f}s",
+    ]
+    for stage in ("read", "validate", "predict", "write"):
+        lines.append(f"{stage}: {report.get(stage, 0.0):.2f}s")
+    return lines
@@ -2,29 +2,105 @@
 Functionality to train registered models
 """
 import logging
+import os
 
 import housing_regression.config.global_config as global_conf
 import housing_regression.processing.data_management as dm
 from housing_regression import __version__
 from housing_regression.models import MODELS
+from housing_regression.predict import model_path
+from housing_regression.processing.artifact import export_artifact
+from housing_regression.processing.compiler import compile_pipeline
+from housing_regression.processing.prefix_cache import PrefixCache
+from housing_regression.processing.profiling import PROFILER
+from housing_regression.processing.streaming import fit_streaming
 
 _logger = logging.getLogger(__name__)
 
 
-def train_pipeline(data_path: str, model_name: str, save_path=None) -> None:
+def train_pipeline(
+    data_path: str,
+    model_name: str,
+    save_path=None,
+    profile=False,
+    chunk_size=None,
+    n_jobs=1,
+    cache_dir=None,
+    export=False,
+    version=None,
+) -> None:
     """Fit and persist the pipeline
 
     :param data_path: path to training dataset
     :param model_name: name of a model registered in housing_regression.models
     :param save_path: where to save the pipeline
+    :param profile: log time, rows and allocated memory of every step
+    :param chunk_size: fit out of core, reading this many rows at a time,
+        see housing_regression.processing.streaming
+    :param n_jobs: processes collecting statistics of the chunks in parallel,
+        used only together with chunk_size
+    :param cache_dir: reuse fitted preprocessing steps of earlier runs on
+        the same data stored in this directory, see
+        housing_regression.processing.prefix_cache; not used with chunk_size
+    :param export: also export the compiled artifact, see export_model
+    :param version: save as this version of the model, served next to the
+        default pipeline, see housing_regression.predict.model_path; ignored
+        with save_path
     """
-    data = dm.load_dataset(data_path)
     _logger.info(f"Training pipeline: {model_name}, version: {__version__}")
 
     pipeline = MODELS[model_name]["pipeline"]
     conf = MODELS[model_name]["config"]
 
-    pipeline.fit(data[conf.FEATURES], data[global_conf.LABEL])
+    if profile:
+        PROFILER.enable(trace_memory=True)
+        try:
+            with PROFILER.profiled(pipeline, model_name):
+                _fit(pipeline, conf, data_path, chunk_size, n_jobs, cache_dir)
+            PROFILER.log_report()
+        finally:
+            # later fits and predictions in the process are not measured
+            PROFILER.disable()
+            PROFILER.reset()
+    else:
+        _fit(pipeline, conf, data_path, chunk_size, n_jobs, cache_dir)
     if not save_path:
-        save_path = conf.PATH
+        save_path = model_path(model_name, version)
     dm.save_pipeline(pipe=pipeline, path=save_path)
+    if export:
+        export_model(model_name, pipeline, os.path.splitext(save_path)[0] + ".hrm")
+
+
+def export_model(model_name: str, pipeline=None, path=None) -> None:
+    """Exports a fitted pipeline as a compact artifact
+
+    :param model_name: name of a model registered in housing_regression.models
+    :param pipeline: fitted pipeline, the persisted one by default
+    :param path: where to save the artifact, ARTIFACT_PATH of the model config
+        by default
+    """
+    conf = MODELS[model_name]["config"]
+    if pipeline is None:
+        pipeline = dm.load_pipeline(conf.PATH)
+    program = compile_pipeline(pipeline, conf.FEATURES)
+    export_artifact(program, path or conf.ARTIFACT_PATH, name=model_name)
+
+
+def _fit(
+    pipeline, conf, data_path: str, chunk_size=None, n_jobs=1, cache_dir=None
+) -> None:
+    if not chunk_size:
+        data = dm.load_dataset(data_path)
+        X, y = data[conf.FEATURES], data[global_conf.LABEL]
+        if cache_dir:
+            PrefixCache(cache_dir).fit(pipeline, X, y)
+        else:
+            pipeline.fit(X, y)
+        return
+
+    def chunks():
+        columns = conf.FEATURES + [global_conf.LABEL]
+        for data in dm.iter_dataset(data_path, chunk_size, columns=columns):
+            yield data[conf.FEATURES], data[global_conf.LABEL]
+
+    fit_streaming(pipeline, chunks, n_jobs=n_jobs)
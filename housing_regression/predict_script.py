@@ -2,6 +2,7 @@
 Script to score new data with a persisted pipeline
 """
 import argparse
+import json
 
 from housing_regression.predict import predict
 
@@ -19,4 +20,5 @@ parser.add_argument('--model',
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    predict(input_data=args.input_data, model_name=args.model)
+    result = predict(input_data=args.input_data, model_name=args.model)
+    print(json.dumps(result))
@@ -0,0 +1,42 @@
+"""
+Script to score a whole csv/parquet dataset with a persisted pipeline
+"""
+import argparse
+
+from housing_regression.processing.data_management import is_parquet, require_parquet
+from housing_regression.score import format_report, score_dataset
+
+
+# defaults to dev pipeline
+MODEL = 'DevModel'
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument('input', help='path to csv/parquet data to score')
+parser.add_argument('output', help='path to csv/parquet file with predictions')
+parser.add_argument('--model', help='name of registered model', default=MODEL)
+parser.add_argument('--chunk-size', help='rows scored at once', type=int,
+                    default=100000)
+parser.add_argument('--workers', help='number of worker processes, 0 to score '
+                    'in the main process, defaults to number of CPUs',
+                    type=int, default=None)
+parser.add_argument('--id-column', help='input column copied to the output')
+parser.add_argument('--compiled', help='use the compiled NumPy pipeline',
+                    action='store_true')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if is_parquet(args.input) or is_parquet(args.output):
+        try:
+            require_parquet()
+        except ImportError as error:
+            parser.error(str(error))
+    report = score_dataset(input_path=args.input,
+                           output_path=args.output,
+                           model_name=args.model,
+                           chunk_size=args.chunk_size,
+                           n_workers=args.workers,
+                           id_column=args.id_column,
+                           compiled=args.compiled)
+    print('\n'.join(format_report(report)))
@@ -46,7 +46,11 @@ setup(
     packages=find_packages(exclude=('tests',)),
     package_data={NAME: ['VERSION']},
     install_requires=list_reqs(),
-    extras_require={},
+    # Arrow IPC streams and parquet files, see processing.decoding and score
+    extras_require={
+        'arrow': ['pyarrow>=6.0.0'],
+        'parquet': ['pyarrow>=6.0.0'],
+    },
     include_package_data=True,
     license='MIT',
     classifiers=[
@@ -0,0 +1,107 @@
+"""
+Test export and loading of compact model artifacts
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.append("..")
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+
+import housing_regression.config.global_config as global_conf
+import housing_regression.processing.artifact as art
+import housing_regression.processing.transformers as tran
+from housing_regression.models import MODELS
+from housing_regression.processing.compiler import compile_pipeline
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.exceptions import (
+    IncompatibleArtifactError,
+    UnsupportedPipelineError,
+)
+from housing_regression.train import export_model
+
+TRAIN_DATA = "housing_regression/data/train.csv"
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+def fit(model_name):
+    conf = MODELS[model_name]["config"]
+    data = load_dataset(TRAIN_DATA)
+    return clone(MODELS[model_name]["pipeline"]).fit(
+        data[conf.FEATURES], data[global_conf.LABEL]
+    )
+
+
+@pytest.fixture
+def artifact_path():
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, "model.hrm")
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_same_predictions(model_name, artifact_path):
+    """Does the loaded artifact predict the same as the pipeline?"""
+    conf = MODELS[model_name]["config"]
+    pipeline = fit(model_name)
+    export_model(model_name, pipeline, artifact_path)
+    program = art.load_artifact(artifact_path)
+
+    features = load_dataset(TEST_DATA)[conf.FEATURES]
+    np.testing.assert_allclose(
+        program.predict(features), pipeline.predict(features), rtol=1e-9
+    )
+    single = features.iloc[[0]].copy()
+    single[conf.CATEGORICAL_VARS] = "never seen"
+    np.testing.assert_allclose(
+        program.predict(single), pipeline.predict(single), rtol=1e-9
+    )
+    assert isinstance(program.predictor.coef, np.memmap)
+
+
+def test_load_without_sklearn(artifact_path):
+    """Can the artifact be loaded without importing sklearn and pandas?"""
+    export_model("DevModel", fit("DevModel"), artifact_path)
+    script = (
+        "import sys, json\n"
+        "from housing_regression.processing.artifact import load_artifact\n"
+        f"program = load_artifact({artifact_path!r})\n"
+        "print(json.dumps([m for m in ('sklearn', 'pandas') if m in sys.modules]))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script],
+        capture_output=True,
+        check=True,
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    assert json.loads(output.stdout.decode().strip().splitlines()[-1]) == []
+
+
+def test_version_check(artifact_path, monkeypatch):
+    """Are artifacts of incompatible versions refused?"""
+    export_model("DevModel", fit("DevModel"), artifact_path)
+    monkeypatch.setattr(art, "__version__", "99.0.0")
+    with pytest.raises(IncompatibleArtifactError):
+        art.load_artifact(artifact_path)
+
+    with open(artifact_path, "wb") as file:
+        file.write(b"not a model")
+    with pytest.raises(IncompatibleArtifactError):
+        art.load_artifact(artifact_path)
+
+
+def test_lambda_not_exported(artifact_path):
+    """Are functions that cannot be imported by name refused?"""
+    conf = MODELS["DevModel"]["config"]
+    pipeline = fit("DevModel")
+    pipeline.steps[4] = (
+        "LogTransform",
+        tran.UnivariateTransformer(conf.NUMERICALS_LOG_VARS, func=lambda x: x),
+    )
+    with pytest.raises(UnsupportedPipelineError):
+        art.export_artifact(compile_pipeline(pipeline, conf.FEATURES), artifact_path)
@@ -0,0 +1,137 @@
+"""
+Test compilation of pipelines into NumPy programs
+"""
+import sys
+
+sys.path.append("..")
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import housing_regression.config.global_config as global_conf
+import housing_regression.processing.transformers as tran
+from housing_regression.models import MODELS
+from housing_regression.predict import predict
+from housing_regression.processing.compiler import compile_pipeline, feature_map
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.exceptions import UnsupportedPipelineError
+
+TRAIN_DATA = "housing_regression/data/train.csv"
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+@pytest.fixture(scope="module")
+def test_data():
+    return load_dataset(TEST_DATA)
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_same_predictions(model_name, test_data):
+    """Does the compiled pipeline predict the same as the original one?"""
+    conf = MODELS[model_name]["config"]
+    train_data = load_dataset(TRAIN_DATA)
+    pipeline = clone(MODELS[model_name]["pipeline"])
+    pipeline.fit(train_data[conf.FEATURES], train_data[global_conf.LABEL])
+
+    features = test_data[conf.FEATURES]
+    program = compile_pipeline(pipeline, conf.FEATURES)
+
+    np.testing.assert_allclose(
+        program.predict(features), pipeline.predict(features), rtol=1e-9
+    )
+    # single rows, including unseen categories and missing values
+    single = features.iloc[[0]].copy()
+    single[conf.CATEGORICAL_VARS] = "never seen"
+    single[conf.NUMERIC_VARS[-1]] = np.nan
+    np.testing.assert_allclose(
+        program.predict(single), pipeline.predict(single), rtol=1e-9
+    )
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_compiled_predict(model_name, test_data):
+    """Does predict() give the same results with the compiled pipeline?"""
+    json_data = test_data.iloc[:20].to_json(orient="records")
+
+    np.testing.assert_allclose(
+        predict(json_data, model_name, compiled=True)["prediction"],
+        predict(json_data, model_name)["prediction"],
+        rtol=1e-9,
+    )
+
+
+def test_categorical_encoding(test_data):
+    """Does encoding via categorical codes predict the same as the dev model?"""
+    conf = MODELS["DevModel"]["config"]
+    train_data = load_dataset(TRAIN_DATA)
+    pipeline = clone(MODELS["DevModel"]["pipeline"])
+    categorical = clone(pipeline).set_params(
+        RareEncoder=tran.RareLabelEncoder(conf.CATEGORICAL_VARS, as_category=True),
+        OneHotEncoder=tran.OneHotEncoderDF(conf.CATEGORICAL_VARS),
+    )
+    for pipe in (pipeline, categorical):
+        pipe.fit(train_data[conf.FEATURES], train_data[global_conf.LABEL])
+
+    features = test_data[conf.FEATURES]
+    expected = pipeline.predict(features)
+
+    np.testing.assert_allclose(categorical.predict(features), expected, rtol=1e-6)
+    np.testing.assert_allclose(
+        compile_pipeline(categorical, conf.FEATURES).predict(features),
+        expected,
+        rtol=1e-6,
+    )
+
+
+def test_unsupported():
+    """Are unsupported steps reported?"""
+    pipeline = Pipeline([("scaler", StandardScaler()), ("model", None)])
+
+    with pytest.raises(UnsupportedPipelineError):
+        compile_pipeline(pipeline, ["a"])
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_sparse_features(model_name, test_data):
+    """Does the explicitly sparse pipeline fit CSR features and compile?"""
+    conf = MODELS[model_name]["config"]
+    train_data = load_dataset(TRAIN_DATA)
+    X, y = train_data[conf.FEATURES], train_data[global_conf.LABEL]
+    dense = clone(MODELS[model_name]["pipeline"]).fit(X, y)
+    pipeline = clone(MODELS[model_name]["pipeline"])
+    pipeline.set_params(
+        OneHotEncoder__sparse_threshold=1.0, OneHotEncoder__OHE__sparse=True
+    ).fit(X, y)
+
+    features = test_data[conf.FEATURES]
+    assert pipeline[:-1].transform(features).format == "csr"
+    # LinearRegression solves sparse problems iteratively
+    np.testing.assert_allclose(
+        pipeline.predict(features), dense.predict(features), rtol=1e-4
+    )
+    np.testing.assert_allclose(
+        compile_pipeline(pipeline, conf.FEATURES).predict(features),
+        pipeline.predict(features),
+        rtol=1e-9,
+    )
+
+
+def test_feature_map():
+    """Are the expanded columns named and mapped back to the variables?"""
+    conf = MODELS["DevModel"]["config"]
+    train_data = load_dataset(TRAIN_DATA)
+    X, y = train_data[conf.FEATURES], train_data[global_conf.LABEL]
+    pipeline = clone(MODELS["DevModel"]["pipeline"]).fit(X, y)
+    columns = feature_map(pipeline, conf.FEATURES)
+
+    assert len(columns) == len(pipeline[-1].coef_)
+    for name, (variable, category) in columns.items():
+        if category is None:
+            assert name == variable
+        else:
+            assert variable in conf.CATEGORICAL_VARS
+            assert name == f"{variable}_{category}"
@@ -0,0 +1,108 @@
+"""
+Tests decoding of JSON input data
+"""
+import json
+import sys
+
+sys.path.append("..")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_regression.models import MODELS
+from housing_regression.predict import get_decoder
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.decoding import INVALID_VALUES, FeatureDecoder
+from housing_regression.processing.exceptions import InvalidInputError
+from housing_regression.processing.validation import validate_inputs
+
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+@pytest.fixture
+def decoder():
+    return FeatureDecoder(["a", "b"], categorical=["b"])
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_same_as_read_json(model_name):
+    """Are the decoded features equal to those parsed by pd.read_json?"""
+    conf = MODELS[model_name]["config"]
+    json_data = load_dataset(TEST_DATA).to_json(orient="records")
+
+    decoded = validate_inputs(get_decoder(model_name).decode(json_data))
+    expected = validate_inputs(pd.read_json(json_data))[conf.FEATURES]
+
+    pd.testing.assert_frame_equal(
+        decoded, expected.fillna(np.nan), check_dtype=False, check_index_type=False
+    )
+    assert (decoded.dtypes[conf.NUMERIC_VARS] == np.float64).all()
+
+
+@pytest.mark.parametrize(
+    "input_data",
+    [
+        '[{"a": 1, "b": "x", "c": [1, 2]}, {"a": null, "b": null}]',
+        b'[{"a": 1, "b": "x"}, {"a": null, "b": null}]',
+        json.dumps('[{"a": 1, "b": "x"}, {"b": null, "a": null}]'),
+        [{"a": 1, "b": "x"}, {"b": None}],
+        '{"a": {"0": 1, "1": null}, "b": {"0": "x", "1": null}}',
+    ],
+)
+def test_layouts(decoder, input_data):
+    """Are all supported layouts decoded the same?"""
+    decoded = decoder.decode(input_data)
+
+    assert list(decoded.columns) == ["a", "b"]
+    assert decoded["a"].dtype == np.float64
+    assert decoded["a"].tolist()[0] == 1.0 and np.isnan(decoded["a"][1])
+    assert decoded["b"].tolist()[0] == "x" and np.isnan(decoded["b"][1])
+
+
+def test_single_record(decoder):
+    assert len(decoder.decode('{"a": 1, "b": "x"}')) == 1
+
+
+@pytest.mark.parametrize(
+    "input_data",
+    ["[{'a': 1}]", '[{"b": "x"}]', "[1, 2]", "1"],
+)
+def test_invalid(decoder, input_data):
+    with pytest.raises(InvalidInputError):
+        decoder.decode(input_data)
+
+
+def test_invalid_values(decoder):
+    """Are values which are not numbers flagged instead of failing the input?"""
+    decoded = decoder.decode('[{"a": 1, "b": "x"}, {"a": "one"}, {"a": [2]}]')
+
+    assert decoded["a"].tolist()[0] == 1.0
+    assert decoded["a"][1:].isna().all()
+    assert decoded.attrs[INVALID_VALUES] == {"a": frozenset([1, 2])}
+    assert INVALID_VALUES not in decoder.decode('[{"a": 1, "b": "x"}]').attrs
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_arrow_same_as_json(model_name):
+    """Are features decoded from Arrow equal to those decoded from JSON?"""
+    pa = pytest.importorskip("pyarrow")
+    test_data = load_dataset(TEST_DATA)
+    decoder = get_decoder(model_name)
+    table = pa.Table.from_pandas(test_data, preserve_index=False)
+
+    pd.testing.assert_frame_equal(
+        decoder.from_arrow(table),
+        decoder.decode(test_data.to_json(orient="records")),
+    )
+
+
+def test_arrow_invalid(decoder):
+    pa = pytest.importorskip("pyarrow")
+
+    decoded = decoder.from_arrow(pa.table({"a": ["1", "one"], "b": ["x", "y"]}))
+    assert decoded["a"][0] == 1.0
+    assert decoded.attrs[INVALID_VALUES] == {"a": frozenset([1])}
+    with pytest.raises(InvalidInputError):
+        decoder.from_arrow(pa.table({"a": [1.0]}))
@@ -0,0 +1,86 @@
+"""
+Test that importing the package stays cheap and free of side effects
+"""
+import json
+import logging
+import os
+import subprocess
+import sys
+
+sys.path.append("..")
+
+from housing_regression.config.logging_config import LazyFileHandler
+
+PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# seconds importing housing_regression.predict may take on top of NumPy and
+# pandas, about a tenth is spent now and importing scikit-learn alone takes
+# well above the budget
+IMPORT_TIME_BUDGET = 0.25
+# imported only once a pipeline is loaded or fitted
+HEAVY_MODULES = ["sklearn", "scipy", "joblib", "housing_regression.pipelines"]
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=PACKAGE_ROOT)
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=PACKAGE_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_times(statement: str) -> dict:
+    """Cumulative import times in seconds of modules imported by statement"""
+    stderr = run_python("-X", "importtime", "-c", statement).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def test_import_time_budget():
+    """Does importing the scoring code stay within its budget?"""
+    times = import_times("import numpy, pandas; import housing_regression.predict")
+    assert times["housing_regression.predict"] < IMPORT_TIME_BUDGET
+
+
+def test_no_heavy_imports():
+    """Are scikit-learn and the pipelines imported only when needed?"""
+    statement = (
+        "import json, sys; "
+        "from housing_regression.models import MODELS; "
+        "import housing_regression.predict; "
+        "MODELS['DevModel']['config'].FEATURES; "
+        "loaded = lambda: [m for m in %r if m in sys.modules]; "
+        "before = loaded(); "
+        "MODELS['DevModel']['pipeline']; "
+        "print(json.dumps([before, loaded()]))"
+    ) % (HEAVY_MODULES,)
+    before, after = json.loads(run_python("-c", statement).stdout)
+    assert before == []
+    assert "sklearn" in after
+    assert "housing_regression.pipelines" in after
+
+
+def test_log_file_created_lazily(tmp_path):
+    """Is the log file created only once something is logged?"""
+    log_file = tmp_path / "logs" / "logs.log"
+    handler = LazyFileHandler(str(log_file), when="midnight")
+    assert not log_file.parent.exists()
+
+    logger = logging.getLogger("test_log_file_created_lazily")
+    logger.addHandler(handler)
+    try:
+        logger.warning("message")
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+    assert "message" in log_file.read_text()
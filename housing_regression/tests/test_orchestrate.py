@@ -0,0 +1,50 @@
+"""
+Test training of several models at once
+"""
+import json
+import os
+import sys
+import tempfile
+
+sys.path.append("..")
+
+import pytest
+from sklearn.pipeline import Pipeline
+
+from housing_regression.models import MODELS
+from housing_regression.orchestrate import make_jobs, train_models
+from housing_regression.processing.data_management import load_pipeline
+
+TRAIN_DATA = "housing_regression/data/train.csv"
+MODEL_NAMES = list(MODELS.keys())
+
+
+def test_make_jobs():
+    """Is there a job per model and combination of parameters?"""
+    jobs = make_jobs(MODEL_NAMES, {"RareEncoder__tol": [0.01, 0.05]})
+
+    assert len(jobs) == 2 * len(MODEL_NAMES)
+    assert len({job.name for job in jobs}) == len(jobs)
+    assert jobs[0].params == {"RareEncoder__tol": 0.01}
+    assert [job.name for job in make_jobs(MODEL_NAMES)] == MODEL_NAMES
+    with pytest.raises(KeyError):
+        make_jobs(["NoSuchModel"])
+
+
+def test_train_models():
+    """Are all jobs trained and persisted with their metadata?"""
+    jobs = make_jobs(MODEL_NAMES, {"RareEncoder__tol": [0.01, 0.05]})
+    with tempfile.TemporaryDirectory() as save_dir:
+        results = train_models(TRAIN_DATA, jobs, save_dir, processes=2)
+
+        for job, metadata in zip(jobs, results):
+            assert metadata["name"] == job.name
+            assert metadata["peak_rss_bytes"] > 0
+            pipeline = load_pipeline(metadata["path"])
+            assert isinstance(pipeline, Pipeline)
+            assert (
+                pipeline.get_params()["RareEncoder__tol"]
+                == job.params["RareEncoder__tol"]
+            )
+            with open(os.path.join(save_dir, f"{job.name}.json")) as file:
+                assert json.load(file)["params"] == job.params
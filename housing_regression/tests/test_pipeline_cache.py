@@ -0,0 +1,209 @@
+"""
+Test the in-process pipeline cache
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append("..")
+
+import pytest
+
+from housing_regression.processing.pipeline_cache import PipelineCache
+
+
+@pytest.fixture
+def artifact():
+    temp_dir = tempfile.mkdtemp()
+    path = os.path.join(temp_dir, "pipe.pkl")
+    with open(path, "w") as f:
+        f.write("v1")
+    return path
+
+
+def read_artifact(path):
+    """Stands in for unpickling - returns content of the file"""
+    with open(path) as f:
+        return f.read()
+
+
+def test_hit_and_miss(artifact):
+    """Is the artifact loaded only on the first request?"""
+    cache = PipelineCache(loader=read_artifact)
+    first = cache.get("model", artifact)
+    second = cache.get("model", artifact)
+    stats = cache.stats()
+
+    assert first == second == "v1"
+    assert (stats["hits"], stats["misses"], stats["loads"]) == (1, 1, 1)
+    assert stats["load_time"] >= 0
+
+
+def test_reload_on_change(artifact):
+    """Is the artifact reloaded once it changes on disk?"""
+    cache = PipelineCache(loader=read_artifact)
+    cache.get("model", artifact)
+
+    with open(artifact, "w") as f:
+        f.write("v2 - bigger")
+
+    assert cache.get("model", artifact) == "v2 - bigger"
+    assert cache.stats()["loads"] == 2
+
+
+def test_concurrent_single_load(artifact):
+    """Do concurrent requests for a cold model trigger exactly one load?"""
+
+    def slow_loader(path):
+        time.sleep(0.1)
+        return read_artifact(path)
+
+    cache = PipelineCache(loader=slow_loader)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("model", artifact)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["v1"] * 8
+    assert cache.stats()["loads"] == 1
+
+
+def test_invalidate(artifact):
+    """Does invalidation force a reload?"""
+    cache = PipelineCache(loader=read_artifact)
+    cache.get("model", artifact)
+    cache.invalidate("model")
+    cache.get("model", artifact)
+
+    assert cache.stats()["loads"] == 2
+
+
+def test_background_reload(artifact):
+    """Is the loaded pipeline served until a changed artifact is loaded?"""
+    loading = threading.Event()
+    release = threading.Event()
+
+    def blocking_loader(path):
+        content = read_artifact(path)
+        if content != "v1":
+            loading.set()
+            release.wait(5)
+        return content
+
+    cache = PipelineCache(loader=blocking_loader, background_reload=True)
+    assert cache.get("model", artifact) == "v1"
+    with open(artifact, "w") as f:
+        f.write("v2 - bigger")
+
+    assert cache.get("model", artifact) == "v1"
+    assert loading.wait(5)
+    # requests neither wait nor start another load meanwhile
+    assert cache.get("model", artifact) == "v1"
+    thread = cache.preload("model", artifact)
+    release.set()
+    thread.join(5)
+
+    assert cache.get("model", artifact) == "v2 - bigger"
+    stats = cache.stats()
+    assert (stats["loads"], stats["stale"]) == (2, 2)
+
+
+def test_invalidate_during_background_reload(artifact):
+    """Is a pipeline loaded in the background discarded once invalidated?"""
+    loading = threading.Event()
+    release = threading.Event()
+
+    def blocking_loader(path):
+        content = read_artifact(path)
+        if content != "v1":
+            loading.set()
+            release.wait(5)
+        return content
+
+    cache = PipelineCache(loader=blocking_loader, background_reload=True)
+    cache.get("model", artifact)
+    with open(artifact, "w") as f:
+        f.write("v2 - bigger")
+    thread = cache.preload("model", artifact)
+    assert loading.wait(5)
+
+    cache.invalidate("model")
+    release.set()
+    thread.join(5)
+
+    assert cache.stats()["entries"] == []
+    assert (cache._reloads, cache._key_locks) == ({}, {})
+
+
+def test_failed_background_reload(artifact):
+    """Is the loaded pipeline kept when the changed artifact fails to load?"""
+
+    def failing_loader(path):
+        content = read_artifact(path)
+        if content == "broken":
+            raise ValueError(content)
+        return content
+
+    cache = PipelineCache(loader=failing_loader, background_reload=True)
+    cache.get("model", artifact)
+    with open(artifact, "w") as f:
+        f.write("broken")
+    cache.preload("model", artifact).join(5)
+
+    assert cache.get("model", artifact) == "v1"
+    assert cache.preload("model", artifact).is_alive() is False
+    assert cache.stats()["failed_loads"] == 1
+
+
+def test_preload(artifact):
+    """Is an artifact loaded ahead of the first request?"""
+    cache = PipelineCache(loader=read_artifact)
+    cache.preload("model", artifact).join(5)
+
+    assert cache.preload("model", artifact) is None
+    assert cache.get("model", artifact) == "v1"
+    assert cache.stats()["loads"] == 1
+
+
+def test_max_entries(artifact):
+    """Are the least recently used pipelines evicted, pinned ones kept?"""
+    paths = [artifact]
+    for version in ("v2", "v3"):
+        paths.append(os.path.join(os.path.dirname(artifact), version + ".pkl"))
+        with open(paths[-1], "w") as f:
+            f.write(version)
+    cache = PipelineCache(loader=read_artifact, max_entries=1)
+
+    cache.get("model", paths[0], pinned=True)
+    cache.get("model", paths[1])
+    cache.get("model", paths[2])
+    loaded = [entry["path"] for entry in cache.stats()["entries"]]
+
+    assert loaded == [paths[0], paths[2]]
+    assert cache.stats()["evicted"] == 1
+    assert cache.get("model", paths[1]) == "v2"
+    assert cache.stats()["loads"] == 4
+
+
+def test_remove(artifact):
+    """Are removed and deleted artifacts dropped from memory?"""
+    cache = PipelineCache(loader=read_artifact)
+    cache.get("model", artifact)
+
+    assert cache.remove("model", artifact)
+    assert not cache.remove("model", artifact)
+    assert cache.stats()["entries"] == []
+    assert cache._key_locks == {}
+
+    cache.get("model", artifact)
+    os.remove(artifact)
+    with pytest.raises(FileNotFoundError):
+        cache.get("model", artifact)
+    assert cache.stats()["entries"] == []
@@ -2,6 +2,8 @@
 Tests the prediction function
 """
 import json
+import os
+import shutil
 import sys
 
 sys.path.append("..")
@@ -9,8 +11,17 @@ sys.path.append("..")
 import pytest
 
 from housing_regression.models import MODELS
-from housing_regression.predict import predict
+from housing_regression.predict import (
+    available_versions,
+    has_version,
+    load_model,
+    model_path,
+    predict,
+    predict_batches,
+    unload_model,
+)
 from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.exceptions import UnknownVersionError
 
 TEST_DATA = "housing_regression/data/test.csv"
 MODEL_NAMES = MODELS.keys()
@@ -39,3 +50,62 @@ def test_multiple_predict(model_name):
     assert isinstance(scored["prediction"], list)
     assert len(scored["prediction"]) <= len(test_data)
     assert json.dumps(scored)
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_predict_batches(model_name):
+    """Does streamed scoring give the same predictions as predict()?"""
+    test_data = load_dataset(TEST_DATA).iloc[:50]
+    records = json.loads(test_data.to_json(orient="records"))
+    records[3] = None  # record that failed to parse
+    records[5]["GarageFinish"] = None  # fails validation
+
+    results = list(predict_batches(records, model_name, chunk_size=7))
+    expected = predict(json.dumps([records[0]]), model_name)["prediction"][0]
+
+    assert [result["row"] for result in results] == list(range(50))
+    assert "error" in results[3] and "error" in results[5]
+    assert results[0]["prediction"] == pytest.approx(expected)
+    assert json.dumps(results)
+
+    with pytest.raises(ValueError):
+        predict_batches(records, model_name, chunk_size=0)
+
+
+@pytest.fixture
+def versions_dir(tmp_path, monkeypatch):
+    """Two versions of every model, copies of the default pipeline"""
+    for model_name in MODEL_NAMES:
+        conf = MODELS[model_name]["config"]
+        monkeypatch.setattr(conf, "VERSIONS_DIR", str(tmp_path / model_name) + "/")
+        os.makedirs(conf.VERSIONS_DIR)
+        for version in ("1.0.0", "1.1.0"):
+            shutil.copy(conf.PATH, model_path(model_name, version))
+    return tmp_path
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_versions(model_name, versions_dir):
+    """Are persisted versions served side by side with the default one?"""
+    test_data = load_dataset(TEST_DATA).iloc[:5].to_json(orient="records")
+    assert available_versions(model_name) == ["1.0.0", "1.1.0"]
+
+    default = predict(test_data, model_name)
+    scored = predict(test_data, model_name, version="1.1.0")
+    assert scored["version"] == "1.1.0"
+    assert scored["prediction"] == pytest.approx(default["prediction"])
+    assert load_model(model_name, "1.0.0") is not load_model(model_name, "1.1.0")
+
+    for version in ("2.0.0", "../1.0.0"):
+        with pytest.raises(UnknownVersionError):
+            predict(test_data, model_name, version=version)
+    assert has_version(model_name, "1.0.0")
+    assert not has_version(model_name, "2.0.0")
+    assert not has_version(model_name, "../1.0.0")
+
+    assert unload_model(model_name, "1.0.0")
+    assert not unload_model(model_name, "1.0.0")
+    os.remove(model_path(model_name, "1.1.0"))
+    with pytest.raises(UnknownVersionError):
+        predict(test_data, model_name, version="1.1.0")
+    assert not unload_model(model_name, "1.1.0")
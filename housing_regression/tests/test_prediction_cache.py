@@ -0,0 +1,136 @@
+"""
+Test the cache of predictions
+"""
+import json
+import sys
+
+sys.path.append("..")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_regression.models import MODELS
+from housing_regression.predict import predict
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.prediction_cache import (
+    PREDICTION_CACHE,
+    PredictionCache,
+)
+
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+class CountingModel:
+    """Predicts the sum of the numeric columns, counts the scored rows"""
+
+    def __init__(self):
+        self.scored = 0
+
+    def predict(self, features):
+        self.scored += len(features)
+        return features.select_dtypes("number").sum(axis=1).to_numpy()
+
+
+@pytest.fixture
+def features():
+    return pd.DataFrame({"num": [1.0, 2.0, np.nan, 1.0], "cat": ["a", "b", None, "a"]})
+
+
+@pytest.fixture
+def shared_cache():
+    PREDICTION_CACHE.configure(10_000)
+    PREDICTION_CACHE.invalidate()
+    yield PREDICTION_CACHE
+    PREDICTION_CACHE.configure(0)
+    PREDICTION_CACHE.invalidate()
+
+
+def test_only_misses_scored(features):
+    """Are cached rows of a batch served without scoring them again?"""
+    cache = PredictionCache(max_entries=100)
+    model = CountingModel()
+    first = cache.predict("model", model, features)
+    assert model.scored == 4
+
+    batch = pd.concat([features, features.assign(num=[5.0, 6.0, 7.0, 8.0])])
+    second = cache.predict("model", model, batch)
+    assert model.scored == 8
+    np.testing.assert_array_equal(second[:4], first)
+    np.testing.assert_array_equal(second[4:], [5.0, 6.0, 7.0, 8.0])
+    stats = cache.stats()
+    assert stats["hits"] == 4
+    assert stats["misses"] == 8
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+
+def test_canonical_keys(features):
+    """Are equal values keyed equally regardless of their representation?"""
+    other = pd.DataFrame(
+        {
+            "num": pd.Series([1, 2, None, 1], dtype="float32"),
+            "cat": ["a", "b", np.nan, "a"],
+        }
+    )
+    assert PredictionCache.keys("model", features) == PredictionCache.keys(
+        "model", other
+    )
+    zeros = pd.DataFrame({"num": [0.0, -0.0]})
+    keys = PredictionCache.keys("model", zeros)
+    assert keys[0] == keys[1]
+    assert keys[0] != PredictionCache.keys("other", zeros)[0]
+
+
+def test_bounded(features):
+    """Are least recently used entries evicted above the maximum?"""
+    cache = PredictionCache(max_entries=2)
+    model = CountingModel()
+    cache.predict("model", model, features)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["evicted"] == 1
+    # the last two rows are the most recently used
+    cache.predict("model", model, features.iloc[2:])
+    assert model.scored == 4
+
+
+def test_ttl(features):
+    """Do entries expire?"""
+    cache = PredictionCache(max_entries=100, ttl=0)
+    model = CountingModel()
+    cache.predict("model", model, features)
+    cache.predict("model", model, features)
+    assert model.scored == 8
+    assert cache.stats()["expired"] == 3
+
+
+def test_reload_invalidates(features):
+    """Are predictions dropped once another pipeline scores the model?"""
+    cache = PredictionCache(max_entries=100)
+    model = CountingModel()
+    cache.predict("model", model, features)
+    cache.predict("other", model, features)
+    reloaded = CountingModel()
+    cache.predict("model", reloaded, features)
+    assert reloaded.scored == 4
+    assert cache.stats()["invalidated"] == 3
+    # predictions of the other model are kept
+    cache.predict("other", model, features)
+    assert model.scored == 8
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_predict_cached(model_name, shared_cache):
+    """Are cached predictions those of the model?"""
+    conf = MODELS[model_name]["config"]
+    test_data = load_dataset(TEST_DATA)[conf.FEATURES]
+    input_data = json.loads(test_data.to_json(orient="records"))
+
+    expected = predict(input_data, model_name)["prediction"]
+    assert shared_cache.stats()["hits"] == 0
+    result = predict(input_data, model_name)
+    assert result["prediction"] == pytest.approx(expected)
+    assert shared_cache.stats()["hits"] == len(expected)
+
+    compiled = predict(input_data, model_name, compiled=True)["prediction"]
+    assert compiled == pytest.approx(expected)
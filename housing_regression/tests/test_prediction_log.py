@@ -0,0 +1,125 @@
+"""
+Test structured and async logging of predictions
+"""
+import json
+import logging
+import sys
+import threading
+
+sys.path.append("..")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_regression import __version__
+from housing_regression.config.logging_config import (
+    AsyncQueueHandler,
+    disable_async_logging,
+    enable_async_logging,
+)
+from housing_regression.models import MODELS
+from housing_regression.predict import predict
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.prediction_log import LazyJSON, PredictionLog
+
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+class ListHandler(logging.Handler):
+    """Keeps the records and the threads they were formatted on"""
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = []
+
+    def emit(self, record):
+        self.format(record)
+        self.records.append(record)
+        self.threads.append(threading.current_thread())
+
+
+@pytest.fixture
+def handler():
+    logger = logging.getLogger("housing_regression.processing.prediction_log")
+    handler = ListHandler()
+    logger.addHandler(handler)
+    yield handler
+    logger.removeHandler(handler)
+
+
+@pytest.fixture
+def features():
+    return pd.DataFrame({"num": [1.0, 2.0, 3.0], "cat": ["a", "b", "c"]})
+
+
+def test_record(handler, features):
+    """Is a compact record logged, sampled inputs included?"""
+    log = PredictionLog(sample_rate=1, sample_rows=2)
+    log.log("model", features, np.array([10.0, 20.0, 30.0]), seconds=0.5, rejected=1)
+    (record,) = handler.records
+    assert record.prediction == {
+        "model": "model",
+        "version": __version__,
+        "rows": 3,
+        "rejected": 1,
+        "seconds": 0.5,
+        "sample": {
+            "inputs": [{"num": 1.0, "cat": "a"}, {"num": 2.0, "cat": "b"}],
+            "predictions": [10.0, 20.0],
+        },
+    }
+    assert json.loads(record.getMessage().split(" ", 2)[2]) == record.prediction
+
+    PredictionLog(sample_rate=0).log("model", features, np.zeros(3), seconds=0.5)
+    assert "sample" not in handler.records[-1].prediction
+
+
+def test_disabled_level(handler, features, monkeypatch):
+    """Is nothing built or rendered while the level is disabled?"""
+    monkeypatch.setattr(
+        LazyJSON, "__str__", lambda self: pytest.fail("rendered the record")
+    )
+    log = PredictionLog(sample_rate=1, level=logging.DEBUG)
+    log.log("model", features, np.zeros(3), seconds=0.5)
+    assert handler.records == []
+
+
+def test_async_logging(features):
+    """Are records formatted and written off the calling thread, in order?"""
+    logger = logging.getLogger("test_async_logging")
+    logger.setLevel(logging.INFO)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    try:
+        enable_async_logging(logger.name)
+        enable_async_logging(logger.name)
+        assert [type(h) for h in logger.handlers] == [AsyncQueueHandler]
+        for i in range(100):
+            logger.info("record %d", i)
+        disable_async_logging(logger.name)
+        assert logger.handlers == [handler]
+    finally:
+        disable_async_logging(logger.name)
+        logger.removeHandler(handler)
+
+    assert [record.getMessage() for record in handler.records] == [
+        f"record {i}" for i in range(100)
+    ]
+    assert threading.current_thread() not in handler.threads
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_predict_logged(model_name, handler):
+    """Is a single compact record logged per request?"""
+    conf = MODELS[model_name]["config"]
+    test_data = load_dataset(TEST_DATA)[conf.FEATURES]
+    input_data = json.loads(test_data.to_json(orient="records"))
+
+    result = predict(input_data, model_name)
+    (record,) = handler.records
+    assert record.prediction["rows"] == len(result["prediction"])
+    assert record.prediction["rejected"] == len(result["rejected"])
+    assert len(record.getMessage()) < 1000
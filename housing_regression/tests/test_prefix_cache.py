@@ -0,0 +1,86 @@
+"""
+Test the on-disk cache of fitted pipeline prefixes
+"""
+import os
+import sys
+import tempfile
+
+sys.path.append("..")
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+from sklearn.linear_model import Ridge
+
+import housing_regression.config.global_config as global_conf
+from housing_regression.models import MODELS
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.prefix_cache import PrefixCache
+
+TRAIN_DATA = "housing_regression/data/train.csv"
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+@pytest.fixture
+def data():
+    conf = MODELS["DevModel"]["config"]
+    train = load_dataset(TRAIN_DATA)
+    test = load_dataset(TEST_DATA)[conf.FEATURES]
+    return train[conf.FEATURES], train[global_conf.LABEL], test
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_prefix_cache_reuses_prefix(model_name, data):
+    """Is the preprocessing reused when only the final estimator changes?"""
+    X, y, test = data
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PrefixCache(directory)
+        first = cache.fit(clone(MODELS[model_name]["pipeline"]), X, y)
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        second = clone(MODELS[model_name]["pipeline"])
+        second.steps[-1] = (second.steps[-1][0], Ridge(alpha=1.0))
+        cache.fit(second, X, y)
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        expected = clone(second).fit(X, y)
+        np.testing.assert_allclose(second.predict(test), expected.predict(test))
+        np.testing.assert_allclose(
+            first.predict(test), MODELS[model_name]["pipeline"].fit(X, y).predict(test)
+        )
+
+
+def test_prefix_cache_keys(data):
+    """Do other data or step parameters miss the cache?"""
+    X, y, _ = data
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PrefixCache(directory)
+        cache.fit(clone(MODELS["DevModel"]["pipeline"]), X, y)
+        cache.fit(clone(MODELS["DevModel"]["pipeline"]), X.iloc[1:], y.iloc[1:])
+        assert cache.hits == 0
+
+        pipeline = clone(MODELS["DevModel"]["pipeline"])
+        pipeline.set_params(RareEncoder__tol=0.01)
+        # steps before the rare label encoder are still reused
+        cache.fit(pipeline, X, y)
+        assert cache.hits == 1
+        assert pipeline["RareEncoder"].tol == 0.01
+
+
+def test_prefix_cache_eviction(data):
+    """Is the cache kept under its size limit, least recently used first?"""
+    X, y, _ = data
+    with tempfile.TemporaryDirectory() as directory:
+        cache = PrefixCache(directory)
+        cache.fit(clone(MODELS["DevModel"]["pipeline"]), X, y)
+        entries = sorted(os.listdir(directory))
+        size = cache.size()
+
+        cache.max_bytes = size // 2
+        cache.evict()
+        assert 0 < cache.size() <= size // 2
+        assert len(os.listdir(directory)) < len(entries)
+
+        cache.clear()
+        assert cache.size() == 0
@@ -0,0 +1,67 @@
+"""
+Tests profiling of pipeline steps
+"""
+import pickle
+import sys
+
+sys.path.append("..")
+
+import numpy as np
+import pytest
+from sklearn.base import clone
+
+import housing_regression.config.global_config as global_conf
+from housing_regression.models import MODELS
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.profiling import PipelineProfiler
+
+TRAIN_DATA = "housing_regression/data/train.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+@pytest.fixture(scope="module")
+def train_data():
+    return load_dataset(TRAIN_DATA)
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_step_measurements(model_name, train_data):
+    """Is every step measured once per call, with rows in and out?"""
+    conf = MODELS[model_name]["config"]
+    pipeline = clone(MODELS[model_name]["pipeline"])
+    profiler = PipelineProfiler(enabled=True, trace_memory=True)
+    X, y = train_data[conf.FEATURES], train_data[global_conf.LABEL]
+
+    with profiler.profiled(pipeline, model_name):
+        pipeline.fit(X, y)
+        expected = pipeline.predict(X)
+        profiler.disable()
+        pipeline.predict(X)
+    report = {(entry["step"], entry["method"]): entry for entry in profiler.report()}
+
+    *transformers, (estimator, _) = pipeline.steps
+    for step, _ in transformers:
+        assert report[(step, "fit_transform")]["calls"] == 1
+        assert report[(step, "transform")]["calls"] == 1
+        assert report[(step, "transform")]["rows_in"] == len(X)
+        assert (step, "fit") not in report
+    assert report[(estimator, "fit")]["calls"] == 1
+    assert report[(estimator, "predict")]["rows_out"] == len(X)
+    assert any(entry["allocated_bytes"] > 0 for entry in report.values())
+    # uninstrumented pipelines work as before and can be persisted
+    np.testing.assert_array_equal(
+        pickle.loads(pickle.dumps(pipeline)).predict(X), expected
+    )
+
+
+def test_disabled(train_data):
+    """Is nothing recorded while disabled?"""
+    conf = MODELS["DevModel"]["config"]
+    pipeline = clone(MODELS["DevModel"]["pipeline"])
+    profiler = PipelineProfiler()
+
+    profiler.instrument(pipeline, "DevModel")
+    profiler.instrument(pipeline, "DevModel")
+    pipeline.fit(train_data[conf.FEATURES], train_data[global_conf.LABEL])
+
+    assert profiler.report() == []
@@ -0,0 +1,68 @@
+"""
+Test bulk scoring of datasets
+"""
+import os
+import sys
+import tempfile
+
+sys.path.append("..")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_regression.models import MODELS
+from housing_regression.predict import predict
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.score import score_dataset
+
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+@pytest.mark.parametrize("n_workers", [0, 2])
+def test_score_dataset(model_name, n_workers):
+    """Are all rows scored, in order, with the same result as predict()?"""
+    output_path = os.path.join(tempfile.mkdtemp(), "scored.csv")
+    report = score_dataset(
+        TEST_DATA,
+        output_path,
+        model_name,
+        chunk_size=100,
+        n_workers=n_workers,
+        id_column="Id",
+    )
+    test_data = load_dataset(TEST_DATA)
+    scored = pd.read_csv(output_path)
+    valid = scored["prediction"].notnull()
+    expected = predict(test_data.to_json(orient="records"), model_name)
+
+    assert report["rows"] == len(test_data)
+    assert report["rows_per_second"] > 0
+    assert list(scored["Id"]) == list(test_data["Id"])
+    np.testing.assert_allclose(scored.loc[valid, "prediction"], expected["prediction"])
+
+
+def test_score_parquet_without_pyarrow(monkeypatch):
+    """Does scoring to parquet fail up front when pyarrow is missing?"""
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    monkeypatch.setitem(sys.modules, "pyarrow.parquet", None)
+    output_path = os.path.join(tempfile.mkdtemp(), "scored.parquet")
+
+    with pytest.raises(ImportError, match="pyarrow"):
+        score_dataset(TEST_DATA, output_path, "DevModel", n_workers=0)
+    assert not os.path.exists(output_path)
+
+
+def test_score_parquet():
+    """Are parquet input and output read and written?"""
+    pytest.importorskip("pyarrow")
+    directory = tempfile.mkdtemp()
+    input_path = os.path.join(directory, "test.parquet")
+    output_path = os.path.join(directory, "scored.parquet")
+    load_dataset(TEST_DATA).to_parquet(input_path)
+
+    report = score_dataset(input_path, output_path, "DevModel", n_workers=0)
+
+    assert len(pd.read_parquet(output_path)) == report["rows"]
@@ -0,0 +1,232 @@
+"""
+Test out-of-core fitting of pipelines
+"""
+import sys
+
+sys.path.append("..")
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LinearRegression, SGDRegressor
+from sklearn.pipeline import Pipeline
+
+import housing_regression.config.global_config as global_conf
+from housing_regression.models import MODELS
+from housing_regression.processing import transformers as tran
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.exceptions import UnsupportedPipelineError
+from housing_regression.processing.statistics import CoMoments, Mean, ValueCounts
+from housing_regression.processing.streaming import fit_streaming
+
+TRAIN_DATA = "housing_regression/data/train.csv"
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+def chunked(X, y, chunk_size):
+    def chunks():
+        for start in range(0, len(X), chunk_size):
+            yield X.iloc[start : start + chunk_size], y.iloc[start : start + chunk_size]
+
+    return chunks
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+@pytest.mark.parametrize("chunk_size", [97, 100000])
+def test_fit_streaming_matches_fit(model_name, chunk_size):
+    """Does fitting in chunks give the same predictions as fitting at once?"""
+    conf = MODELS[model_name]["config"]
+    data = load_dataset(TRAIN_DATA)
+    X, y = data[conf.FEATURES], data[global_conf.LABEL]
+    test = load_dataset(TEST_DATA)[conf.FEATURES]
+
+    expected = clone(MODELS[model_name]["pipeline"]).fit(X, y)
+    pipeline = fit_streaming(
+        clone(MODELS[model_name]["pipeline"]), chunked(X, y, chunk_size)
+    )
+
+    np.testing.assert_allclose(
+        pipeline.predict(test), expected.predict(test), rtol=1e-6, atol=1e-6
+    )
+
+
+def counted(chunks):
+    """chunks counting the passes over the data in passes[0]"""
+    passes = [0]
+
+    def counting_chunks():
+        passes[0] += 1
+        return chunks()
+
+    return counting_chunks, passes
+
+
+def test_fit_streaming_passes():
+    """Are the encoders fitted in the pass of the imputer?"""
+    conf = MODELS["DevModel"]["config"]
+    data = load_dataset(TRAIN_DATA)
+    X, y = data[conf.FEATURES], data[global_conf.LABEL]
+    chunks, passes = counted(chunked(X, y, 97))
+    fit_streaming(clone(MODELS["DevModel"]["pipeline"]), chunks)
+
+    assert passes[0] == 2
+
+
+def test_fit_streaming_passes_not_mapped():
+    """Does a step changing counted values on the way get its own pass?"""
+    X = pd.DataFrame({"a": list("aAbBc") * 40, "b": np.arange(200.0)})
+    y = pd.Series(np.arange(200.0))
+    pipeline = Pipeline(
+        [
+            ("RareEncoder", tran.RareLabelEncoder(["a"], tol=0.1)),
+            ("Lower", tran.UnivariateTransformer(["a"], func=lambda a: a.str.lower())),
+            ("OneHotEncoder", tran.OneHotEncoderDF(["a"])),
+            ("LinearModel", LinearRegression()),
+        ]
+    )
+    expected = clone(pipeline).fit(X, y)
+    chunks, passes = counted(chunked(X, y, 30))
+    fit_streaming(pipeline, chunks)
+
+    assert passes[0] == 3
+    assert pipeline["OneHotEncoder"].dtypes_ == expected["OneHotEncoder"].dtypes_
+    np.testing.assert_allclose(
+        pipeline.predict(X), expected.predict(X), rtol=1e-6, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_fit_streaming_missing_integers(model_name, tmp_path):
+    """Are integer columns with NaN in some chunks imputed as in memory?"""
+    conf = MODELS[model_name]["config"]
+    data = load_dataset(TRAIN_DATA)
+    int_vars = [var for var in conf.FEATURES if data[var].dtype.kind == "i"]
+    # the first chunk read back keeps integer dtypes, later ones become float
+    data.loc[data.index[150::97], int_vars] = np.nan
+    data.astype({var: "Int64" for var in int_vars}).to_csv(
+        tmp_path / "train.csv", index=False
+    )
+    X, y = data[conf.FEATURES], data[global_conf.LABEL]
+
+    def chunks():
+        for chunk in pd.read_csv(tmp_path / "train.csv", chunksize=100):
+            yield chunk[conf.FEATURES], chunk[global_conf.LABEL]
+
+    expected = clone(MODELS[model_name]["pipeline"]).fit(X, y)
+    pipeline = fit_streaming(clone(MODELS[model_name]["pipeline"]), chunks)
+
+    assert int_vars
+    np.testing.assert_allclose(
+        pipeline.predict(X), expected.predict(X), rtol=1e-6, atol=1e-6
+    )
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_fit_streaming_parallel(model_name):
+    """Do statistics merged from worker processes give the same fit?"""
+    conf = MODELS[model_name]["config"]
+    data = load_dataset(TRAIN_DATA)
+    X, y = data[conf.FEATURES], data[global_conf.LABEL]
+    test = load_dataset(TEST_DATA)[conf.FEATURES]
+
+    expected = fit_streaming(clone(MODELS[model_name]["pipeline"]), chunked(X, y, 97))
+    pipeline = fit_streaming(
+        clone(MODELS[model_name]["pipeline"]), chunked(X, y, 97), n_jobs=2
+    )
+
+    np.testing.assert_allclose(
+        pipeline.predict(test), expected.predict(test), rtol=1e-9
+    )
+
+
+def test_rare_label_encoder_partial_fit_and_merge():
+    """Do partial fits and merged encoders find the same labels as fit?"""
+    variables = MODELS["DevModel"]["config"].CATEGORICAL_VARS
+    X = load_dataset(TRAIN_DATA)[variables]
+    expected = tran.RareLabelEncoder(variables, tol=0.02).fit(X)
+
+    incremental = tran.RareLabelEncoder(variables, tol=0.02)
+    for start in range(0, len(X), 100):
+        incremental.partial_fit(X.iloc[start : start + 100])
+    merged = tran.RareLabelEncoder(variables, tol=0.02).fit(X.iloc[:500])
+    merged.merge(tran.RareLabelEncoder(variables, tol=0.02).fit(X.iloc[500:]))
+
+    for encoder in (incremental, merged):
+        assert encoder.frequent_labels_ == expected.frequent_labels_
+        assert encoder.dtypes_ == expected.dtypes_
+
+
+def test_fit_streaming_categorical_one_hot():
+    """Are categories found in chunks the same as those found at once?"""
+    # a single one hot encoded variable without intercept has full rank
+    variables = MODELS["DevModel"]["config"].CATEGORICAL_VARS[:1]
+    data = load_dataset(TRAIN_DATA).dropna(subset=variables)
+    X, y = data[variables], data[global_conf.LABEL]
+    pipeline = Pipeline(
+        [
+            (
+                "RareEncoder",
+                tran.RareLabelEncoder(variables, tol=0.01, as_category=True),
+            ),
+            ("OneHotEncoder", tran.OneHotEncoderDF(variables)),
+            ("LinearModel", LinearRegression(fit_intercept=False)),
+        ]
+    )
+    expected = clone(pipeline).fit(X, y)
+    fit_streaming(pipeline, chunked(X, y, 50))
+
+    assert pipeline["RareEncoder"].dtypes_ == expected["RareEncoder"].dtypes_
+    assert pipeline["OneHotEncoder"].dtypes_ == expected["OneHotEncoder"].dtypes_
+    np.testing.assert_allclose(pipeline.predict(X), expected.predict(X), rtol=1e-6)
+
+
+def test_fit_streaming_partial_fit():
+    """Are estimators with partial_fit fed chunk by chunk?"""
+    X = pd.DataFrame({"a": np.arange(100.0)})
+    y = pd.Series(np.arange(100.0))
+    pipeline = Pipeline([("model", SGDRegressor())])
+    fit_streaming(pipeline, chunked(X, y, 10))
+
+    assert pipeline["model"].t_ == 101
+
+
+def test_fit_streaming_unsupported_step():
+    """Are steps that cannot be fitted in chunks refused?"""
+    X = pd.DataFrame({"a": np.arange(10.0)})
+    y = pd.Series(np.arange(10.0))
+    imputer = ColumnTransformer(
+        [("median", SimpleImputer(strategy="median"), ["a"])], remainder="passthrough"
+    )
+    pipeline = Pipeline([("Imputer", imputer), ("model", LinearRegression())])
+    with pytest.raises(UnsupportedPipelineError):
+        fit_streaming(pipeline, chunked(X, y, 5))
+
+
+def test_statistics_merge():
+    """Do merged statistics equal statistics of all of the data?"""
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(1e6, 1, size=(1000, 3))
+    labels = pd.Series(rng.choice(["a", "b", None], size=1000))
+    halves = [slice(0, 300), slice(300, None)]
+
+    moments = [CoMoments().update(matrix[part]) for part in halves]
+    merged = moments[0].merge(moments[1])
+    centred = matrix - matrix.mean(axis=0)
+    np.testing.assert_allclose(merged.mean, matrix.mean(axis=0))
+    np.testing.assert_allclose(merged.comoments, centred.T @ centred, rtol=1e-8)
+
+    counts = [ValueCounts().update(labels[part]) for part in halves]
+    merged = counts[0].merge(counts[1])
+    assert merged.counts == labels.value_counts().to_dict()
+    assert merged.n_rows == 1000
+    assert merged.most_frequent() == labels.mode()[0]
+    weighted = ValueCounts().update(pd.Series(["a", "b", None]), np.array([2, 3, 4]))
+    assert weighted.counts == {"a": 2, "b": 3}
+    assert weighted.n_rows == 9
+
+    means = [Mean().update(pd.Series(matrix[part, 0])) for part in halves]
+    assert means[0].merge(means[1]).value == pytest.approx(matrix[:, 0].mean())
@@ -3,6 +3,7 @@ Test the train function
 """
 import sys
 import tempfile
+import tracemalloc
 
 sys.path.append("..")
 
@@ -11,6 +12,7 @@ from sklearn.pipeline import Pipeline
 
 from housing_regression.models import MODELS
 from housing_regression.processing.data_management import load_pipeline
+from housing_regression.processing.profiling import PROFILER
 from housing_regression.train import train_pipeline
 
 TRAIN_DATA = "housing_regression/data/train.csv"
@@ -27,3 +29,13 @@ def test_train_pipeline(model_name):
     pipeline = load_pipeline(temp_path)
 
     assert isinstance(pipeline, Pipeline)
+
+
+def test_train_pipeline_profile(tmp_path):
+    """Is the profiler switched off again once the pipeline is trained?"""
+    tracing = tracemalloc.is_tracing()
+    train_pipeline(TRAIN_DATA, "DevModel", str(tmp_path / "pipe.pkl"), profile=True)
+
+    assert not PROFILER.enabled
+    assert PROFILER.report() == []
+    assert tracemalloc.is_tracing() == tracing
@@ -12,7 +12,8 @@ sys.path.append("..")
 import numpy as np
 import pandas as pd
 import pytest
-from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import StandardScaler
 
@@ -61,6 +62,8 @@ class TestGeneralProperties:
         tran.BivariateTransformer(variables=["num1"], reference_var="num2", func=diff),
         tran.FeatureDropper(vars_to_drop=["num1", "num2"]),
         tran.RareLabelEncoder(variables=["cat"]),
+        tran.RareLabelEncoder(variables=["cat"], as_category=True),
+        tran.OneHotEncoderDF(variables=["cat"]),
     ]
 
     @pytest.mark.parametrize("transformer", TRANSFORMERS)
@@ -108,6 +111,49 @@ class TestGeneralProperties:
         assert before_pkl.equals(after_pkl)
 
 
+class TestInplace:
+    """Test the copy=False mode of transformers able to work in place"""
+
+    TRANSFORMERS = [
+        tran.UnivariateTransformer(variables=["num2"], func=np.log),
+        tran.BivariateTransformer(variables=["num1"], reference_var="num2", func=diff),
+        tran.FeatureDropper(vars_to_drop=["num1"]),
+        tran.RareLabelEncoder(variables=["cat"]),
+    ]
+
+    @pytest.mark.parametrize("transformer", TRANSFORMERS)
+    def test_copy(self, transformer, data):
+        """Is the input left untouched by default?"""
+        original = data.copy()
+        transformer.fit_transform(data)
+
+        assert data.equals(original)
+
+    @pytest.mark.parametrize("transformer", TRANSFORMERS)
+    def test_inplace(self, transformer, data):
+        """Is the same result produced in place without copy?"""
+        expected = transformer.fit_transform(data)
+        owned = data.copy()
+        inplace = clone(transformer).set_params(copy=False)
+        transformed = inplace.fit_transform(owned)
+
+        assert transformed is owned
+        assert transformed.equals(expected)
+
+    def test_make_inplace(self):
+        """Does only the first step of the pipeline keep copying?"""
+        pipe = tran.make_inplace(
+            Pipeline(
+                [
+                    (f"step{i}", clone(transformer))
+                    for i, transformer in enumerate(self.TRANSFORMERS)
+                ]
+            )
+        )
+
+        assert [step.copy for _, step in pipe.steps] == [True, False, False, False]
+
+
 class TestColumnTransformerDF:
     """Tests specific to tran.ColumnTransformerDF"""
 
@@ -125,6 +171,30 @@ class TestColumnTransformerDF:
         assert data.dtypes.equals(transformed.dtypes)
         assert data.shape == transformed.shape
 
+    def test_reconstruction_mixed(self):
+        """Are dtypes preserved when several transformers output mixed data?"""
+        data = pd.DataFrame(
+            {
+                "int": [1, 2, 3],
+                "cat": ["a", np.nan, "a"],
+                "category": pd.Categorical(["x", "y", "x"]),
+                "num": [1.0, np.nan, 3.0],
+            }
+        )
+        transformer = tran.ColumnTransformerDF(
+            [
+                ("cat", SimpleImputer(strategy="most_frequent"), ["cat"]),
+                ("num", SimpleImputer(), ["num", "int"]),
+            ],
+            remainder="passthrough",
+        )
+        transformed = transformer.fit_transform(data)
+
+        assert list(data.columns) == list(transformed.columns)
+        assert data.dtypes.equals(transformed.dtypes)
+        assert list(transformed["cat"]) == ["a", "a", "a"]
+        assert list(transformed["num"]) == [1.0, 2.0, 3.0]
+
 
 class TestUnivariateTransformer:
     """Test specific to tran.UnivariateTransformer"""
@@ -203,3 +273,90 @@ class TestRareLabelEncoder:
         transformed = transformer.fit_transform(data)
 
         assert set(transformed["cat"].unique()) == {"a", "b", "c", "rare"}
+
+    def test_encode_as_category(self, data):
+        """Does the categorical mode encode the same labels as the default one?"""
+        transformer = tran.RareLabelEncoder(variables=["cat"], as_category=True)
+        transformed = transformer.fit_transform(data)
+        expected = tran.RareLabelEncoder(variables=["cat"]).fit_transform(data)
+
+        assert isinstance(transformed["cat"].dtype, pd.CategoricalDtype)
+        assert list(transformed["cat"].astype(str)) == list(expected["cat"])
+
+    def test_unseen_as_category(self, data):
+        """Are unseen and missing labels encoded as 'rare' in categorical mode?"""
+        transformer = tran.RareLabelEncoder(variables=["cat"], as_category=True)
+        transformer.fit(data)
+        unseen = pd.DataFrame({"cat": ["a", "unseen", np.nan]})
+
+        assert list(transformer.transform(unseen)["cat"]) == ["a", "rare", "rare"]
+
+    def test_load_older_version(self, transformer, data):
+        """Can an encoder persisted before as_category was added be loaded?"""
+        state = transformer.fit(data).__getstate__()
+        del state["as_category"]
+        loaded = tran.RareLabelEncoder.__new__(tran.RareLabelEncoder)
+        loaded.__setstate__(state)
+
+        assert loaded.as_category is False
+        assert loaded.transform(data).equals(transformer.transform(data))
+
+
+class TestOneHotEncoderDF:
+    """Tests specific to tran.OneHotEncoderDF"""
+
+    def test_encode(self, data):
+        """Are the indicators placed first, one per category?"""
+        transformed = tran.OneHotEncoderDF(variables=["cat"]).fit_transform(data)
+
+        assert list(transformed.columns) == ["cat_a", "cat_b", "cat_c", "cat_d"] + [
+            "num1",
+            "num2",
+        ]
+        assert (transformed.filter(like="cat_").sum(axis=1) == 1).all()
+
+    def test_encode_codes(self, data):
+        """Does encoding from categorical codes match encoding of labels?"""
+        rare = tran.RareLabelEncoder(variables=["cat"], as_category=True)
+        categorical = rare.fit_transform(data)
+        encoder = tran.OneHotEncoderDF(variables=["cat"]).fit(categorical)
+        from_codes = encoder.transform(categorical)
+        from_labels = encoder.transform(categorical.astype({"cat": object}))
+
+        assert from_codes.equals(from_labels)
+        assert set(from_codes.filter(like="cat_").columns) == {
+            "cat_a",
+            "cat_b",
+            "cat_c",
+            "cat_rare",
+        }
+
+    def test_unseen(self, data):
+        """Are unseen categories encoded as all zeros?"""
+        encoder = tran.OneHotEncoderDF(variables=["cat"]).fit(data)
+        unseen = data.iloc[:2].assign(cat=["a", "unseen"])
+        transformed = encoder.transform(unseen)
+
+        assert list(transformed.filter(like="cat_").sum(axis=1)) == [1, 0]
+
+    def test_sparse(self, data):
+        """Is the sparse output the dense one in CSR format?"""
+        dense = tran.OneHotEncoderDF(variables=["cat"]).fit(data)
+        encoder = tran.OneHotEncoderDF(variables=["cat"], sparse=True).fit(data)
+        unseen = data.assign(cat=["unseen"] + list(data["cat"].iloc[1:]))
+        transformed = encoder.transform(unseen)
+        expected = dense.transform(unseen)
+
+        assert transformed.format == "csr"
+        np.testing.assert_array_equal(transformed.toarray(), expected.to_numpy())
+        assert list(encoder.get_feature_names_out()) == list(expected.columns)
+
+    def test_load_without_sparse(self, data):
+        """Can an encoder persisted before sparse was added be loaded?"""
+        encoder = tran.OneHotEncoderDF(variables=["cat"]).fit(data)
+        state = encoder.__getstate__()
+        del state["sparse"]
+        loaded = tran.OneHotEncoderDF.__new__(tran.OneHotEncoderDF)
+        loaded.__setstate__(state)
+
+        assert loaded.transform(data).equals(encoder.transform(data))
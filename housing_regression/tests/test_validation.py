@@ -0,0 +1,150 @@
+"""
+Test validation of input data
+"""
+import json
+import sys
+
+sys.path.append("..")
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from housing_regression.models import MODELS
+from housing_regression.predict import predict, predict_batches
+from housing_regression.processing.data_management import load_dataset
+from housing_regression.processing.validation import (
+    Validator,
+    get_validator,
+    validate_inputs,
+)
+
+TEST_DATA = "housing_regression/data/test.csv"
+MODEL_NAMES = MODELS.keys()
+
+
+@pytest.fixture
+def validator():
+    return Validator(
+        features=["num", "cat"],
+        categorical=["cat"],
+        nan_not_allowed=["cat"],
+        ranges={"num": (0, 10)},
+        allowed_categories={"cat": ["a", "b"]},
+    )
+
+
+def test_check(validator):
+    """Is every rule applied and every failure reported per row?"""
+    data = pd.DataFrame(
+        {
+            "num": [1.0, -1.0, np.inf, np.nan, 11.0],
+            "cat": ["a", None, "b", "c", "b"],
+        }
+    )
+    result = validator.check(data)
+
+    assert list(result.mask) == [True, False, False, False, False]
+    assert list(result.rejected) == [1, 2, 3, 4]
+    assert result.reasons == {
+        1: ["cat: missing", "num: below 0"],
+        2: ["num: not a finite number", "num: above 10"],
+        3: ["cat: unknown category"],
+        4: ["num: above 10"],
+    }
+
+
+def test_check_object_numbers(validator):
+    """Are numbers given as text accepted and other text rejected?"""
+    data = pd.DataFrame({"num": ["1", "x", None], "cat": ["a", "a", "b"]})
+    result = validator.check(data)
+
+    assert list(result.mask) == [True, False, True]
+    assert result.reasons == {1: ["num: not a finite number"]}
+
+
+def test_filter_without_copy(validator):
+    """Are valid data returned as they are?"""
+    data = pd.DataFrame({"num": [1.0, 2.0], "cat": ["a", "b"]})
+
+    assert validator.filter(data) is data
+    assert len(validator.filter(data.assign(num=[1.0, 20.0]))) == 1
+
+
+@pytest.mark.parametrize("model_name", MODEL_NAMES)
+def test_model_rules(model_name):
+    """Do the rules of the model config reject what they should?"""
+    conf = MODELS[model_name]["config"]
+    data = load_dataset(TEST_DATA)[conf.FEATURES]
+    result = get_validator(model_name).check(data)
+
+    expected = data[conf.NAN_NOT_ALLOWED].notna().all(axis=1).to_numpy()
+    np.testing.assert_array_equal(result.mask, expected)
+    assert len(validate_inputs(data, model_name)) == expected.sum()
+
+
+def test_predict_reports_rejected():
+    """Are rejected rows and reasons returned with the predictions?"""
+    conf = MODELS["DevModel"]["config"]
+    records = json.loads(
+        load_dataset(TEST_DATA)[conf.FEATURES]
+        .dropna(subset=conf.NAN_NOT_ALLOWED)
+        .iloc[:3]
+        .to_json(orient="records")
+    )
+    records[1]["GrLivArea"] = 0
+    result = predict(records, "DevModel")
+
+    assert len(result["prediction"]) == 2
+    assert result["rejected"] == [{"row": 1, "reasons": ["GrLivArea: below 1"]}]
+
+    batches = list(predict_batches(records, "DevModel"))
+    assert batches[1] == {"row": 1, "error": "GrLivArea: below 1"}
+
+
+def test_invalid_values_rejected_per_row():
+    """Is a value which is not a number rejected with its row only?"""
+    conf = MODELS["DevModel"]["config"]
+    records = json.loads(
+        load_dataset(TEST_DATA)[conf.FEATURES]
+        .dropna(subset=conf.NAN_NOT_ALLOWED)
+        .iloc[:3]
+        .to_json(orient="records")
+    )
+    records[1]["GrLivArea"] = "abc"
+    result = predict(records, "DevModel")
+
+    assert len(result["prediction"]) == 2
+    assert result["rejected"] == [
+        {"row": 1, "reasons": ["GrLivArea: not a finite number"]}
+    ]
+
+    batches = list(predict_batches(records, "DevModel", chunk_size=2))
+    assert batches[1] == {"row": 1, "error": "GrLivArea: not a finite number"}
+    assert "prediction" in batches[2]
+
+
+@pytest.mark.parametrize("invalid", [{"GarageFinish": None}, {"GrLivArea": "abc"}])
+def test_predict_all_rejected(invalid):
+    """Are all rows reported as rejected when none of them is valid?"""
+    conf = MODELS["DevModel"]["config"]
+    records = json.loads(
+        load_dataset(TEST_DATA)[conf.FEATURES]
+        .dropna(subset=conf.NAN_NOT_ALLOWED)
+        .iloc[:2]
+        .to_json(orient="records")
+    )
+    for record in records:
+        record.update(invalid)
+    result = predict(records, "DevModel")
+
+    assert result["prediction"] == []
+    assert [rejected["row"] for rejected in result["rejected"]] == [0, 1]
+
+
+def test_predict_no_records():
+    """Is an empty list of records answered with no predictions?"""
+    result = predict([], "DevModel")
+
+    assert result["prediction"] == []
+    assert result["rejected"] == []
@@ -0,0 +1,34 @@
+"""
+Script to fit and persist several registered models and parameter variants
+"""
+import argparse
+import json
+
+import housing_regression.config.global_config as global_conf
+from housing_regression.orchestrate import make_jobs, train_models
+
+
+TRAIN_FILE = './housing_regression/data/train.csv'
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument('--data', help='path to train data', default=TRAIN_FILE)
+parser.add_argument('--models', nargs='+',
+                    help='names of registered models, all by default')
+parser.add_argument('--grid', help='path to a JSON file with a parameter grid, '
+                    'e.g. {"RareEncoder__tol": [0.01, 0.05]}')
+parser.add_argument('--output-dir', help='where to save the pipelines',
+                    default=global_conf.PATH_TO_TRAINED_MODELS)
+parser.add_argument('--processes', type=int, help='size of the process pool')
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    param_grid = None
+    if args.grid:
+        with open(args.grid) as file:
+            param_grid = json.load(file)
+    jobs = make_jobs(args.models, param_grid)
+    for metadata in train_models(args.data, jobs, args.output_dir,
+                                 processes=args.processes):
+        print(json.dumps(metadata))
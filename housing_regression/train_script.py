@@ -14,8 +14,23 @@ MODEL = 'DevModel'
 parser = argparse.ArgumentParser(__doc__)
 parser.add_argument('--data', help='path to train data', default=TRAIN_FILE)
 parser.add_argument('--model', help='name of registered model', default=MODEL)
+parser.add_argument('--profile', help='log measurements of pipeline steps',
+                    action='store_true')
+parser.add_argument('--chunk-size', type=int,
+                    help='fit out of core, reading this many rows at a time')
+parser.add_argument('--n-jobs', type=int, default=1,
+                    help='processes fitting chunks in parallel, with --chunk-size')
+parser.add_argument('--cache-dir',
+                    help='reuse fitted preprocessing steps cached in this directory')
+parser.add_argument('--export', action='store_true',
+                    help='also export the compact artifact of the pipeline')
+parser.add_argument('--version',
+                    help='save as this version, served next to the default one')
 
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    train_pipeline(data_path=args.data, model_name=args.model)
+    train_pipeline(data_path=args.data, model_name=args.model,
+                   profile=args.profile, chunk_size=args.chunk_size,
+                   n_jobs=args.n_jobs, cache_dir=args.cache_dir,
+                   export=args.export, version=args.version)
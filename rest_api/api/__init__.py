@@ -3,22 +3,76 @@ Application serving the housing regression models
 """
 import os
 
-from flask import Flask
+from flask import Flask, jsonify
+from housing_regression.config.logging_config import enable_async_logging
+from housing_regression.predict import warm_up
+from housing_regression.processing.exceptions import (InvalidInputError,
+                                                     UnknownVersionError)
+from housing_regression.processing.pipeline_cache import (ARTIFACT_CACHE,
+                                                          PIPELINE_CACHE)
+from housing_regression.processing.prediction_cache import PREDICTION_CACHE
+from housing_regression.processing.prediction_log import PREDICTION_LOG
+from housing_regression.processing.profiling import PROFILER
 
 from api.blueprints.version_endpoint import version_endpoint
 from api.blueprints.dev_endpoint import dev_endpoint
+from api.blueprints.predict_endpoint import predict_endpoint
+from api.blueprints.batch_endpoint import batch_endpoint
+from api.blueprints.metrics_endpoint import metrics_endpoint
 
 
 with open(os.path.join(os.path.dirname(__file__), 'VERSION'), 'r') as ver_f:
     __version__ = ver_f.read().strip()
     
     
-def create_app():
+def create_app(warm_models=True, config=None):
     """Housing regression application factory
+    
+    :param warm_models: load persisted pipelines before serving the first
+        request instead of on demand
+    :param config: options overriding api.config and environment variables
     """
     app = Flask(__name__)
+    app.config.from_object('api.config')
+    app.config.update(config or {})
     
     app.register_blueprint(version_endpoint)
     app.register_blueprint(dev_endpoint)
+    app.register_blueprint(predict_endpoint)
+    app.register_blueprint(batch_endpoint)
+    app.register_blueprint(metrics_endpoint)
+    app.register_error_handler(InvalidInputError, invalid_input)
+    app.register_error_handler(UnknownVersionError, unknown_version)
+    
+    if app.config['ASYNC_LOGGING']:
+        enable_async_logging()
+    PREDICTION_LOG.configure(sample_rate=app.config['LOG_SAMPLE_RATE'],
+                             sample_rows=app.config['LOG_SAMPLE_ROWS'])
+    
+    if app.config['PROFILING']:
+        PROFILER.enable(trace_memory=app.config['PROFILING_MEMORY'])
+    
+    if app.config['PREDICTION_CACHE_SIZE']:
+        PREDICTION_CACHE.configure(app.config['PREDICTION_CACHE_SIZE'],
+                                   ttl=app.config['PREDICTION_CACHE_TTL'])
+    
+    PIPELINE_CACHE.background_reload = app.config['BACKGROUND_RELOAD']
+    PIPELINE_CACHE.max_entries = app.config['MAX_LOADED_VERSIONS']
+    ARTIFACT_CACHE.background_reload = app.config['BACKGROUND_RELOAD']
+    
+    if warm_models:
+        warm_up(versions=app.config['WARM_VERSIONS'])
     
-    return app
\ No newline at end of file
+    return app
+
+
+def invalid_input(error):
+    """Input which cannot be decoded gets 400, as in the ASGI app
+    """
+    return jsonify({'error': str(error)}), 400
+
+
+def unknown_version(error):
+    """A version removed while being requested gets 404
+    """
+    return jsonify({'error': str(error)}), 404
@@ -0,0 +1,465 @@
+"""
+Asynchronous (ASGI) entry point serving the same routes as the Flask app
+
+Slow clients only cost a coroutine instead of a worker thread and scoring,
+which is CPU bound, runs on a bounded thread or process pool, so the event
+loop never blocks. Once all workers are busy and the queue in front of them
+is full, further requests are turned away with 429 Too Many Requests. A
+streamed batch is admitted once, before its response starts, and keeps its
+place until the stream ends; errors after the start end the stream with an
+NDJSON error line. Arrow bodies are scored batch by batch while they are read,
+in threads even with the process executor, since the body can only be read
+from this process; an error after the start of such a response closes the
+connection.
+
+Serve with any ASGI server, e.g.: uvicorn api.asgi:app
+"""
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import housing_regression as hr
+from housing_regression.config.logging_config import enable_async_logging
+from housing_regression.models import MODELS
+from housing_regression.predict import (has_version, predict, predict_arrow,
+                                        predict_batches, preload_model,
+                                        unload_model, warm_up)
+from housing_regression.processing.exceptions import (InvalidInputError,
+                                                     UnknownVersionError)
+from housing_regression.processing.pipeline_cache import (ARTIFACT_CACHE,
+                                                          PIPELINE_CACHE)
+from housing_regression.processing.prediction_cache import PREDICTION_CACHE
+from housing_regression.processing.prediction_log import PREDICTION_LOG
+from housing_regression.processing.profiling import PROFILER
+
+from api import config
+from api.blueprints.metrics_endpoint import collect_metrics
+from api.blueprints.predict_endpoint import list_models
+from api.formats import ARROW_STREAM, arrow_unsupported, is_arrow
+
+
+_logger = logging.getLogger(__name__)
+
+
+def get_api_version():
+    """To avoid circular import
+    """
+    from api import __version__
+    return __version__
+
+
+def score_records(records, model_name, first_row, version=None):
+    """Scores a chunk of the batch endpoint, runs in the executor
+    """
+    results = list(predict_batches(records, model_name,
+                                   chunk_size=len(records), version=version))
+    for result in results:
+        result['row'] += first_row
+    return results
+
+
+def unknown_model(model_name, version=None):
+    """Error message if the model (or version) is not available, else None
+    """
+    if model_name not in MODELS:
+        return f'Unknown model: {model_name}'
+    if version is not None and not has_version(model_name, version):
+        return f'Unknown version of {model_name}: {version}'
+    return None
+
+
+class TooManyRequests(Exception):
+    """All workers are busy and the queue is full
+    """
+
+
+class StreamAborted(Exception):
+    """A response failed after it started, the connection must be closed
+    """
+
+
+class AsgiApp:
+    """ASGI application scoring on a bounded executor
+
+    :param max_workers: number of threads/processes scoring requests
+    :param max_queue: number of requests allowed to wait for a free worker
+    :param executor: 'thread' or 'process'
+    :param batch_chunk_size: rows scored at once by the batch endpoint
+    :param warm_models: load persisted pipelines on startup
+    """
+
+    def __init__(self, max_workers=config.ASGI_MAX_WORKERS,
+                 max_queue=config.ASGI_MAX_QUEUE,
+                 executor=config.ASGI_EXECUTOR,
+                 batch_chunk_size=config.BATCH_CHUNK_SIZE,
+                 warm_models=True):
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.executor_type = executor
+        self.batch_chunk_size = batch_chunk_size
+        self.warm_models = warm_models
+        # only ever touched from the event loop, needs no lock
+        self.in_flight = 0
+        self.rejected = 0
+        self._executor = None
+        self._stream_executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            if self.executor_type == 'process':
+                warm = functools.partial(warm_up, versions=config.WARM_VERSIONS)
+                self._executor = ProcessPoolExecutor(
+                    self.max_workers,
+                    initializer=warm if self.warm_models else None)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='scoring')
+        return self._executor
+
+    @property
+    def stream_executor(self):
+        """Threads reading and scoring request bodies as they arrive
+        """
+        if self.executor_type != 'process':
+            return self.executor
+        if self._stream_executor is None:
+            self._stream_executor = ThreadPoolExecutor(
+                self.max_workers, thread_name_prefix='streaming')
+        return self._stream_executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if config.ASYNC_LOGGING:
+                    enable_async_logging()
+                PREDICTION_LOG.configure(sample_rate=config.LOG_SAMPLE_RATE,
+                                         sample_rows=config.LOG_SAMPLE_ROWS)
+                if config.PROFILING:
+                    PROFILER.enable(trace_memory=config.PROFILING_MEMORY)
+                if config.PREDICTION_CACHE_SIZE:
+                    PREDICTION_CACHE.configure(config.PREDICTION_CACHE_SIZE,
+                                               ttl=config.PREDICTION_CACHE_TTL)
+                PIPELINE_CACHE.background_reload = config.BACKGROUND_RELOAD
+                PIPELINE_CACHE.max_entries = config.MAX_LOADED_VERSIONS
+                ARTIFACT_CACHE.background_reload = config.BACKGROUND_RELOAD
+                if self.warm_models:
+                    await self._run(warm_up, None, config.WARM_VERSIONS)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for executor in (self._executor, self._stream_executor):
+                    if executor is not None:
+                        executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        method, path = scope['method'], scope['path'].rstrip('/')
+        parts = path.strip('/').split('/')
+        headers = dict(scope.get('headers', []))
+        arrow = is_arrow(headers.get(b'content-type', b'').decode('latin-1'))
+        try:
+            if method == 'GET' and path == '/version':
+                await self._send_json(send, 200, {
+                    'api_version': get_api_version(),
+                    'models_version': hr.__version__})
+            elif method == 'GET' and path == '/metrics':
+                await self._send_json(send, 200, dict(
+                    collect_metrics(),
+                    asgi={'in_flight': self.in_flight,
+                          'rejected': self.rejected}))
+            elif method == 'POST' and path == '/predict/dev' and arrow:
+                await self._arrow('DevModel', receive=receive, send=send)
+            elif method == 'POST' and path == '/predict/dev':
+                input_data = await read_body(receive)
+                result = await self._run(predict, input_data, 'DevModel')
+                await self._send_json(send, 200, result)
+            elif method == 'GET' and path == '/models':
+                await self._send_json(send, 200, list_models())
+            elif (method == 'POST' and parts[0] == 'models'
+                  and parts[-1] == 'preload' and len(parts) in (3, 4)):
+                await self._preload(*parts[1:-1], send=send)
+            elif (method == 'DELETE' and parts[0] == 'models'
+                  and len(parts) == 3):
+                await self._unload(*parts[1:], send=send)
+            elif (method == 'POST' and parts[0] == 'predict'
+                  and parts[-1] == 'batch' and len(parts) in (3, 4)):
+                if arrow:
+                    await self._arrow(*parts[1:-1], receive=receive, send=send)
+                else:
+                    await self._batch(*parts[1:-1], query=scope.get(
+                        'query_string', b''), receive=receive, send=send)
+            elif (method == 'POST' and parts[0] == 'predict'
+                  and len(parts) in (2, 3)):
+                if arrow:
+                    await self._arrow(*parts[1:], receive=receive, send=send)
+                else:
+                    await self._predict(*parts[1:], receive=receive, send=send)
+            else:
+                await self._send_json(send, 404, {'error': 'Not Found'})
+        except StreamAborted:
+            raise
+        except TooManyRequests:
+            self.rejected += 1
+            await self._send_json(send, 429, {'error': 'Too Many Requests'},
+                                  headers=[(b'retry-after', b'1')])
+        except InvalidInputError as error:
+            await self._send_json(send, 400, {'error': str(error)})
+        except UnknownVersionError as error:
+            await self._send_json(send, 404, {'error': str(error)})
+        except Exception:
+            _logger.exception(f'Failed to serve {method} {path}')
+            await self._send_json(send, 500, {'error': 'Internal Server Error'})
+
+    async def _predict(self, model_name, version=None, *, receive, send):
+        """Scores a JSON body, see api.blueprints.predict_endpoint
+        """
+        error = unknown_model(model_name, version)
+        if error:
+            await self._send_json(send, 404, {'error': error})
+            return
+        input_data = await read_body(receive)
+        result = await self._run(functools.partial(predict, version=version),
+                                 input_data, model_name)
+        await self._send_json(send, 200, result)
+
+    async def _preload(self, model_name, version=None, *, send):
+        """Loads a version of a model in the background
+        """
+        error = unknown_model(model_name, version)
+        if error:
+            await self._send_json(send, 404, {'error': error})
+        elif preload_model(model_name, version) is None:
+            await self._send_json(send, 200, {'status': 'loaded'})
+        else:
+            await self._send_json(send, 202, {'status': 'loading'})
+
+    async def _unload(self, model_name, version, *, send):
+        """Frees the memory of a loaded version of a model
+        """
+        if model_name not in MODELS:
+            await self._send_json(send, 404,
+                                  {'error': f'Unknown model: {model_name}'})
+        elif unload_model(model_name, version):
+            await self._send_json(send, 200, {'status': 'unloaded'})
+        else:
+            await self._send_json(send, 404, {
+                'error': f'Version {version} of {model_name} is not loaded'})
+
+    async def _batch(self, model_name, version=None, *, query=b'', receive,
+                     send):
+        """Streams NDJSON predictions, see api.blueprints.batch_endpoint
+        """
+        error = unknown_model(model_name, version)
+        if error:
+            await self._send_json(send, 404, {'error': error})
+            return
+        chunk_size = query_int(query, 'chunk_size', self.batch_chunk_size)
+        if chunk_size < 1:
+            await self._send_json(send, 400, {
+                'error': 'chunk_size must be at least 1'})
+            return
+
+        headers = [(b'content-type', b'application/x-ndjson'),
+                   (b'x-model-version', (version or hr.__version__).encode())]
+        started = False
+        first_row = 0
+        # admitted once, chunks of a started stream are never turned away
+        with self._slot():
+            try:
+                async for records in read_ndjson_chunks(receive, chunk_size):
+                    results = await self._execute(score_records, records,
+                                                  model_name, first_row,
+                                                  version)
+                    first_row += len(records)
+                    if not started:
+                        await send({'type': 'http.response.start',
+                                    'status': 200, 'headers': headers})
+                        started = True
+                    body = ''.join(json.dumps(result) + '\n'
+                                   for result in results)
+                    await send({'type': 'http.response.body',
+                                'body': body.encode(), 'more_body': True})
+            except Exception as error:
+                if not started:
+                    raise
+                # the status is already sent, end the stream with the error
+                if isinstance(error, (InvalidInputError, UnknownVersionError)):
+                    message = str(error)
+                else:
+                    _logger.exception(f'Failed to score rows from {first_row}')
+                    message = 'Internal Server Error'
+                line = json.dumps({'row': first_row, 'error': message}) + '\n'
+                await send({'type': 'http.response.body',
+                            'body': line.encode()})
+                return
+
+        if not started:
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _arrow(self, model_name, version=None, *, receive, send):
+        """Scores a body in the Arrow IPC stream format, see api.formats
+        """
+        error = unknown_model(model_name, version)
+        if error:
+            await self._send_json(send, 404, {'error': error})
+            return
+        error = arrow_unsupported()
+        if error:
+            await self._send_json(send, 415, {'error': error})
+            return
+
+        loop = asyncio.get_running_loop()
+        chunks = predict_arrow(BodyReader(receive, loop), model_name,
+                               version=version)
+        headers = [(b'content-type', ARROW_STREAM.encode()),
+                   (b'x-model-version', (version or hr.__version__).encode())]
+        with self._slot():
+            # as in api.formats, invalid input gets 400 before the start
+            chunk = await self._next(chunks)
+            await send({'type': 'http.response.start', 'status': 200,
+                        'headers': headers})
+            try:
+                while chunk is not None:
+                    await send({'type': 'http.response.body', 'body': chunk,
+                                'more_body': True})
+                    chunk = await self._next(chunks)
+            except Exception as error:
+                _logger.exception('Failed to score an Arrow stream')
+                raise StreamAborted() from error
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def _next(self, chunks):
+        """Next chunk of a blocking generator, None once it is exhausted
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.stream_executor, next, chunks,
+                                          None)
+
+    async def _run(self, func, *args):
+        """Runs func in the executor unless the queue is full
+        """
+        with self._slot():
+            return await self._execute(func, *args)
+
+    @contextlib.contextmanager
+    def _slot(self):
+        """Holds a place of a request, raises TooManyRequests if none is free
+        """
+        if self.in_flight >= self.capacity:
+            raise TooManyRequests()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def _execute(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    @staticmethod
+    async def _send_json(send, status, data, headers=()):
+        body = json.dumps(data).encode()
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(b'content-type', b'application/json'),
+                                *headers]})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive):
+    """Reads the whole request body
+    """
+    body = bytearray()
+    while True:
+        message = await receive()
+        body.extend(message.get('body', b''))
+        if not message.get('more_body'):
+            return bytes(body)
+
+
+def query_int(query, name, default):
+    """Integer parameter of a query string, the default if absent or invalid
+
+    Same as request.args.get(name, default=default, type=int) in Flask.
+    """
+    values = urllib.parse.parse_qs(query.decode('latin-1')).get(name)
+    try:
+        return int(values[0])
+    except (TypeError, ValueError):
+        return default
+
+
+class BodyReader:
+    """Blocking file-like view of a request body, for a thread of an executor
+
+    The body is received on the event loop, message by message, as the
+    thread reads it.
+    """
+
+    closed = False
+
+    def __init__(self, receive, loop):
+        self._receive = receive
+        self._loop = loop
+        self._buffer = bytearray()
+        self._more_body = True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while self._more_body and (size < 0 or len(self._buffer) < size):
+            message = asyncio.run_coroutine_threadsafe(
+                self._receive(), self._loop).result()
+            self._buffer.extend(message.get('body', b''))
+            self._more_body = message.get('more_body', False)
+        size = len(self._buffer) if size < 0 else size
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+async def read_ndjson_chunks(receive, chunk_size):
+    """Parses the request body as NDJSON while it arrives
+
+    Yields lists of at most chunk_size records, None for invalid lines.
+    """
+    buffer = b''
+    records = []
+    more_body = True
+    while more_body:
+        message = await receive()
+        more_body = message.get('more_body', False)
+        buffer += message.get('body', b'')
+        *lines, buffer = buffer.split(b'\n')
+        if not more_body:
+            lines.append(buffer)
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                records.append(None)
+            if len(records) == chunk_size:
+                yield records
+                records = []
+    if records:
+        yield records
+
+
+app = AsgiApp()
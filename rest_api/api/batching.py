@@ -0,0 +1,185 @@
+"""
+Micro-batching of concurrent prediction requests
+
+Scoring a single observation costs almost the same as scoring dozens of them,
+as most of the time goes to per-call overhead of pandas and scikit-learn.
+Requests arriving within a short window are therefore concatenated, scored
+by a single call and the predictions are handed back to the waiting threads.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+import housing_regression as hr
+from housing_regression.predict import check_inputs, predict_features
+from housing_regression.processing.prediction_log import PREDICTION_LOG
+
+
+_batchers_lock = threading.Lock()
+
+
+class _Request:
+    """Observations of a single request waiting to be scored
+    """
+    
+    def __init__(self, features):
+        self.features = features
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    """Scores concurrent requests in batches on a background thread
+    
+    A batch is scored as soon as it has max_batch rows or the first request
+    in it has waited for max_wait seconds, whichever comes first.
+    
+    :param score: function scoring a pd.DataFrame of features
+    :param max_batch: number of rows after which the batch is scored
+    :param max_wait: seconds a request waits for others to join its batch
+    """
+    
+    def __init__(self, score, max_batch=64, max_wait=0.002):
+        self.score = score
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._metrics = {'batches': 0, 'requests': 0, 'rows': 0,
+                         'max_batch_size': 0, 'queue_delay': 0.0,
+                         'max_queue_delay': 0.0}
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='micro-batcher')
+        self._thread.start()
+    
+    def predict(self, features):
+        """Scores the features as part of a batch, blocks until done
+        
+        :param features: pd.DataFrame of validated features
+        
+        :returns: np.ndarray of predictions
+        """
+        if not len(features):
+            return np.empty(0)
+        request = _Request(features)
+        self._queue.put(request)
+        return request.future.result()
+    
+    def stats(self):
+        """Returns batch size and queueing delay metrics
+        """
+        with self._lock:
+            stats = dict(self._metrics)
+        batches = max(stats['batches'], 1)
+        stats['mean_batch_size'] = stats['rows'] / batches
+        stats['mean_queue_delay'] = stats['queue_delay'] / max(stats['requests'], 1)
+        return stats
+    
+    def close(self):
+        """Stops the background thread once the queued requests are scored
+        """
+        self._queue.put(None)
+        self._thread.join()
+    
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            self._score(batch)
+    
+    def _collect(self):
+        """Waits for the first request, then for others to join it
+        """
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        rows = len(first.features)
+        deadline = first.enqueued_at + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                # score what is collected, then stop
+                self._queue.put(None)
+                break
+            batch.append(request)
+            rows += len(request.features)
+        return batch
+    
+    def _score(self, batch):
+        started = time.perf_counter()
+        try:
+            features = pd.concat([request.features for request in batch],
+                                 ignore_index=True)
+            predictions = self.score(features)
+        except Exception:
+            # find out which request caused the failure
+            for request in batch:
+                self._score_alone(request)
+        else:
+            sizes = np.cumsum([len(request.features) for request in batch])
+            for request, result in zip(batch, np.split(predictions, sizes[:-1])):
+                request.future.set_result(result)
+        self._record(batch, started)
+    
+    def _score_alone(self, request):
+        try:
+            request.future.set_result(self.score(request.features))
+        except Exception as error:
+            request.future.set_exception(error)
+    
+    def _record(self, batch, started):
+        rows = sum(len(request.features) for request in batch)
+        delays = [started - request.enqueued_at for request in batch]
+        with self._lock:
+            metrics = self._metrics
+            metrics['batches'] += 1
+            metrics['requests'] += len(batch)
+            metrics['rows'] += rows
+            metrics['max_batch_size'] = max(metrics['max_batch_size'], rows)
+            metrics['queue_delay'] += sum(delays)
+            metrics['max_queue_delay'] = max(metrics['max_queue_delay'],
+                                             max(delays))
+
+
+def get_batcher(app, model_name, version=None):
+    """Returns the micro-batcher of the model, creating it on first use
+    
+    Every version of a model has a micro-batcher of its own, named
+    <model_name>/<version>.
+    """
+    name = model_name if version is None else f'{model_name}/{version}'
+    batchers = app.extensions.setdefault('micro_batchers', {})
+    with _batchers_lock:
+        if name not in batchers:
+            batchers[name] = MicroBatcher(
+                score=lambda features: predict_features(features, model_name,
+                                                        version=version),
+                max_batch=app.config['MICRO_BATCH_MAX_SIZE'],
+                max_wait=app.config['MICRO_BATCH_MAX_WAIT'],
+            )
+        return batchers[name]
+
+
+def predict_batched(input_data, model_name, version=None):
+    """Same as housing_regression.predict.predict, scored in a micro-batch
+    """
+    start = time.perf_counter()
+    features, rejected = check_inputs(input_data, model_name)
+    prediction = get_batcher(current_app, model_name, version).predict(features)
+    PREDICTION_LOG.log(model_name, features, prediction,
+                       seconds=time.perf_counter() - start,
+                       rejected=len(rejected), version=version)
+    return {'prediction': prediction.tolist(),
+            'version': version or hr.__version__, 'rejected': rejected}
@@ -0,0 +1,62 @@
+"""
+Endpoint scoring large batches of observations
+
+Accepts newline-delimited JSON (one observation per line) and streams the
+predictions back as newline-delimited JSON while the input is still being
+read. Observations are scored in chunks of a fixed size, so memory use does
+not depend on the size of the batch.
+
+Batches in the Arrow IPC stream format are scored batch by batch and
+answered with an Arrow stream of predictions, one per input row.
+"""
+import json
+
+from flask import Blueprint, Response, abort, current_app, request, stream_with_context
+import housing_regression as hr
+from housing_regression.predict import predict_batches
+
+from api.blueprints.predict_endpoint import require_model
+from api.formats import arrow_response, is_arrow
+
+
+NDJSON = 'application/x-ndjson'
+
+
+batch_endpoint = Blueprint('batch_endpoint', __name__)
+
+
+def read_records(stream):
+    """Parses NDJSON lines, yields None for lines that are not valid JSON
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+@batch_endpoint.route('/predict/<model_name>/batch', methods=['POST'])
+@batch_endpoint.route('/predict/<model_name>/<version>/batch', methods=['POST'])
+def make_batch_prediction(model_name, version=None):
+    """Streams predictions of a registered model for NDJSON or Arrow input
+    """
+    require_model(model_name, version)
+    
+    if is_arrow(request.content_type):
+        return arrow_response(request.stream, model_name, version=version)
+    
+    chunk_size = request.args.get(
+        'chunk_size',
+        default=current_app.config['BATCH_CHUNK_SIZE'],
+        type=int
+    )
+    if chunk_size < 1:
+        abort(400, description='chunk_size must be at least 1')
+    results = predict_batches(read_records(request.stream), model_name,
+                              chunk_size=chunk_size, version=version)
+    lines = (json.dumps(result) + '\n' for result in results)
+    
+    return Response(stream_with_context(lines), mimetype=NDJSON,
+                    headers={'X-Model-Version': version or hr.__version__})
@@ -5,9 +5,12 @@ This model was used during development of housing-regression package and is
 not based on any sort of analysis. This endpoint can be used for testing of
 both packages but should never be used for scoring.
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from housing_regression.predict import predict
 
+from api.batching import predict_batched
+from api.formats import arrow_response, is_arrow
+
 
 dev_endpoint = Blueprint('dev_endpoint', __name__)
 
@@ -15,6 +18,14 @@ dev_endpoint = Blueprint('dev_endpoint', __name__)
 @dev_endpoint.route('/predict/dev', methods=['POST'])
 def make_prediction():
     """Returns predictions from the development model
+    
+    Accepts JSON or, with the matching Content-Type, the Arrow IPC stream
+    format, see api.formats.
     """
-    input_data = request.get_json()
+    if is_arrow(request.content_type):
+        return arrow_response(request.stream, 'DevModel')
+    # parsed by the schema-driven decoder of housing_regression
+    input_data = request.get_data()
+    if current_app.config['MICRO_BATCHING']:
+        return jsonify(predict_batched(input_data, 'DevModel'))
     return jsonify(predict(input_data, 'DevModel'))
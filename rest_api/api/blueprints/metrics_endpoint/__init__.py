@@ -0,0 +1,37 @@
+"""
+Endpoint exposing measurements of the running application
+
+Reports per-step measurements of the pipelines (recorded only while
+profiling is enabled, see the PROFILING option), statistics of the pipeline
+and prediction caches and of the micro-batchers.
+"""
+from flask import Blueprint, current_app, jsonify
+from housing_regression.processing.pipeline_cache import PIPELINE_CACHE
+from housing_regression.processing.prediction_cache import PREDICTION_CACHE
+from housing_regression.processing.profiling import PROFILER
+
+
+metrics_endpoint = Blueprint('metrics_endpoint', __name__)
+
+
+def collect_metrics(batchers=None):
+    """Measurements of the housing_regression package and the batchers
+    
+    :param batchers: micro-batchers by model name
+    """
+    return {
+        'profiling': PROFILER.enabled,
+        'pipeline_steps': PROFILER.report(),
+        'pipeline_cache': PIPELINE_CACHE.stats(),
+        'prediction_cache': PREDICTION_CACHE.stats(),
+        'micro_batchers': {name: batcher.stats()
+                           for name, batcher in (batchers or {}).items()},
+    }
+
+
+@metrics_endpoint.route('/metrics', methods=['GET'])
+def metrics():
+    """Returns measurements of the application
+    """
+    batchers = current_app.extensions.get('micro_batchers', {})
+    return jsonify(collect_metrics(batchers))
@@ -0,0 +1,104 @@
+"""
+Endpoint serving every registered model and its persisted versions
+
+POST /predict/<model_name> scores with the default pipeline of the model and
+POST /predict/<model_name>/<version> with a persisted version of it, see
+housing_regression.predict.model_path. Versions are loaded on first use and
+stay loaded side by side, up to MAX_LOADED_VERSIONS of them besides the
+default pipelines; the least recently used are unloaded beyond that.
+GET /models lists them, POST /models/<model_name>/<version>/preload loads a
+version in the background, so that it is ready before traffic is routed to
+it, and DELETE /models/<model_name>/<version> unloads it.
+
+With the BACKGROUND_RELOAD option a changed artifact is loaded in the
+background as well: requests are served by the pipeline loaded before until
+the new one is ready and replaces it.
+"""
+from flask import Blueprint, abort, current_app, jsonify, request
+from housing_regression.models import MODELS
+from housing_regression.predict import (available_versions, has_version,
+                                        model_path, predict, preload_model,
+                                        unload_model)
+from housing_regression.processing.pipeline_cache import PIPELINE_CACHE
+
+from api.batching import predict_batched
+from api.formats import arrow_response, is_arrow
+
+
+predict_endpoint = Blueprint('predict_endpoint', __name__)
+
+
+def require_model(model_name, version=None):
+    """Aborts with 404 unless the model (and version) is available
+    """
+    if model_name not in MODELS:
+        abort(404, description=f'Unknown model: {model_name}')
+    if version is not None and not has_version(model_name, version):
+        abort(404, description=f'Unknown version of {model_name}: {version}')
+
+
+def list_models():
+    """Persisted and loaded versions of every registered model
+    
+    Loaded versions include None for the default pipeline of the model.
+    """
+    loaded = {(entry['name'], entry['path'])
+              for entry in PIPELINE_CACHE.stats()['entries']}
+    models = {}
+    for name in MODELS:
+        versions = available_versions(name)
+        models[name] = {
+            'versions': versions,
+            'loaded': [version for version in [None, *versions]
+                       if (name, model_path(name, version)) in loaded],
+        }
+    return models
+
+
+@predict_endpoint.route('/predict/<model_name>', methods=['POST'])
+@predict_endpoint.route('/predict/<model_name>/<version>', methods=['POST'])
+def make_prediction(model_name, version=None):
+    """Returns predictions of a registered model
+    
+    Accepts JSON or, with the matching Content-Type, the Arrow IPC stream
+    format, see api.formats.
+    """
+    require_model(model_name, version)
+    if is_arrow(request.content_type):
+        return arrow_response(request.stream, model_name, version=version)
+    input_data = request.get_data()
+    if current_app.config['MICRO_BATCHING']:
+        return jsonify(predict_batched(input_data, model_name, version=version))
+    return jsonify(predict(input_data, model_name, version=version))
+
+
+@predict_endpoint.route('/models', methods=['GET'])
+def models():
+    """Returns the persisted and loaded versions of the models
+    """
+    return jsonify(list_models())
+
+
+@predict_endpoint.route('/models/<model_name>/preload', methods=['POST'])
+@predict_endpoint.route('/models/<model_name>/<version>/preload',
+                        methods=['POST'])
+def preload(model_name, version=None):
+    """Starts loading a version of a model in the background
+    
+    Returns 202 while the version is being loaded and 200 once it is.
+    """
+    require_model(model_name, version)
+    if preload_model(model_name, version) is None:
+        return jsonify({'status': 'loaded'}), 200
+    return jsonify({'status': 'loading'}), 202
+
+
+@predict_endpoint.route('/models/<model_name>/<version>', methods=['DELETE'])
+def unload(model_name, version):
+    """Frees the memory of a loaded version, also one deleted from disk
+    """
+    if model_name not in MODELS:
+        abort(404, description=f'Unknown model: {model_name}')
+    if not unload_model(model_name, version):
+        abort(404, description=f'Version {version} of {model_name} is not loaded')
+    return jsonify({'status': 'unloaded'})
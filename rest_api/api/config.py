@@ -0,0 +1,65 @@
+"""
+Default configuration of the application
+
+Every option can be overridden by an environment variable of the same name
+or by the config passed to create_app.
+"""
+import os
+
+
+def _flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes')
+
+
+# rows scored at once by the batch endpoint
+BATCH_CHUNK_SIZE = int(os.environ.get('BATCH_CHUNK_SIZE', 1000))
+
+# record per-step measurements of the pipelines, exposed by /metrics
+PROFILING = _flag('PROFILING', False)
+# also record memory allocated by the steps, slows scoring down noticeably
+PROFILING_MEMORY = _flag('PROFILING_MEMORY', False)
+
+# write the logs of the housing_regression package from a background thread
+ASYNC_LOGGING = _flag('ASYNC_LOGGING', False)
+# share of logged predictions carrying a sample of their input
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0.01))
+# input rows in such a sample
+LOG_SAMPLE_ROWS = int(os.environ.get('LOG_SAMPLE_ROWS', 1))
+
+# predictions of repeated observations kept in memory, 0 disables the cache
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 0))
+# seconds a cached prediction stays valid
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 300))
+
+# load changed pipelines in the background and serve the previous ones
+# until they are ready
+BACKGROUND_RELOAD = _flag('BACKGROUND_RELOAD', True)
+# versions of the models kept loaded besides the default pipelines, the least
+# recently used are unloaded beyond that, 0 for no limit
+MAX_LOADED_VERSIONS = int(os.environ.get('MAX_LOADED_VERSIONS', 4))
+# also load every persisted version of the models on startup
+WARM_VERSIONS = _flag('WARM_VERSIONS', False)
+
+# collect concurrent requests for the same model into a single prediction
+MICRO_BATCHING = _flag('MICRO_BATCHING', False)
+# rows after which a micro-batch is scored without waiting any longer
+MICRO_BATCH_MAX_SIZE = int(os.environ.get('MICRO_BATCH_MAX_SIZE', 64))
+# seconds the first request of a micro-batch waits for others to join
+MICRO_BATCH_MAX_WAIT = float(os.environ.get('MICRO_BATCH_MAX_WAIT', 0.002))
+
+# async (ASGI) serving mode, see api.asgi
+# 'thread' or 'process' pool scoring the requests
+ASGI_EXECUTOR = os.environ.get('ASGI_EXECUTOR', 'thread')
+ASGI_MAX_WORKERS = int(os.environ.get('ASGI_MAX_WORKERS', os.cpu_count() or 1))
+# requests waiting for a free worker before new ones get 429
+ASGI_MAX_QUEUE = int(os.environ.get('ASGI_MAX_QUEUE', 32))
+
+# pre-fork server, see api.prefork
+PREFORK_WORKERS = int(os.environ.get('PREFORK_WORKERS', os.cpu_count() or 1))
+# waitress threads of every worker process
+PREFORK_THREADS = int(os.environ.get('PREFORK_THREADS', 4))
+# seconds between heartbeats, workers silent for the timeout are restarted;
+# heartbeats are served by the threads serving requests, so the timeout must
+# be longer than the slowest request
+PREFORK_HEARTBEAT_INTERVAL = float(os.environ.get('PREFORK_HEARTBEAT_INTERVAL', 1))
+PREFORK_HEARTBEAT_TIMEOUT = float(os.environ.get('PREFORK_HEARTBEAT_TIMEOUT', 30))
@@ -0,0 +1,60 @@
+"""
+Formats of request and response bodies besides JSON
+
+Clients select the format by the Content-Type of the request, the response
+is in the same format. Arrow needs pyarrow, without it Arrow bodies are
+answered with 415 Unsupported Media Type.
+"""
+import itertools
+
+from flask import Response, abort, stream_with_context
+import housing_regression as hr
+from housing_regression.predict import predict_arrow
+from housing_regression.processing.decoding import require_pyarrow
+from housing_regression.processing.exceptions import (InvalidInputError,
+                                                     UnknownVersionError)
+
+
+# Apache Arrow IPC stream format, see housing_regression.predict.predict_arrow
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+
+
+def is_arrow(content_type):
+    """Is the body in the Arrow IPC stream format?
+    """
+    return (content_type or '').split(';')[0].strip().lower() == ARROW_STREAM
+
+
+def arrow_unsupported():
+    """Error message if Arrow bodies cannot be read, else None
+    """
+    try:
+        require_pyarrow()
+    except ImportError as error:
+        return str(error)
+    return None
+
+
+def arrow_response(stream, model_name, version=None):
+    """Streams predictions in the Arrow IPC stream format
+    
+    The first batch is scored before the response starts, so that input
+    which is not a valid Arrow stream gets 400 rather than a broken response.
+    
+    :param stream: request body in the Arrow IPC stream format
+    :param model_name: name of a model registered in housing_regression.models
+    :param version: persisted version of the model, the default one if None
+    """
+    error = arrow_unsupported()
+    if error:
+        abort(415, description=error)
+    chunks = predict_arrow(stream, model_name, version=version)
+    try:
+        first = next(chunks)
+    except InvalidInputError as error:
+        abort(400, description=str(error))
+    except UnknownVersionError as error:
+        abort(404, description=str(error))
+    return Response(stream_with_context(itertools.chain([first], chunks)),
+                    mimetype=ARROW_STREAM,
+                    headers={'X-Model-Version': version or hr.__version__})
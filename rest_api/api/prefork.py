@@ -0,0 +1,266 @@
+"""
+Pre-fork server running several waitress workers on one listening socket
+
+Waitress serves from a single process, so scoring is bound to one core by the
+GIL. Here the parent process loads every registered model once and forks
+the workers afterwards. The fitted numpy arrays are then shared copy-on-write
+by all workers: they are never written to, and gc.freeze() moves the loaded
+objects out of reach of the garbage collector, whose bookkeeping would
+otherwise touch (and copy) their pages in every worker.
+
+The parent restarts workers which die or stop sending heartbeats. A
+heartbeat is a task queued to the waitress threads of the worker, the same
+threads serving requests, so a worker whose threads are all hung (or
+deadlocked) stops beating as well. It also stops beating while all of its
+threads are busy, so the heartbeat timeout must be longer than the slowest
+request. SIGHUP reloads changed model files and gracefully replaces all
+workers, SIGTERM and SIGINT shut the server down after in-flight requests
+are finished.
+
+Run with: python -m api.prefork --port 5000 --workers 4
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+from multiprocessing.sharedctypes import RawArray
+
+import waitress
+from housing_regression.predict import warm_up
+
+from api import config, create_app
+
+
+_logger = logging.getLogger(__name__)
+
+
+class PreforkServer:
+    """Parent process supervising forked waitress workers
+
+    :param app_factory: returns the WSGI app, called once in the parent
+    :param host: address to listen on
+    :param port: port to listen on, 0 picks a free one
+    :param workers: number of worker processes
+    :param threads: waitress threads per worker
+    :param heartbeat_interval: seconds between heartbeats of a worker
+    :param heartbeat_timeout: seconds without heartbeat after which a worker
+        is considered hung and killed, longer than the slowest request
+    """
+
+    def __init__(self, app_factory=create_app, host='0.0.0.0', port=5000,
+                 workers=config.PREFORK_WORKERS,
+                 threads=config.PREFORK_THREADS,
+                 heartbeat_interval=config.PREFORK_HEARTBEAT_INTERVAL,
+                 heartbeat_timeout=config.PREFORK_HEARTBEAT_TIMEOUT):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.n_workers = workers
+        self.threads = threads
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.app = None
+        self.socket = None
+        # pid -> heartbeat slot of the worker
+        self.workers = {}
+        # old and new generation run side by side during a reload
+        self._heartbeats = RawArray('d', 2 * workers)
+        self._reload = False
+        self._stop = False
+
+    def run(self):
+        """Serves until SIGTERM or SIGINT
+        """
+        self.socket = socket.create_server((self.host, self.port),
+                                           reuse_port=False, backlog=1024)
+        self.port = self.socket.getsockname()[1]
+        self._load()
+        _logger.info(f'Listening on {self.host}:{self.port}')
+
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGUSR1, self._on_status)
+
+        for _ in range(self.n_workers):
+            self._spawn()
+        try:
+            while not self._stop:
+                time.sleep(self.heartbeat_interval)
+                if self._reload:
+                    self._reload = False
+                    self._replace_workers()
+                self._check_workers()
+        finally:
+            self._terminate(list(self.workers))
+            self.socket.close()
+        _logger.info('Server stopped')
+
+    def _load(self):
+        """Loads the models in the parent so that workers share them
+        """
+        warm_up()
+        self.app = self.app_factory(warm_models=False)
+        gc.collect()
+        gc.freeze()
+
+    def _spawn(self):
+        slot = min(set(range(len(self._heartbeats))) - set(self.workers.values()))
+        self._heartbeats[slot] = time.monotonic()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                self._serve(slot)
+                exit_code = 0
+            except BaseException:
+                _logger.exception('Worker failed')
+            finally:
+                os._exit(exit_code)
+        self.workers[pid] = slot
+        _logger.info(f'Started worker {pid}')
+        return pid
+
+    def _serve(self, slot):
+        """Main function of a worker process
+        """
+        for signum in (signal.SIGHUP, signal.SIGINT, signal.SIGUSR1):
+            signal.signal(signum, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, _exit_worker)
+
+        # waits for in-flight requests on SystemExit raised by _exit_worker
+        server = waitress.create_server(self.app, sockets=[self.socket],
+                                        threads=self.threads)
+        heartbeat = Heartbeat(self._heartbeats, slot)
+
+        def send_heartbeats():
+            while True:
+                heartbeat.send(server.task_dispatcher)
+                time.sleep(self.heartbeat_interval)
+
+        threading.Thread(target=send_heartbeats, daemon=True).start()
+        server.run()
+
+    def _check_workers(self):
+        """Replaces workers which died or stopped sending heartbeats
+        """
+        while self.workers:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                break
+            if self.workers.pop(pid, None) is not None and not self._stop:
+                _logger.warning(f'Worker {pid} exited with status {status}')
+                self._spawn()
+
+        now = time.monotonic()
+        for pid, slot in list(self.workers.items()):
+            if now - self._heartbeats[slot] > self.heartbeat_timeout:
+                _logger.warning(f'Worker {pid} is not responding, killing it')
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                del self.workers[pid]
+                self._spawn()
+
+    def _replace_workers(self):
+        """Starts a new generation of workers with reloaded models
+
+        Workers of the old generation finish their requests before exiting,
+        the new ones are accepting connections by then.
+        """
+        _logger.info('Reloading models and restarting workers')
+        old = list(self.workers)
+        gc.unfreeze()
+        self._load()
+        for _ in range(self.n_workers):
+            self._spawn()
+        self._terminate(old)
+
+    def _terminate(self, pids):
+        """Stops workers gracefully, kills those that do not stop in time
+        """
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.heartbeat_timeout
+        for pid in pids:
+            while os.waitpid(pid, os.WNOHANG)[0] == 0:
+                if time.monotonic() > deadline:
+                    os.kill(pid, signal.SIGKILL)
+                    os.waitpid(pid, 0)
+                    break
+                time.sleep(0.05)
+            self.workers.pop(pid, None)
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        self._stop = True
+
+    def _on_status(self, signum, frame):
+        for pid in [os.getpid(), *self.workers]:
+            _logger.info(f'Memory of process {pid}: {memory_usage(pid)}')
+
+
+class Heartbeat:
+    """Task recording a heartbeat once a waitress thread gets to run it
+
+    :param heartbeats: shared array of heartbeat times
+    :param slot: index of the worker in heartbeats
+    """
+
+    def __init__(self, heartbeats, slot):
+        self.heartbeats = heartbeats
+        self.slot = slot
+        self.pending = threading.Event()
+
+    def send(self, dispatcher):
+        """Queues the task to the threads of the dispatcher, unless queued
+        """
+        if not self.pending.is_set():
+            self.pending.set()
+            dispatcher.add_task(self)
+
+    def service(self):
+        self.heartbeats[self.slot] = time.monotonic()
+        self.pending.clear()
+
+    def cancel(self):
+        self.pending.clear()
+
+
+def _exit_worker(signum, frame):
+    raise SystemExit()
+
+
+def memory_usage(pid):
+    """Resident, proportional and private memory of a process in kB
+
+    Proportional (pss) memory splits shared pages between the processes
+    sharing them, so summing it over workers gives the real usage. Linux only.
+    """
+    usage = {}
+    with open(f'/proc/{pid}/smaps_rollup') as smaps:
+        for line in smaps:
+            name, _, value = line.partition(':')
+            if name in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                usage[name.lower()] = int(value.split()[0])
+    return usage
+
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument('--host', default='0.0.0.0')
+parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+parser.add_argument('--workers', type=int, default=config.PREFORK_WORKERS)
+parser.add_argument('--threads', type=int, default=config.PREFORK_THREADS)
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    PreforkServer(host=args.host, port=args.port, workers=args.workers,
+                  threads=args.threads).run()
@@ -0,0 +1,93 @@
+"""
+Load test comparing deployments of the API, e.g. waitress and the ASGI app
+
+Start the servers first, e.g.:
+    waitress-serve --port 5000 --call api:create_app
+    uvicorn api.asgi:app --port 5001
+
+and compare them:
+    python load_script.py http://127.0.0.1:5000/ http://127.0.0.1:5001/
+"""
+import argparse
+import collections
+import statistics
+import threading
+import time
+
+import requests
+
+
+SAMPLE_INPUT = open('../housing_regression/sample_input.json').read()
+
+parser = argparse.ArgumentParser(__doc__)
+parser.add_argument('urls', nargs='+', help='base URLs of the deployments')
+parser.add_argument('--endpoint', default='predict/dev')
+parser.add_argument('--input_data', default=SAMPLE_INPUT)
+parser.add_argument('--concurrency', type=int, default=16)
+parser.add_argument('--requests', type=int, default=2000)
+
+
+def percentile(values, q):
+    """q-th percentile of sorted values
+    """
+    if not values:
+        return float('nan')
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def run(url, input_data, concurrency, n_requests):
+    """Sends n_requests from concurrency threads
+
+    :returns: throughput, latency percentiles and counts of status codes
+    """
+    latencies = []
+    statuses = collections.Counter()
+    lock = threading.Lock()
+    remaining = iter(range(n_requests))
+
+    def worker():
+        session = requests.Session()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                status = session.post(url, json=input_data).status_code
+            except requests.ConnectionError:
+                status = 'connection error'
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests/s': n_requests / wall_time,
+        'mean ms': 1000 * statistics.mean(latencies),
+        'p50 ms': 1000 * percentile(latencies, 50),
+        'p95 ms': 1000 * percentile(latencies, 95),
+        'p99 ms': 1000 * percentile(latencies, 99),
+        'statuses': dict(statuses),
+    }
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    for base_url in args.urls:
+        url = base_url.rstrip('/') + '/' + args.endpoint
+        result = run(url, args.input_data, args.concurrency, args.requests)
+        print(url)
+        for name, value in result.items():
+            if isinstance(value, float):
+                value = f'{value:.1f}'
+            print(f'    {name}: {value}')
@@ -0,0 +1 @@
+uvicorn api.asgi:app --host 0.0.0.0 --port $PORT
@@ -0,0 +1 @@
+python -m api.prefork --port $PORT
\ No newline at end of file
@@ -1,14 +1,19 @@
 """
 Testing the API
 """
+import os
+import shutil
 import sys
 sys.path.append('..')
 
+import pyarrow as pa
 import pytest
 from flask import json
 
 import api
 import housing_regression as hr
+from housing_regression.models import MODELS
+from housing_regression.predict import model_path
 
 
 @pytest.fixture(scope='module')
@@ -24,6 +29,20 @@ def client(app):
         yield client
         
         
+@pytest.fixture
+def versions_dir(tmp_path, monkeypatch):
+    """Version 1.0.0 of DevModel, a copy of the default pipeline
+    """
+    conf = MODELS['DevModel']['config']
+    monkeypatch.setattr(conf, 'VERSIONS_DIR', str(tmp_path) + '/')
+    shutil.copy(conf.PATH, model_path('DevModel', '1.0.0'))
+    return tmp_path
+
+
+RECORD = {'GrLivArea': 1710, 'YearRemodAdd': 2003, 'LotFrontage': 65.0,
+          'GarageFinish': 'RFn', 'Utilities': 'AllPub', 'YrSold': 2008}
+        
+        
 def test_version_endpoint(client):
     """Does the version endpoint return correct versions?
     """
@@ -33,3 +52,189 @@ def test_version_endpoint(client):
     assert response.status_code == 200
     assert data['api_version'] == api.__version__
     assert data['models_version'] == hr.__version__
+
+
+def test_batch_endpoint(client):
+    """Does the batch endpoint score NDJSON and report rejected rows?
+    """
+    record = {'GrLivArea': 1710, 'YearRemodAdd': 2003, 'LotFrontage': 65.0,
+              'GarageFinish': 'RFn', 'Utilities': 'AllPub', 'YrSold': 2008}
+    invalid = dict(record, GarageFinish=None)
+    body = '\n'.join([json.dumps(record), 'not json', json.dumps(invalid),
+                      json.dumps(record)])
+    
+    response = client.post('/predict/DevModel/batch?chunk_size=2', data=body,
+                           content_type='application/x-ndjson')
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    
+    assert response.status_code == 200
+    assert response.headers['X-Model-Version'] == hr.__version__
+    assert [line['row'] for line in lines] == [0, 1, 2, 3]
+    assert isinstance(lines[0]['prediction'], float)
+    assert lines[0]['prediction'] == lines[3]['prediction']
+    assert 'error' in lines[1] and 'error' in lines[2]
+
+
+def test_batch_endpoint_invalid_values(client):
+    """Is a record with a value of a wrong type rejected on its own?
+    """
+    invalid = dict(RECORD, GrLivArea='abc')
+    body = '\n'.join(json.dumps(record) for record in [RECORD, RECORD, invalid])
+    
+    response = client.post('/predict/DevModel/batch?chunk_size=2', data=body)
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    
+    assert response.status_code == 200
+    assert 'prediction' in lines[0] and 'prediction' in lines[1]
+    assert lines[2] == {'row': 2, 'error': 'GrLivArea: not a finite number'}
+
+
+@pytest.mark.parametrize('chunk_size', [0, -1])
+def test_batch_endpoint_invalid_chunk_size(client, chunk_size):
+    response = client.post(f'/predict/DevModel/batch?chunk_size={chunk_size}',
+                           data=json.dumps(RECORD))
+    
+    assert response.status_code == 400
+
+
+def test_batch_endpoint_unknown_model(client):
+    """Does the batch endpoint reject unregistered models?
+    """
+    response = client.post('/predict/NoSuchModel/batch', data='{}')
+    
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('endpoint', ['/predict/dev', '/predict/DevModel/batch'])
+def test_arrow_format(client, endpoint):
+    """Do the endpoints answer Arrow input with Arrow predictions?
+    """
+    table = pa.table({'GrLivArea': [1710, 1710, 1262],
+                      'YearRemodAdd': [2003, 2003, 1976],
+                      'LotFrontage': [65.0, 65.0, None],
+                      'GarageFinish': ['RFn', None, 'RFn'],
+                      'Utilities': ['AllPub', 'AllPub', 'AllPub'],
+                      'YrSold': [2008, 2008, 2007],
+                      'Street': ['Pave', 'Pave', 'Pave']})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=2):
+            writer.write_batch(batch)
+    
+    response = client.post(endpoint, data=sink.getvalue().to_pybytes(),
+                           content_type='application/vnd.apache.arrow.stream')
+    predictions = pa.ipc.open_stream(response.data).read_all()['prediction']
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/vnd.apache.arrow.stream'
+    assert len(predictions) == 3
+    assert predictions[1].as_py() is None
+    assert isinstance(predictions[0].as_py(), float)
+    assert isinstance(predictions[2].as_py(), float)
+
+
+def test_arrow_format_invalid(client):
+    response = client.post('/predict/dev', data=b'not arrow',
+                           content_type='application/vnd.apache.arrow.stream')
+    
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('endpoint', ['/predict/dev', '/predict/DevModel',
+                                      '/predict/DevModel/batch'])
+def test_arrow_without_pyarrow(client, monkeypatch, endpoint):
+    """Is Arrow input refused with 415 when pyarrow is not installed?
+    """
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    response = client.post(endpoint, data=b'arrow',
+                           content_type='application/vnd.apache.arrow.stream')
+    
+    assert response.status_code == 415
+
+
+@pytest.mark.parametrize('endpoint', ['/predict/dev', '/predict/DevModel'])
+@pytest.mark.parametrize('body', ['not json', '[{"GrLivArea": 1710}]', '[1]'])
+def test_invalid_input(client, endpoint, body):
+    """Is input which cannot be decoded answered with 400?
+    """
+    response = client.post(endpoint, data=body,
+                           content_type='application/json')
+    
+    assert response.status_code == 400
+    assert 'error' in json.loads(response.data)
+
+
+def test_metrics_endpoint():
+    """Does the metrics endpoint report measurements of pipeline steps?
+    """
+    from housing_regression.processing.profiling import PROFILER
+    
+    app = api.create_app(config={'PROFILING': True, 'MICRO_BATCHING': True})
+    record = {'GrLivArea': 1710, 'YearRemodAdd': 2003, 'LotFrontage': 65.0,
+              'GarageFinish': 'RFn', 'Utilities': 'AllPub', 'YrSold': 2008}
+    try:
+        with app.test_client() as client:
+            client.post('/predict/dev', json=[record])
+            response = client.get('/metrics')
+    finally:
+        PROFILER.disable()
+        PROFILER.reset()
+    data = json.loads(response.data)
+    methods = {(entry['step'], entry['method'])
+               for entry in data['pipeline_steps']}
+    
+    assert response.status_code == 200
+    assert data['profiling'] is True
+    assert ('LinearModel', 'predict') in methods
+    assert ('Imputer', 'transform') in methods
+    assert data['micro_batchers']['DevModel']['requests'] == 1
+    assert data['pipeline_cache']['entries'][0]['name'] == 'DevModel'
+
+
+def test_predict_endpoint(client, versions_dir):
+    """Are the default and persisted versions of a model served?
+    """
+    default = client.post('/predict/DevModel', json=[RECORD])
+    versioned = client.post('/predict/DevModel/1.0.0', json=[RECORD])
+    batch = client.post('/predict/DevModel/1.0.0/batch',
+                        data=json.dumps(RECORD))
+    
+    assert default.status_code == 200
+    assert json.loads(default.data)['version'] == hr.__version__
+    assert versioned.status_code == 200
+    assert json.loads(versioned.data)['version'] == '1.0.0'
+    assert (json.loads(versioned.data)['prediction']
+            == json.loads(default.data)['prediction'])
+    assert batch.headers['X-Model-Version'] == '1.0.0'
+    assert 'prediction' in json.loads(batch.data)
+
+
+@pytest.mark.parametrize('path', ['/predict/NoSuchModel',
+                                  '/predict/DevModel/9.9.9',
+                                  '/predict/DevModel/9.9.9/batch',
+                                  '/models/DevModel/9.9.9/preload'])
+def test_predict_endpoint_unknown(client, versions_dir, path):
+    response = client.post(path, json=[RECORD])
+    
+    assert response.status_code == 404
+
+
+def test_models_endpoint(client, versions_dir):
+    """Are versions listed and loaded on request?
+    """
+    response = client.post('/models/DevModel/1.0.0/preload')
+    assert response.status_code in (200, 202)
+    if response.status_code == 202:
+        assert client.post('/predict/DevModel/1.0.0',
+                           json=[RECORD]).status_code == 200
+    
+    data = json.loads(client.get('/models').data)
+    
+    assert data['DevModel']['versions'] == ['1.0.0']
+    assert None in data['DevModel']['loaded']
+    assert '1.0.0' in data['DevModel']['loaded']
+    
+    assert client.delete('/models/DevModel/1.0.0').status_code == 200
+    assert client.delete('/models/DevModel/1.0.0').status_code == 404
+    data = json.loads(client.get('/models').data)
+    assert '1.0.0' not in data['DevModel']['loaded']
@@ -0,0 +1,296 @@
+"""
+Testing the async (ASGI) serving mode
+"""
+import sys
+sys.path.append('..')
+
+import asyncio
+import json
+import shutil
+import threading
+
+import pyarrow as pa
+import pytest
+import housing_regression as hr
+from housing_regression.processing.data_management import load_dataset
+
+from housing_regression.processing.exceptions import InvalidInputError
+
+from api import asgi
+from api.asgi import AsgiApp
+from api.formats import ARROW_STREAM
+
+
+TEST_DATA = '../housing_regression/housing_regression/data/test.csv'
+
+
+def call(app, method, path, body=b'', chunks=None, headers=(), query=b''):
+    """Sends a single request to the app
+
+    :returns: status, headers and the body of the response
+    """
+    chunks = chunks if chunks is not None else [body]
+    messages = [{'type': 'http.request', 'body': chunk,
+                 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'headers': list(headers), 'query_string': query}
+    asyncio.run(app(scope, receive, send))
+    start, *bodies = sent
+    return (start['status'], dict(start['headers']),
+            b''.join(message['body'] for message in bodies))
+
+
+@pytest.fixture(scope='module')
+def app():
+    return AsgiApp(max_workers=2, max_queue=2, warm_models=False)
+
+
+@pytest.fixture(scope='module')
+def test_data():
+    return load_dataset(TEST_DATA)
+
+
+def test_version(app):
+    status, _, body = call(app, 'GET', '/version')
+
+    assert status == 200
+    assert json.loads(body)['models_version'] == hr.__version__
+
+
+def test_dev_endpoint(app, test_data):
+    input_data = test_data.iloc[:5].to_json(orient='records')
+
+    status, _, body = call(app, 'POST', '/predict/dev',
+                           json.dumps(input_data).encode())
+
+    assert status == 200
+    assert len(json.loads(body)['prediction']) == 5
+
+
+def test_batch_endpoint(app, test_data):
+    """Are records split across body chunks and scoring chunks scored?
+    """
+    app.batch_chunk_size = 3
+    lines = [test_data.iloc[i].to_json() for i in range(7)]
+    lines.insert(2, '{not json')
+    ndjson = '\n'.join(lines).encode()
+    chunks = [ndjson[i:i + 50] for i in range(0, len(ndjson), 50)]
+
+    status, headers, body = call(app, 'POST', '/predict/DevModel/batch',
+                                 chunks=chunks)
+    results = [json.loads(line) for line in body.decode().splitlines()]
+
+    assert status == 200
+    assert headers[b'x-model-version'] == hr.__version__.encode()
+    assert [result['row'] for result in results] == list(range(8))
+    assert results[2] == {'row': 2, 'error': 'malformed record'}
+    assert all('prediction' in result for i, result in enumerate(results)
+               if i != 2)
+
+
+def test_batch_endpoint_chunk_size(app, test_data, monkeypatch):
+    """Is the chunk_size of the query honoured as by the Flask app?
+    """
+    score_records = asgi.score_records
+    sizes = []
+
+    def record_size(records, *args):
+        sizes.append(len(records))
+        return score_records(records, *args)
+
+    monkeypatch.setattr(asgi, 'score_records', record_size)
+    ndjson = '\n'.join(test_data.iloc[i].to_json() for i in range(5)).encode()
+
+    status, _, body = call(app, 'POST', '/predict/DevModel/batch', ndjson,
+                           query=b'chunk_size=2')
+
+    assert status == 200
+    assert sizes == [2, 2, 1]
+    assert len(body.decode().splitlines()) == 5
+    assert call(app, 'POST', '/predict/DevModel/batch', ndjson,
+                query=b'chunk_size=0')[0] == 400
+
+
+@pytest.mark.parametrize('error, message', [
+    (InvalidInputError('bad chunk'), 'bad chunk'),
+    (RuntimeError('scoring failed'), 'Internal Server Error'),
+])
+def test_batch_endpoint_error_after_start(test_data, monkeypatch, error,
+                                          message):
+    """Does an error in a later chunk end the stream, not start another?
+    """
+    app = AsgiApp(max_workers=1, max_queue=0, warm_models=False,
+                  batch_chunk_size=2)
+    score_records = asgi.score_records
+    calls = []
+
+    def fail_second(records, *args):
+        calls.append(records)
+        if len(calls) == 2:
+            raise error
+        return score_records(records, *args)
+
+    monkeypatch.setattr(asgi, 'score_records', fail_second)
+    ndjson = '\n'.join(test_data.iloc[i].to_json() for i in range(6))
+
+    status, _, body = call(app, 'POST', '/predict/DevModel/batch',
+                           ndjson.encode())
+    results = [json.loads(line) for line in body.decode().splitlines()]
+
+    assert status == 200
+    assert [result['row'] for result in results] == [0, 1, 2]
+    assert results[-1] == {'row': 2, 'error': message}
+    assert app.in_flight == 0
+
+
+def test_not_found(app):
+    assert call(app, 'POST', '/predict/NoModel/batch')[0] == 404
+    assert call(app, 'GET', '/nothing')[0] == 404
+
+
+def test_predict_endpoint(app, test_data, tmp_path, monkeypatch):
+    """Are the generic and versioned routes served?
+    """
+    from housing_regression.models import MODELS
+    from housing_regression.predict import model_path
+
+    conf = MODELS['DevModel']['config']
+    monkeypatch.setattr(conf, 'VERSIONS_DIR', str(tmp_path) + '/')
+    shutil.copy(conf.PATH, model_path('DevModel', '1.0.0'))
+    input_data = json.dumps(test_data.iloc[:5].to_json(orient='records'))
+
+    status, _, body = call(app, 'POST', '/predict/DevModel/1.0.0',
+                           input_data.encode())
+    assert status == 200
+    assert json.loads(body)['version'] == '1.0.0'
+    assert call(app, 'POST', '/predict/DevModel',
+                input_data.encode())[0] == 200
+    assert call(app, 'POST', '/predict/DevModel/9.9.9')[0] == 404
+    assert json.loads(call(app, 'GET', '/models')[2]) == {
+        'DevModel': {'versions': ['1.0.0'], 'loaded': [None, '1.0.0']}}
+    assert call(app, 'DELETE', '/models/DevModel/1.0.0')[0] == 200
+    assert call(app, 'DELETE', '/models/DevModel/1.0.0')[0] == 404
+
+
+def test_backpressure():
+    """Are requests beyond the queue rejected with 429?
+    """
+    app = AsgiApp(max_workers=1, max_queue=1, warm_models=False)
+    release = threading.Event()
+
+    async def scenario():
+        blocked = [asyncio.ensure_future(app._run(release.wait))
+                   for _ in range(2)]
+        await asyncio.sleep(0.01)
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'{}'}
+
+        async def send(message):
+            sent.append(message)
+
+        await app({'type': 'http', 'method': 'POST', 'path': '/predict/dev'},
+                  receive, send)
+        release.set()
+        await asyncio.gather(*blocked)
+        return sent[0]['status']
+
+    assert asyncio.run(scenario()) == 429
+    assert app.rejected == 1
+    assert app.in_flight == 0
+
+
+def test_lifespan():
+    app = AsgiApp(max_workers=1, max_queue=0, warm_models=True)
+    messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(app({'type': 'lifespan'}, receive, send))
+
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+
+
+def test_arrow_format(app, test_data):
+    table = pa.Table.from_pandas(test_data.iloc[:5], preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    scope_headers = [(b'content-type', b'application/vnd.apache.arrow.stream')]
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': sink.getvalue().to_pybytes()}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(app({'type': 'http', 'method': 'POST', 'path': '/predict/dev',
+                     'headers': scope_headers}, receive, send))
+    predictions = pa.ipc.open_stream(sent[1]['body']).read_all()
+
+    assert sent[0]['status'] == 200
+    assert predictions.num_rows == 5
+
+
+def test_arrow_without_pyarrow(app, monkeypatch):
+    """Is Arrow input refused with 415 when pyarrow is not installed?
+    """
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)
+    status, _, body = call(
+        app, 'POST', '/predict/dev', b'arrow',
+        headers=[(b'content-type', b'application/vnd.apache.arrow.stream')])
+
+    assert status == 415
+    assert 'pyarrow' in json.loads(body)['error']
+
+
+def test_arrow_streamed(app, test_data):
+    """Are predictions of a batch sent before the rest of the body is read?
+    """
+    sink = pa.BufferOutputStream()
+    table = pa.Table.from_pandas(test_data.iloc[:6], preserve_index=False)
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_batch(table.to_batches(max_chunksize=3)[0])
+        first_size = sink.tell()
+        writer.write_batch(table.to_batches(max_chunksize=3)[1])
+    stream = sink.getvalue().to_pybytes()
+    chunks = [stream[:first_size], stream[first_size:]]
+
+    events = []
+    messages = [{'type': 'http.request', 'body': chunk,
+                 'more_body': i < len(chunks) - 1}
+                for i, chunk in enumerate(chunks)]
+
+    async def receive():
+        events.append('received')
+        return messages.pop(0)
+
+    async def send(message):
+        events.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': '/predict/DevModel',
+             'headers': [(b'content-type', ARROW_STREAM.encode())]}
+    asyncio.run(app(scope, receive, send))
+    sent = [event for event in events if event != 'received']
+    body = b''.join(message['body'] for message in sent[1:])
+
+    assert sent[0]['status'] == 200
+    assert events.index(sent[1]) < events.index('received', 2)
+    assert pa.ipc.open_stream(body).read_all().num_rows == 6
+    assert app.in_flight == 0
@@ -0,0 +1,86 @@
+"""
+Testing micro-batching of requests
+"""
+import sys
+sys.path.append('..')
+
+import threading
+
+import pandas as pd
+import pytest
+from flask import json
+
+import api
+from api.batching import MicroBatcher
+
+
+def double(features):
+    if (features['x'] < 0).any():
+        raise ValueError('negative input')
+    return features['x'].to_numpy() * 2
+
+
+def test_results_returned_to_callers():
+    """Does every caller get predictions of its own rows?
+    """
+    batcher = MicroBatcher(double, max_batch=64, max_wait=0.05)
+    results = {}
+    
+    def call(i):
+        results[i] = batcher.predict(pd.DataFrame({'x': [i, i + 100]}))
+    
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+    stats = batcher.stats()
+    
+    for i in range(20):
+        assert list(results[i]) == [2 * i, 2 * (i + 100)]
+    assert stats['requests'] == 20
+    assert stats['rows'] == 40
+    assert stats['batches'] < 20
+    assert stats['max_batch_size'] <= 64
+
+
+def test_failing_request_isolated():
+    """Does a request failing to score not fail the others in its batch?
+    """
+    batcher = MicroBatcher(double, max_batch=64, max_wait=0.05)
+    results = {}
+    
+    def call(name, features):
+        try:
+            results[name] = batcher.predict(features)
+        except ValueError as error:
+            results[name] = error
+    
+    threads = [
+        threading.Thread(target=call, args=('good', pd.DataFrame({'x': [1]}))),
+        threading.Thread(target=call, args=('bad', pd.DataFrame({'x': [-1]}))),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    batcher.close()
+    
+    assert list(results['good']) == [2]
+    assert isinstance(results['bad'], ValueError)
+
+
+def test_micro_batched_endpoint():
+    """Does the endpoint give the same predictions with micro-batching?
+    """
+    with open('../housing_regression/sample_input.json') as f:
+        sample = f.read()
+    plain = api.create_app(config={'MICRO_BATCHING': False}).test_client()
+    batched = api.create_app(config={'MICRO_BATCHING': True}).test_client()
+    
+    expected = json.loads(plain.post('/predict/dev', json=sample).data)
+    response = batched.post('/predict/dev', json=sample)
+    
+    assert response.status_code == 200
+    assert json.loads(response.data) == expected
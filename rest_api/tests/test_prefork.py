@@ -0,0 +1,122 @@
+"""
+Testing the pre-fork server
+"""
+import sys
+sys.path.append('..')
+
+import json
+import os
+import signal
+import socket
+import subprocess
+import time
+import urllib.request
+
+import pytest
+
+
+pytestmark = pytest.mark.skipif(not os.path.exists('/proc/self/task'),
+                                reason='needs Linux')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return set(map(int, f.read().split()))
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if condition():
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError('condition not met in time')
+
+
+@pytest.fixture
+def server():
+    port = free_port()
+    env = dict(os.environ, PREFORK_HEARTBEAT_INTERVAL='0.1',
+               PREFORK_HEARTBEAT_TIMEOUT='5')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'api.prefork', '--host', '127.0.0.1',
+         '--port', str(port), '--workers', '2'], env=env)
+    url = f'http://127.0.0.1:{port}/version'
+    wait_for(lambda: len(children(process.pid)) == 2
+             and urllib.request.urlopen(url).status == 200)
+    yield process, url
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def test_workers_restarted(server):
+    """Are dead workers replaced and all of them replaced on SIGHUP?
+    """
+    process, url = server
+    workers = children(process.pid)
+
+    os.kill(workers.pop(), signal.SIGKILL)
+    wait_for(lambda: len(children(process.pid)) == 2
+             and children(process.pid) & workers == workers)
+
+    workers = children(process.pid)
+    process.send_signal(signal.SIGHUP)
+    wait_for(lambda: len(children(process.pid)) == 2
+             and not children(process.pid) & workers)
+    response = json.load(urllib.request.urlopen(url))
+
+    assert 'models_version' in response
+
+
+def test_graceful_shutdown(server):
+    process, _ = server
+
+    process.send_signal(signal.SIGTERM)
+
+    assert process.wait(timeout=20) == 0
+
+
+def test_heartbeat_served_by_request_threads():
+    """Does a worker whose threads are all busy stop beating?
+    """
+    import threading
+    from multiprocessing.sharedctypes import RawArray
+    from waitress.task import ThreadedTaskDispatcher
+    from api.prefork import Heartbeat
+
+    dispatcher = ThreadedTaskDispatcher()
+    dispatcher.set_thread_count(1)
+    heartbeats = RawArray('d', 1)
+    heartbeat = Heartbeat(heartbeats, 0)
+    release = threading.Event()
+
+    class Hung:
+        def service(self):
+            release.wait()
+
+    try:
+        heartbeat.send(dispatcher)
+        wait_for(lambda: heartbeats[0] > 0)
+        dispatcher.add_task(Hung())
+        beat = heartbeats[0]
+        for _ in range(3):
+            heartbeat.send(dispatcher)
+            time.sleep(0.05)
+        assert heartbeats[0] == beat
+        assert len(dispatcher.queue) == 1
+
+        release.set()
+        wait_for(lambda: heartbeats[0] > beat)
+    finally:
+        release.set()
+        dispatcher.shutdown()